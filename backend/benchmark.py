@@ -0,0 +1,111 @@
+#!/usr/bin/env python
+"""
+Benchmark suite for the C-SARNet colorization hot path.
+
+Feeds synthetic SAR scenes through SARColorizer (decode, preprocess,
+forward, postprocess, encode) and times the generator variants on their
+own. No server or database is needed. Results are written as JSON; pass
+--compare with an earlier report to flag regressions (exit status 1).
+
+    python benchmark.py --output bench.json
+    python benchmark.py --checkpoint model/checkpoint_epoch_200.pth --suite pipeline --sizes 256,2048
+    python benchmark.py --compare bench.json --threshold 0.1
+    python benchmark.py --compare bench.json new.json
+"""
+import argparse
+import json
+import os
+import sys
+import tempfile
+
+from model.benchmark import BUILDS, VARIANTS, compare, random_checkpoint, run_suite
+
+
+def csv(cast=str):
+    return lambda value: [cast(v) for v in value.split(',') if v]
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description='Benchmark SARColorizer and the generator variants')
+    parser.add_argument('--suite', type=csv(), default=['pipeline', 'model'], help='pipeline,model')
+    parser.add_argument('--checkpoint', help='Checkpoint or serving artifact (default: random weights)')
+    parser.add_argument('--optimize', default='fused', help="SARColorizer optimize mode ('' for eager)")
+    parser.add_argument('--backend', default='eager', help='SARColorizer inference backend')
+    parser.add_argument('--sizes', type=csv(int), default=[256, 1024, 4096], help='Square input sizes in pixels')
+    parser.add_argument('--formats', type=csv(), default=['png', 'jpeg', 'tiff'], help='Upload formats')
+    parser.add_argument('--modes', type=csv(), default=['resize'], help='resize,tiled')
+    parser.add_argument('--variants', type=csv(), default=list(VARIANTS), help=','.join(VARIANTS))
+    parser.add_argument('--builds', type=csv(), default=list(BUILDS), help=','.join(BUILDS))
+    parser.add_argument('--batch-sizes', type=csv(int), default=[1, 4, 8], help='Batch sizes for the model suite')
+    parser.add_argument('--iterations', type=int, default=20, help='Timed runs per case')
+    parser.add_argument('--warmup', type=int, default=3, help='Untimed runs per case')
+    parser.add_argument('--output', help='Write the JSON report here (default: stdout)')
+    parser.add_argument('--compare', nargs='+', metavar='REPORT',
+                        help='Baseline report, optionally followed by a report to compare instead of running')
+    parser.add_argument('--threshold', type=float, default=0.10, help='Relative change counted as a regression')
+    return parser.parse_args()
+
+
+def progress(result):
+    line = f"{result['name']:<44} p50 {result['latency_ms']['p50']:>9.2f} ms  p99 {result['latency_ms']['p99']:>9.2f} ms"
+    line += f"  {result['images_per_s']:>8.2f} img/s  peak {result['peak_rss_mb']:>7.1f} MB"
+    print(line, file=sys.stderr)
+
+
+def run(args):
+    colorizer = None
+    with tempfile.TemporaryDirectory() as tmp:
+        if 'pipeline' in args.suite:
+            from model.inference import SARColorizer
+
+            checkpoint = args.checkpoint or random_checkpoint(os.path.join(tmp, 'random.pth'))
+            colorizer = SARColorizer(checkpoint_path=checkpoint, optimize=args.optimize or None, backend=args.backend)
+        report = run_suite(
+            colorizer,
+            suites=args.suite,
+            sizes=args.sizes,
+            input_formats=args.formats,
+            modes=args.modes,
+            variants=args.variants,
+            builds=args.builds,
+            batch_sizes=args.batch_sizes,
+            iterations=args.iterations,
+            warmup=args.warmup,
+            progress=progress,
+        )
+    report['config'] = {'checkpoint': args.checkpoint, 'optimize': args.optimize, 'backend': args.backend}
+    return report
+
+
+def main():
+    args = parse_args()
+    if args.compare and len(args.compare) > 2:
+        sys.exit('--compare takes a baseline and at most one current report')
+
+    if args.compare and len(args.compare) == 2:
+        with open(args.compare[1]) as f:
+            report = json.load(f)
+    else:
+        report = run(args)
+        if args.output:
+            with open(args.output, 'w') as f:
+                json.dump(report, f, indent=2)
+        elif not args.compare:
+            json.dump(report, sys.stdout, indent=2)
+            print()
+
+    if not args.compare:
+        return 0
+    with open(args.compare[0]) as f:
+        baseline = json.load(f)
+    rows, regressions = compare(baseline, report, threshold=args.threshold)
+    for row in rows:
+        flag = '  REGRESSION' if row['regression'] else ''
+        print(f"{row['name']:<44} {row['metric']:<28} {row['baseline']:>10.2f} -> {row['current']:>10.2f} "
+              f"({row['change']:+.1%}){flag}")
+    print(f"{len(regressions)} regression(s) above {args.threshold:.0%} across {len(rows)} metrics")
+    return 1 if regressions else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,251 @@
+"""
+Change notifications for ProcessingJobs and ViaEvents.
+
+Every status change of a job and every saved ViaEvent is published as a
+small JSON message addressed to the owning user; ``/api/events/stream/``
+relays them to browsers over Server-Sent Events.
+
+With PostgreSQL messages go through ``NOTIFY`` on EVENTS_CHANNEL, so they
+are delivered only if the writing transaction commits and reach every web
+process (each runs one LISTEN thread). Other databases use an in-process
+broker fed from ``transaction.on_commit``, which only reaches streams
+served by the process that made the change.
+"""
+import asyncio
+import json
+import logging
+import queue
+import select
+import threading
+import time
+
+from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import connection, connections, transaction
+
+logger = logging.getLogger(__name__)
+
+# PostgreSQL rejects NOTIFY payloads of 8000 bytes or more
+MAX_PAYLOAD_BYTES = 7900
+
+JOB_FIELDS = ('id', 'job_id', 'job_type', 'status', 'priority', 'message', 'attempts', 'schedule',
+              'started_at', 'finished_at', 'updated_at')
+
+
+def uses_postgres():
+    backend = settings.EVENTS_BACKEND
+    if backend == 'auto':
+        return connection.vendor == 'postgresql'
+    return backend == 'postgres'
+
+
+def encode(data):
+    return json.dumps(data, cls=DjangoJSONEncoder, separators=(',', ':'))
+
+
+def _payload(message):
+    payload = encode(message)
+    if len(payload.encode()) > MAX_PAYLOAD_BYTES:
+        # Too big to NOTIFY (large stage_data): subscribers get the id and fetch the row over REST
+        payload = encode(dict(message, data={'id': message['data']['id'], 'truncated': True}))
+    return payload
+
+
+def publish(user_id, kind, data):
+    """Send ``data`` to user_id's streams as an event of type ``kind`` once the current transaction commits"""
+    payload = _payload({'user': str(user_id), 'event': kind, 'data': data})
+    if uses_postgres():
+        # NOTIFY is transactional: listeners see it at commit, never for a rolled-back change
+        with connection.cursor() as cursor:
+            cursor.execute('SELECT pg_notify(%s, %s)', [settings.EVENTS_CHANNEL, payload])
+    else:
+        transaction.on_commit(lambda: broker.dispatch(payload))
+
+
+def job_data(job):
+    return {field: getattr(job, field) for field in JOB_FIELDS}
+
+
+def publish_job(job):
+    publish(job.user_id, 'job', job_data(job))
+
+
+def publish_jobs(pks):
+    """Publish the current state of the given jobs (after a queryset .update(), which sends no signals)"""
+    from .models import ProcessingJobs
+
+    if pks:
+        for job in ProcessingJobs.objects.filter(pk__in=pks).only('user', *JOB_FIELDS):
+            publish_job(job)
+
+
+def publish_via_event(event):
+    from .serializers import ViaEventsSerializer
+
+    publish(event.user_id, 'via_event', ViaEventsSerializer(event).data)
+
+
+class Subscription:
+    """One SSE client served by a thread (WSGI): a blocking queue filled from whichever thread dispatches"""
+    Full = queue.Full
+
+    def __init__(self, user_id, kinds, maxsize):
+        self.user_id = user_id
+        self.kinds = kinds
+        self.queue = queue.Queue(maxsize=maxsize)
+        # Set when the client may have missed messages (it fell too far behind, or the listener reconnected);
+        # its stream ends so the browser reconnects and resyncs
+        self.stale = False
+
+    def _put(self, message):
+        if self.stale:
+            return
+        try:
+            self.queue.put_nowait(message)
+        except self.Full:
+            self.stale = True
+
+    def _invalidate(self):
+        self.stale = True
+        try:
+            # Wakes a reader blocked in get(), which returns None like a keepalive
+            self.queue.put_nowait(None)
+        except self.Full:
+            pass
+
+    def invalidate(self):
+        """Mark the stream stale from any thread"""
+        self._invalidate()
+
+    def deliver(self, message):
+        if message['event'] in self.kinds:
+            self._put(message)
+
+    def get(self, timeout):
+        """Next message, or None after ``timeout`` seconds without one"""
+        try:
+            return self.queue.get(timeout=timeout)
+        except queue.Empty:
+            return None
+
+
+class AsyncSubscription(Subscription):
+    """
+    One SSE client served on an event loop (ASGI). Create it from the
+    coroutine that consumes it, so messages go to the loop that streams.
+    """
+    Full = asyncio.QueueFull
+
+    def __init__(self, user_id, kinds, maxsize):
+        super().__init__(user_id, kinds, maxsize)
+        self.loop = asyncio.get_running_loop()
+        self.queue = asyncio.Queue(maxsize=maxsize)
+
+    def deliver(self, message):
+        if message['event'] in self.kinds:
+            try:
+                self.loop.call_soon_threadsafe(self._put, message)
+            except RuntimeError:
+                # The loop serving this stream has shut down
+                pass
+
+    def invalidate(self):
+        try:
+            self.loop.call_soon_threadsafe(self._invalidate)
+        except RuntimeError:
+            pass
+
+    async def get(self, timeout):
+        try:
+            return await asyncio.wait_for(self.queue.get(), timeout)
+        except asyncio.TimeoutError:
+            return None
+
+
+class Broker:
+    """Fans published messages out to the subscriptions of this process, by user"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._subscriptions = {}
+        self._listener = None
+
+    def subscribe(self, user_id, kinds=('job', 'via_event'), asynchronous=False):
+        # Keyed like the published messages: user primary keys are UUIDs, which arrive as strings
+        subscription = (AsyncSubscription if asynchronous else Subscription)(
+            str(user_id), frozenset(kinds), settings.EVENTS_QUEUE_SIZE
+        )
+        with self._lock:
+            self._subscriptions.setdefault(subscription.user_id, set()).add(subscription)
+            if uses_postgres() and (self._listener is None or not self._listener.is_alive()):
+                self._listener = PostgresListener(self)
+                self._listener.start()
+        return subscription
+
+    def unsubscribe(self, subscription):
+        with self._lock:
+            subscriptions = self._subscriptions.get(subscription.user_id, set())
+            subscriptions.discard(subscription)
+            if not subscriptions:
+                self._subscriptions.pop(subscription.user_id, None)
+
+    def dispatch(self, payload):
+        message = json.loads(payload)
+        with self._lock:
+            subscriptions = list(self._subscriptions.get(message['user'], ()))
+        for subscription in subscriptions:
+            subscription.deliver(message)
+
+    def resync(self):
+        """End every stream with a resync event, after messages may have been lost on the way to this process"""
+        with self._lock:
+            subscriptions = [subscription for user in self._subscriptions.values() for subscription in user]
+        for subscription in subscriptions:
+            subscription.invalidate()
+
+
+class PostgresListener(threading.Thread):
+    """LISTENs on EVENTS_CHANNEL over a dedicated connection and hands every notification to the broker"""
+
+    def __init__(self, broker):
+        super().__init__(name='sar-events-listener', daemon=True)
+        self.broker = broker
+
+    def _listen(self, reconnected):
+        wrapper = connections.create_connection('default')
+        try:
+            wrapper.ensure_connection()
+            wrapper.set_autocommit(True)
+            with wrapper.cursor() as cursor:
+                cursor.execute(f'LISTEN "{settings.EVENTS_CHANNEL}"')
+            if reconnected:
+                # Notifications sent while nobody was listening are gone; clients refetch over REST
+                self.broker.resync()
+            raw = wrapper.connection
+            while True:
+                if hasattr(raw, 'poll'):
+                    # psycopg2: wait for the socket, then drain what arrived
+                    if select.select([raw], [], [], settings.EVENTS_KEEPALIVE_SECONDS) == ([], [], []):
+                        continue
+                    raw.poll()
+                    while raw.notifies:
+                        self.broker.dispatch(raw.notifies.pop(0).payload)
+                else:
+                    # psycopg 3
+                    for notify in raw.notifies(timeout=settings.EVENTS_KEEPALIVE_SECONDS):
+                        self.broker.dispatch(notify.payload)
+        finally:
+            wrapper.close()
+
+    def run(self):
+        reconnected = False
+        while True:
+            try:
+                self._listen(reconnected)
+            except Exception:
+                logger.exception('Event listener lost its database connection; reconnecting')
+                time.sleep(1.0)
+            reconnected = True
+
+
+broker = Broker()
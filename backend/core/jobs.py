@@ -0,0 +1,342 @@
+"""
+Database-backed execution of ProcessingJobs.
+
+Workers (``manage.py run_job_worker``) claim due pending jobs in the
+order core/scheduling.py decides, run the handler registered for their ``job_type`` and write
+the JobResults row together with the final status in one transaction. Any
+number of worker processes can share the table: claims take row locks with
+SKIP LOCKED, so concurrent workers pass over each other's rows instead of
+blocking on them.
+"""
+import logging
+import os
+import posixpath
+import socket
+import threading
+import time
+import uuid
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.exceptions import SuspiciousFileOperation
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.db import close_old_connections, transaction
+from django.db.models import F
+from django.utils import timezone
+from prometheus_client import Histogram
+
+from model.codecs import CONTENT_TYPES
+from .events import publish_job, publish_jobs
+from .models import Images, JobResults, ProcessingJobs
+from .scheduling import candidate_ids, running_by_type
+
+logger = logging.getLogger(__name__)
+
+JOB_SECONDS = Histogram(
+    'sarnet_job_duration_seconds', 'Time spent running a processing job by type and outcome',
+    ['job_type', 'outcome'],
+    buckets=(0.1, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0, 300.0, 600.0, 1800.0),
+)
+
+_handlers = {}
+
+
+class JobError(Exception):
+    """Raised by handlers for failures a retry will not fix (bad params, missing input)"""
+
+
+def register(job_type):
+    """Decorator registering ``handler(job) -> result_data`` for a job type"""
+    def decorator(handler):
+        _handlers[job_type] = handler
+        return handler
+    return decorator
+
+
+def registered_job_types():
+    return sorted(_handlers)
+
+
+def default_worker_name():
+    return f'{socket.gethostname()}:{os.getpid()}'
+
+
+def claim_jobs(worker, limit, job_types=None):
+    """
+    Move up to ``limit`` due pending jobs to running and return them in
+    the order core/scheduling.py ranks them (fair share between users,
+    aged priority), skipping job types at their JOB_TYPE_CONCURRENCY cap.
+
+    The chosen rows are locked with ``SELECT ... FOR UPDATE SKIP LOCKED``
+    while they are flipped to running; rows another worker is claiming are
+    passed over. Each flip is conditional on the row still being pending,
+    so a claim is also exclusive on backends without row locks (SQLite).
+    """
+    if limit <= 0:
+        return []
+    job_types = list(_handlers if job_types is None else job_types)
+    caps = {job_type: cap for job_type, cap in settings.JOB_TYPE_CONCURRENCY.items() if job_type in job_types}
+    running = running_by_type(list(caps)) if caps else {}
+    job_types = [job_type for job_type in job_types if running.get(job_type, 0) < caps.get(job_type, float('inf'))]
+    if not job_types:
+        return []
+    now = timezone.now()
+    claimed = []
+    with transaction.atomic():
+        candidates = candidate_ids(limit, job_types, now)
+        locked = dict(
+            ProcessingJobs.objects.select_for_update(skip_locked=True)
+            .filter(pk__in=candidates, status='pending')
+            .values_list('pk', 'job_type')
+        )
+        for pk in candidates:
+            job_type = locked.get(pk)
+            if job_type is None or running.get(job_type, 0) >= caps.get(job_type, float('inf')):
+                continue
+            if ProcessingJobs.objects.filter(pk=pk, status='pending').update(
+                status='running', worker=worker, attempts=F('attempts') + 1,
+                started_at=now, finished_at=None, message='', updated_at=now,
+            ):
+                claimed.append(pk)
+                running[job_type] = running.get(job_type, 0) + 1
+                if len(claimed) == limit:
+                    break
+    jobs = sorted(ProcessingJobs.objects.filter(pk__in=claimed), key=lambda job: claimed.index(job.pk))
+    for job in jobs:
+        publish_job(job)
+    return jobs
+
+
+def _owned(job):
+    """The job's row, as long as it is still the attempt this worker claimed"""
+    return ProcessingJobs.objects.filter(pk=job.pk, status='running', worker=job.worker, attempts=job.attempts)
+
+
+def _complete(job, result_data):
+    now = timezone.now()
+    with transaction.atomic():
+        if not _owned(job).update(status='completed', finished_at=now, message='', updated_at=now):
+            # Requeued as stale (and maybe claimed again) while this attempt ran: its result is discarded
+            logger.warning('Job %s was taken over while running; dropping the result of attempt %d',
+                           job.job_id, job.attempts)
+            return 'lost'
+        result, created = JobResults.objects.get_or_create(
+            job=job, defaults={'result_id': str(uuid.uuid4()), 'result_data': result_data},
+        )
+        if not created:
+            # An earlier attempt's row (completed jobs can be re-run by setting them back to pending)
+            result.result_data = result_data
+            result.save(update_fields=['result_data', 'updated_at'])
+        publish_jobs([job.pk])
+    return 'completed'
+
+
+def _fail(job, exc):
+    now = timezone.now()
+    if not isinstance(exc, JobError) and job.attempts < settings.JOB_WORKER_MAX_ATTEMPTS:
+        delay = settings.JOB_WORKER_RETRY_DELAY * 2 ** (job.attempts - 1)
+        updated = _owned(job).update(
+            status='pending', schedule=now + timedelta(seconds=delay), updated_at=now,
+            message=f'Attempt {job.attempts} failed: {exc}',
+        )
+        outcome = 'retried'
+    else:
+        updated = _owned(job).update(status='failed', finished_at=now, message=str(exc), updated_at=now)
+        outcome = 'failed'
+    if not updated:
+        return 'lost'
+    publish_jobs([job.pk])
+    return outcome
+
+
+def run_job(job):
+    """Run a claimed job and record its outcome: 'completed', 'retried', 'failed' or 'lost'"""
+    handler = _handlers.get(job.job_type)
+    started = time.perf_counter()
+    try:
+        if handler is None:
+            raise JobError(f'No handler registered for job type {job.job_type!r}')
+        result_data = handler(job)
+    except Exception as exc:
+        logger.exception('Job %s (%s) attempt %d failed', job.job_id, job.job_type, job.attempts)
+        outcome = _fail(job, exc)
+    else:
+        outcome = _complete(job, result_data)
+    JOB_SECONDS.labels(job.job_type, outcome).observe(time.perf_counter() - started)
+    return outcome
+
+
+def requeue_stale(stale_after):
+    """
+    Recover jobs whose worker died: running jobs without a heartbeat for
+    ``stale_after`` seconds go back to pending, or to failed once they have
+    used up JOB_WORKER_MAX_ATTEMPTS. Returns ``(requeued, failed)``.
+    """
+    now = timezone.now()
+    stale = ProcessingJobs.objects.filter(status='running', updated_at__lt=now - timedelta(seconds=stale_after))
+    pks = list(stale.values_list('pk', flat=True))
+    if not pks:
+        return 0, 0
+    stale = ProcessingJobs.objects.filter(pk__in=pks, status='running')
+    failed = stale.filter(attempts__gte=settings.JOB_WORKER_MAX_ATTEMPTS).update(
+        status='failed', finished_at=now, message='Worker stopped responding', updated_at=now,
+    )
+    requeued = stale.update(status='pending', message='Requeued after the worker stopped responding', updated_at=now)
+    publish_jobs(pks)
+    return requeued, failed
+
+
+def heartbeat(pks):
+    """Mark running jobs as alive so requeue_stale leaves them alone"""
+    if pks:
+        ProcessingJobs.objects.filter(pk__in=pks, status='running').update(updated_at=timezone.now())
+
+
+class JobWorker:
+    """
+    Claim-and-run loop for one process.
+
+    Up to ``concurrency`` jobs run at once on a thread pool; handlers that
+    colorize go through the process-wide colorizer, so concurrent jobs share
+    micro-batches. Scale out by starting more processes.
+    """
+
+    def __init__(self, concurrency=1, poll_interval=1.0, job_types=None, name=None, stale_after=300.0):
+        self.concurrency = concurrency
+        self.poll_interval = poll_interval
+        self.job_types = job_types
+        self.name = name or default_worker_name()
+        self.stale_after = stale_after
+        self._stop = threading.Event()
+
+    def stop(self):
+        """Stop claiming; jobs already running are finished before run() returns"""
+        self._stop.set()
+
+    def _execute(self, job):
+        close_old_connections()
+        try:
+            return run_job(job)
+        finally:
+            close_old_connections()
+
+    def run(self, once=False):
+        """Process jobs until stop(); with ``once``, return as soon as no due job is left"""
+        running = {}
+        last_heartbeat = float('-inf')
+        with ThreadPoolExecutor(max_workers=self.concurrency, thread_name_prefix='sar-job') as executor:
+            while not self._stop.is_set():
+                close_old_connections()
+                if time.monotonic() - last_heartbeat >= self.stale_after / 4:
+                    heartbeat(list(running.values()))
+                    requeued, failed = requeue_stale(self.stale_after)
+                    if requeued or failed:
+                        logger.warning('Recovered stale jobs: %d requeued, %d failed', requeued, failed)
+                    last_heartbeat = time.monotonic()
+
+                jobs = claim_jobs(self.name, self.concurrency - len(running), self.job_types)
+                for job in jobs:
+                    running[executor.submit(self._execute, job)] = job.pk
+                if once and not running:
+                    break
+                if running:
+                    done, _ = wait(running, timeout=self.poll_interval, return_when=FIRST_COMPLETED)
+                    for future in done:
+                        pk = running.pop(future)
+                        if future.exception() is not None:
+                            # run_job records handler errors itself; this is the database failing under it
+                            logger.error('Recording the outcome of job %s failed', pk, exc_info=future.exception())
+                else:
+                    self._stop.wait(self.poll_interval)
+            wait(running)
+
+
+# Handlers
+
+COLORIZE_MODES = (None, 'resize', 'tiled', 'full')
+
+# Storage directories whose files the server names per user (uploads from ImagesViewSet, job outputs)
+USER_STORAGE_DIRS = ('uploads', 'colorized')
+
+
+def user_storage_name(directory, user_id, filename):
+    """
+    Storage name for a file the server writes on behalf of ``user_id``.
+
+    Only the server picks these names, so the per-user prefix is what proves
+    ownership; storage_path columns are client-writable and prove nothing.
+    """
+    return f'{directory}/{user_id}/{filename}'
+
+
+def _storage_name(path):
+    """Images.storage_path holds either a storage name or the media URL ImagesViewSet built from one"""
+    if settings.MEDIA_URL in path:
+        return path.split(settings.MEDIA_URL, 1)[1]
+    return path
+
+
+def _owned_storage_name(job, path):
+    """The storage name behind ``path``, provided it lies in one of the job owner's storage directories"""
+    name = posixpath.normpath(_storage_name(path))
+    if not any(name.startswith(user_storage_name(directory, job.user_id, '')) for directory in USER_STORAGE_DIRS):
+        raise JobError(f'{name} is not one of your stored files')
+    return name
+
+
+def _scene_source(job):
+    params = job.params or {}
+    if params.get('image_id'):
+        image = Images.objects.filter(user_id=str(job.user_id), image_id=params['image_id']).first()
+        if image is None:
+            raise JobError(f"Image {params['image_id']} not found")
+        path = image.storage_path
+    elif params.get('storage_path'):
+        path = params['storage_path']
+    else:
+        raise JobError("params must contain 'image_id' or 'storage_path'")
+    name = _owned_storage_name(job, path)
+    try:
+        exists = default_storage.exists(name)
+    except SuspiciousFileOperation as e:
+        raise JobError(f'{name} is not a valid storage name: {e}')
+    if not exists:
+        raise JobError(f'{name} does not exist in storage')
+    return name
+
+
+def _colorize(job, mode):
+    # Imported here so jobs share the colorizer (and its settings) with the predict views
+    from .views import run_prediction
+
+    fmt = (job.params or {}).get('format', 'png')
+    if fmt not in CONTENT_TYPES:
+        raise JobError(f"Unsupported format {fmt!r}; use one of {', '.join(CONTENT_TYPES)}")
+    if mode not in COLORIZE_MODES:
+        raise JobError(f"Unsupported mode {mode!r}; use resize, tiled or full")
+    source = _scene_source(job)
+    with default_storage.open(source, 'rb') as image_file:
+        data = run_prediction(image_file, None if mode == 'resize' else mode, fmt)
+    output = default_storage.save(user_storage_name('colorized', job.user_id, f'{job.job_id}.{fmt}'), ContentFile(data))
+    return {
+        'source': source,
+        'storage_path': output,
+        'url': default_storage.url(output),
+        'content_type': CONTENT_TYPES[fmt],
+        'bytes': len(data),
+        'mode': mode or 'resize',
+    }
+
+
+@register('colorize-scene')
+def colorize_scene(job):
+    """Colorize a stored image; params: image_id or storage_path, optional format and mode"""
+    return _colorize(job, (job.params or {}).get('mode'))
+
+
+@register('tiled-colorize')
+def tiled_colorize(job):
+    """Colorize a stored scene at full resolution through overlapping tiles"""
+    return _colorize(job, 'tiled')
@@ -0,0 +1,57 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from model.runtime import autotune, cpu_count, save_runtime_config
+
+
+def int_list(value):
+    return [int(v) for v in value.split(',') if v]
+
+
+class Command(BaseCommand):
+    help = ('Sweep torch intra/inter-op threads, process count and batch size for the configured generator on '
+            'this machine and save the best settings to INFERENCE_RUNTIME_CONFIG')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--output', default=settings.INFERENCE_RUNTIME_CONFIG,
+                            help='Where to write the tuned settings (default: INFERENCE_RUNTIME_CONFIG)')
+        parser.add_argument('--cpus', type=int, default=cpu_count(), help='Cores to share between processes')
+        parser.add_argument('--processes', type=int_list, help='Process counts to try, e.g. 1,2,4 (default: powers of 2 up to --cpus)')
+        parser.add_argument('--batch-sizes', type=int_list, default=[1, 2, 4, 8], help='Batch sizes to try')
+        parser.add_argument('--inter-op-threads', type=int_list, default=[1, 2], help='Inter-op pool sizes to try')
+        parser.add_argument('--max-p99-ms', type=float,
+                            help='Latency budget per forward pass; the fastest setting within it wins')
+        parser.add_argument('--duration', type=float, default=3.0, help='Seconds measured per trial')
+        parser.add_argument('--warmup', type=int, default=3, help='Untimed forward passes per process and trial')
+
+    def handle(self, *args, **options):
+        if not options['output']:
+            raise CommandError('Set INFERENCE_RUNTIME_CONFIG or pass --output')
+        # Imported here so the trials build the same colorizer as the web process
+        from core.views import local_colorizer_options
+
+        def progress(trial):
+            self.stdout.write(
+                f"processes={trial['processes']:<3} intra={trial['intra_op_threads']:<3} "
+                f"inter={trial['inter_op_threads']:<2} batch={trial['batch_size']:<3} "
+                f"{trial['images_per_s']:>8.1f} img/s  p50 {trial['p50_ms']:>8.1f} ms  p99 {trial['p99_ms']:>8.1f} ms"
+            )
+
+        config = autotune(
+            local_colorizer_options(),
+            cpus=options['cpus'],
+            processes=options['processes'],
+            batch_sizes=options['batch_sizes'],
+            inter_op_threads=options['inter_op_threads'],
+            max_p99_ms=options['max_p99_ms'],
+            warmup=options['warmup'],
+            duration=options['duration'],
+            progress=progress,
+        )
+        save_runtime_config(config, options['output'])
+        self.stdout.write(self.style.SUCCESS(
+            f"Wrote {options['output']}: {config['workers']} processes x {config['intra_op_threads']} intra-op / "
+            f"{config['inter_op_threads']} inter-op threads, batch size {config['max_batch_size']} "
+            f"({config['images_per_s']:.1f} img/s, p99 {config['p99_ms']:.1f} ms). "
+            f"Run that many gunicorn workers (or run_inference_workers picks it up)."
+        ))
@@ -0,0 +1,29 @@
+import torch
+from django.core.management.base import BaseCommand, CommandError
+
+from model.inference import SARColorizer
+from model.optimize import build_inference_model, check_equivalence
+
+
+class Command(BaseCommand):
+    help = 'Fold BatchNorm into the convs, strip dropout and save a frozen channels_last TorchScript generator'
+
+    def add_arguments(self, parser):
+        parser.add_argument('checkpoint', help='Training checkpoint or serving artifact')
+        parser.add_argument('output', help='Path of the TorchScript file (e.g. model/generator_frozen.ts)')
+        parser.add_argument('--atol', type=float, default=1e-4, help='Max abs difference allowed vs. the original generator')
+
+    def handle(self, *args, **options):
+        colorizer = SARColorizer(checkpoint_path=options['checkpoint'])
+        example = torch.randn(1, 1, 256, 256, device=colorizer.device)
+        frozen = build_inference_model(colorizer.model, example, mode='torchscript', channels_last=True)
+        try:
+            max_diff = check_equivalence(
+                colorizer.model, frozen,
+                torch.randn(2, 1, 256, 256, device=colorizer.device).contiguous(memory_format=torch.channels_last),
+                atol=options['atol'],
+            )
+        except ValueError as e:
+            raise CommandError(str(e))
+        torch.jit.save(frozen, options['output'])
+        self.stdout.write(self.style.SUCCESS(f"Wrote {options['output']} (max abs diff vs. eager {max_diff:.2e})"))
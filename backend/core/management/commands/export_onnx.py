@@ -0,0 +1,30 @@
+import torch
+from django.core.management.base import BaseCommand, CommandError
+
+from model.backends import OnnxRuntimeBackend, export_onnx
+from model.inference import SARColorizer
+
+
+class Command(BaseCommand):
+    help = 'Export the generator to ONNX (dynamic batch/height/width) and check it under ONNX Runtime'
+
+    def add_arguments(self, parser):
+        parser.add_argument('checkpoint', help='Training checkpoint or serving artifact')
+        parser.add_argument('output', help='Path of the ONNX file (e.g. model/generator.onnx)')
+        parser.add_argument('--opset', type=int, default=17)
+        parser.add_argument('--atol', type=float, default=1e-4, help='Max abs difference allowed vs. PyTorch')
+
+    def handle(self, *args, **options):
+        colorizer = SARColorizer(checkpoint_path=options['checkpoint'])
+        export_onnx(colorizer.model, options['output'], opset_version=options['opset'])
+
+        try:
+            runtime = OnnxRuntimeBackend(None, colorizer.device, path=options['output'])
+        except ImportError as e:
+            self.stdout.write(self.style.WARNING(f"Wrote {options['output']} (not verified: {e})"))
+            return
+        example = torch.randn(2, 1, 256, 256, device=colorizer.device)
+        max_diff = (colorizer.forward(example) - runtime(example)).abs().max().item()
+        if max_diff > options['atol']:
+            raise CommandError(f'ONNX Runtime output diverges from PyTorch (max abs diff {max_diff:.2e})')
+        self.stdout.write(self.style.SUCCESS(f"Wrote {options['output']} (max abs diff vs. PyTorch {max_diff:.2e})"))
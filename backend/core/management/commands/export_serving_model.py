@@ -0,0 +1,34 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from model.artifact import export_serving_artifact, load_serving_artifact
+
+
+class Command(BaseCommand):
+    help = 'Export a generator-only, memory-mappable serving artifact from a training checkpoint'
+
+    def add_arguments(self, parser):
+        parser.add_argument('checkpoint', help='Training checkpoint written by fit (e.g. model/checkpoint_epoch_200.pth)')
+        parser.add_argument('output', help='Path of the serving artifact (e.g. model/generator_serving.pt)')
+        parser.add_argument('--c-in', type=int, default=1)
+        parser.add_argument('--c-out', type=int, default=3)
+        parser.add_argument('--no-fuse', dest='fuse', action='store_false',
+                            help='Keep BatchNorm and Dropout layers (e.g. to fine-tune from the artifact)')
+        parser.add_argument('--atol', type=float, default=1e-4,
+                            help='Max abs difference allowed between the fused and original generator')
+
+    def handle(self, *args, **options):
+        try:
+            metadata = export_serving_artifact(
+                options['checkpoint'], options['output'],
+                c_in=options['c_in'], c_out=options['c_out'], fuse=options['fuse'], atol=options['atol'],
+            )
+            load_serving_artifact(options['output'], verify=True)
+        except (OSError, KeyError, ValueError, RuntimeError) as e:
+            raise CommandError(f'Export failed: {e}')
+
+        self.stdout.write(self.style.SUCCESS(
+            f"Wrote {options['output']} ({metadata['size'] / 1024 ** 2:.1f} MB, "
+            f"{metadata['parameters']:,} parameters, sha256 {metadata['sha256'][:12]})"
+        ))
+        if metadata['equivalence_max_diff'] is not None:
+            self.stdout.write(f"Fused Conv/BN (max abs diff vs. original {metadata['equivalence_max_diff']:.2e})")
@@ -0,0 +1,42 @@
+import json
+
+from django.core.management.base import BaseCommand, CommandError
+
+from model.artifact import export_quantized_artifact
+from model.inference import SARColorizer
+from model.quantize import calibration_inputs, quantization_report, quantize_generator
+
+
+class Command(BaseCommand):
+    help = ('Calibrate an INT8 generator on SAR samples, report SSIM/PSNR and latency against FP32 and save it '
+            'for INFERENCE_OPTIMIZE=int8')
+
+    def add_arguments(self, parser):
+        parser.add_argument('checkpoint', help='Training checkpoint or serving artifact')
+        parser.add_argument('calibration_dir', help='SARColorizationDataset-style directory with SAR images')
+        parser.add_argument('--samples', type=int, default=32, help='Number of images to sample for calibration')
+        parser.add_argument('--batch-size', type=int, default=1, help='Batch size for the latency comparison')
+        parser.add_argument('--report', help='Write the report as JSON to this path')
+        parser.add_argument('--output', help='Save the INT8 generator (TorchScript + .json) to this path, the '
+                                             'INFERENCE_INT8_PATH to serve it from')
+
+    def handle(self, *args, **options):
+        colorizer = SARColorizer(checkpoint_path=options['checkpoint'])
+        if colorizer.device.type != 'cpu':
+            raise CommandError('INT8 quantization targets CPU; run with CUDA_VISIBLE_DEVICES=""')
+        try:
+            calibration = calibration_inputs(colorizer, options['calibration_dir'], num_samples=options['samples'])
+        except ValueError as e:
+            raise CommandError(str(e))
+
+        quantized = quantize_generator(colorizer.model, calibration)
+        report = quantization_report(colorizer.model, quantized, calibration, batch_size=options['batch_size'])
+
+        for key, value in report.items():
+            self.stdout.write(f'{key:>12}: {value:.4f}' if isinstance(value, float) else f'{key:>12}: {value}')
+        if options['report']:
+            with open(options['report'], 'w') as f:
+                json.dump(report, f, indent=2)
+        if options['output']:
+            export_quantized_artifact(quantized, calibration[:1], options['output'], colorizer.checkpoint_id, report)
+            self.stdout.write(self.style.SUCCESS(f"Wrote {options['output']}"))
@@ -0,0 +1,28 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from model.runtime import load_runtime_config
+from model.workers import serve
+
+
+class Command(BaseCommand):
+    help = 'Run the pool of inference worker processes that own the colorization model'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--socket', default=settings.INFERENCE_WORKER_SOCKET,
+                            help='Unix socket to listen on (default: INFERENCE_WORKER_SOCKET)')
+        parser.add_argument('--workers', type=int,
+                            help='Number of worker processes (default: the tuned count from '
+                                 'INFERENCE_RUNTIME_CONFIG, else INFERENCE_WORKERS)')
+
+    def handle(self, *args, **options):
+        if not options['socket']:
+            raise CommandError('Set INFERENCE_WORKER_SOCKET or pass --socket')
+        if not options['workers']:
+            runtime_config = load_runtime_config(settings.INFERENCE_RUNTIME_CONFIG or None)
+            options['workers'] = runtime_config['workers'] if runtime_config else settings.INFERENCE_WORKERS
+        # Imported here so the workers build their colorizer from the same settings as the web process
+        from core.views import create_local_colorizer
+
+        self.stdout.write(f"Starting {options['workers']} inference workers on {options['socket']}")
+        serve(options['socket'], create_local_colorizer, num_workers=options['workers'])
@@ -0,0 +1,49 @@
+import signal
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from core.jobs import JobWorker, default_worker_name, registered_job_types
+
+
+class Command(BaseCommand):
+    help = 'Claim and run pending ProcessingJobs (start several processes to scale out)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--concurrency', type=int, default=settings.JOB_WORKER_CONCURRENCY,
+                            help='Jobs run at once by this process (default: JOB_WORKER_CONCURRENCY)')
+        parser.add_argument('--poll-interval', type=float, default=settings.JOB_WORKER_POLL_INTERVAL,
+                            help='Seconds between claims while idle (default: JOB_WORKER_POLL_INTERVAL)')
+        parser.add_argument('--job-types',
+                            help=f"Comma-separated job types to claim (default: all of {', '.join(registered_job_types())})")
+        parser.add_argument('--name', default=default_worker_name(),
+                            help='Worker name stored on claimed jobs (default: host:pid)')
+        parser.add_argument('--once', action='store_true', help='Exit once no due job is left')
+
+    def handle(self, *args, **options):
+        if options['concurrency'] < 1:
+            raise CommandError('--concurrency must be at least 1')
+        job_types = None
+        if options['job_types']:
+            job_types = [job_type for job_type in options['job_types'].split(',') if job_type]
+            unknown = set(job_types) - set(registered_job_types())
+            if unknown:
+                raise CommandError(f"No handler registered for: {', '.join(sorted(unknown))}")
+
+        worker = JobWorker(
+            concurrency=options['concurrency'],
+            poll_interval=options['poll_interval'],
+            job_types=job_types,
+            name=options['name'],
+            stale_after=settings.JOB_WORKER_STALE_AFTER,
+        )
+
+        def shutdown(signum, frame):
+            self.stdout.write('Stopping: finishing running jobs')
+            worker.stop()
+
+        signal.signal(signal.SIGTERM, shutdown)
+        signal.signal(signal.SIGINT, shutdown)
+        self.stdout.write(f"Job worker {worker.name} running {', '.join(job_types or registered_job_types())} "
+                          f"with concurrency {options['concurrency']}")
+        worker.run(once=options['once'])
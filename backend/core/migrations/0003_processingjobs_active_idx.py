@@ -0,0 +1,17 @@
+# Generated by Django 5.2.18 on 2026-10-16 23:34
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0002_processingjobs_worker_fields'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='processingjobs',
+            index=models.Index(condition=models.Q(('status__in', ['pending', 'running'])), fields=['user', 'status', '-priority', 'schedule', 'job_type'], name='processingjobs_active_idx'),
+        ),
+    ]
@@ -0,0 +1,119 @@
+# Generated by Django 5.2.18 on 2026-10-17 01:05
+
+import django.db.models.deletion
+from django.conf import settings
+from django.contrib.postgres import operations as postgres_operations
+from django.db import migrations, models
+
+# Their composite indexes below all lead with user, so the single-column FK indexes only cost writes
+USER_FK_MODELS = {
+    'events': dict(blank=True, null=True, related_name='events'),
+    'notifications': dict(related_name='notifications'),
+    'patterns': dict(related_name='patterns'),
+    'processingjobs': dict(related_name='processing_jobs'),
+    'processingoutputs': dict(related_name='processing_outputs'),
+    'sessions': dict(related_name='sessions'),
+    'viaevents': dict(related_name='via_events'),
+}
+
+
+def _concurrently(schema_editor):
+    return schema_editor.connection.vendor == 'postgresql'
+
+
+class AddIndexConcurrently(postgres_operations.AddIndexConcurrently):
+    """CREATE INDEX CONCURRENTLY on PostgreSQL; a plain CREATE INDEX elsewhere (SQLite in tests)"""
+
+    def database_forwards(self, app_label, schema_editor, from_state, to_state):
+        if _concurrently(schema_editor):
+            super().database_forwards(app_label, schema_editor, from_state, to_state)
+        else:
+            migrations.AddIndex.database_forwards(self, app_label, schema_editor, from_state, to_state)
+
+    def database_backwards(self, app_label, schema_editor, from_state, to_state):
+        if _concurrently(schema_editor):
+            super().database_backwards(app_label, schema_editor, from_state, to_state)
+        else:
+            migrations.AddIndex.database_backwards(self, app_label, schema_editor, from_state, to_state)
+
+
+def drop_user_fk_indexes(apps, schema_editor):
+    concurrently = ' CONCURRENTLY' if _concurrently(schema_editor) else ''
+    for model_name in USER_FK_MODELS:
+        model = apps.get_model('core', model_name)
+        column = model._meta.get_field('user').column
+        for name in schema_editor._constraint_names(model, [column], index=True):
+            schema_editor.execute(f'DROP INDEX{concurrently} IF EXISTS {schema_editor.quote_name(name)}')
+
+
+def create_user_fk_indexes(apps, schema_editor):
+    options = {'concurrently': True} if _concurrently(schema_editor) else {}
+    for model_name in USER_FK_MODELS:
+        model = apps.get_model('core', model_name)
+        schema_editor.execute(schema_editor._create_index_sql(model, fields=[model._meta.get_field('user')], **options))
+
+
+class Migration(migrations.Migration):
+    # The tables are large: build indexes without blocking writes, which PostgreSQL cannot do in a transaction
+    atomic = False
+
+    dependencies = [
+        ('core', '0003_processingjobs_active_idx'),
+    ]
+
+    operations = [
+        AddIndexConcurrently(
+            model_name='events',
+            index=models.Index(fields=['user', '-timestamp', '-id'], name='events_user_timestamp_idx'),
+        ),
+        AddIndexConcurrently(
+            model_name='notifications',
+            index=models.Index(fields=['user', '-created_at', '-id'], name='notifications_user_created_idx'),
+        ),
+        AddIndexConcurrently(
+            model_name='notifications',
+            index=models.Index(condition=models.Q(('is_read', False)), fields=['user', '-created_at'], name='notifications_unread_idx'),
+        ),
+        AddIndexConcurrently(
+            model_name='patterns',
+            index=models.Index(fields=['user', '-confidence'], name='patterns_user_confidence_idx'),
+        ),
+        AddIndexConcurrently(
+            model_name='processingjobs',
+            index=models.Index(fields=['user', '-priority', 'schedule'], name='processingjobs_user_order_idx'),
+        ),
+        AddIndexConcurrently(
+            model_name='processingjobs',
+            index=models.Index(condition=models.Q(('status', 'pending')), fields=['-priority', 'schedule'], name='processingjobs_queue_idx'),
+        ),
+        AddIndexConcurrently(
+            model_name='processingjobs',
+            index=models.Index(condition=models.Q(('status', 'pending')), fields=['schedule'], name='processingjobs_queue_age_idx'),
+        ),
+        AddIndexConcurrently(
+            model_name='processingoutputs',
+            index=models.Index(fields=['user', 'source_format'], name='processingoutputs_format_idx'),
+        ),
+        AddIndexConcurrently(
+            model_name='sessions',
+            index=models.Index(fields=['user', '-created_at', '-id'], name='sessions_user_created_idx'),
+        ),
+        AddIndexConcurrently(
+            model_name='viaevents',
+            index=models.Index(fields=['user', '-created_at', '-id'], name='viaevents_user_created_idx'),
+        ),
+        # Dropped only once the composite indexes exist, and with DROP INDEX CONCURRENTLY instead of the plain
+        # DROP INDEX AlterField would run
+        migrations.SeparateDatabaseAndState(
+            database_operations=[migrations.RunPython(drop_user_fk_indexes, create_user_fk_indexes)],
+            state_operations=[
+                migrations.AlterField(
+                    model_name=model_name,
+                    name='user',
+                    field=models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE,
+                                            to=settings.AUTH_USER_MODEL, **options),
+                )
+                for model_name, options in USER_FK_MODELS.items()
+            ],
+        ),
+    ]
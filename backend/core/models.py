@@ -79,7 +79,7 @@ class UserSettings(models.Model):
 
 class Sessions(models.Model):
     """User sessions"""
-    user = models.ForeignKey(CustomUser, on_delete=models.CASCADE, related_name='sessions')
+    user = models.ForeignKey(CustomUser, on_delete=models.CASCADE, related_name='sessions', db_index=False)
     session_id = models.CharField(max_length=255, unique=True)
     username = models.CharField(max_length=255)
     text = models.TextField()
@@ -94,6 +94,10 @@ class Sessions(models.Model):
 
     class Meta:
         ordering = ['-created_at']
+        indexes = [
+            # Ends in id so keyset pages (core/pagination.py) are index range scans without a sort
+            models.Index(fields=['user', '-created_at', '-id'], name='sessions_user_created_idx'),
+        ]
 
     def __str__(self):
         return f"Session {self.session_id} - {self.user.email}"
@@ -114,7 +118,7 @@ class Images(models.Model):
 
 class Notifications(models.Model):
     """User notifications"""
-    user = models.ForeignKey(CustomUser, on_delete=models.CASCADE, related_name='notifications')
+    user = models.ForeignKey(CustomUser, on_delete=models.CASCADE, related_name='notifications', db_index=False)
     #user_id = models.CharField(max_length=255)
     notification_type = models.CharField(max_length=100)
     notification_channel = models.CharField(max_length=50)
@@ -126,6 +130,12 @@ class Notifications(models.Model):
 
     class Meta:
         ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=['user', '-created_at', '-id'], name='notifications_user_created_idx'),
+            # NotificationsViewSet.unread; stays small however many read notifications pile up
+            models.Index(fields=['user', '-created_at'], condition=models.Q(is_read=False),
+                         name='notifications_unread_idx'),
+        ]
 
     def __str__(self):
         return f"{self.title} - {self.user.email}"
@@ -133,7 +143,8 @@ class Notifications(models.Model):
 
 class Events(models.Model):
     """System events"""
-    user = models.ForeignKey(CustomUser, on_delete=models.CASCADE, related_name='events', null=True, blank=True)
+    user = models.ForeignKey(CustomUser, on_delete=models.CASCADE, related_name='events', null=True, blank=True,
+                             db_index=False)
     chat_session = models.ForeignKey(Sessions, on_delete=models.CASCADE, related_name='events', null=True, blank=True)
     event_id = models.CharField(max_length=255, unique=True)
     event_type = models.CharField(max_length=100)
@@ -143,6 +154,9 @@ class Events(models.Model):
 
     class Meta:
         ordering = ['-timestamp']
+        indexes = [
+            models.Index(fields=['user', '-timestamp', '-id'], name='events_user_timestamp_idx'),
+        ]
 
     def __str__(self):
         return f"Event {self.event_id} - {self.event_type}"
@@ -150,7 +164,7 @@ class Events(models.Model):
 
 class Patterns(models.Model):
     """Behavioral patterns detected"""
-    user = models.ForeignKey(CustomUser, on_delete=models.CASCADE, related_name='patterns')
+    user = models.ForeignKey(CustomUser, on_delete=models.CASCADE, related_name='patterns', db_index=False)
     pattern_id = models.CharField(max_length=255, unique=True)
     pattern_name = models.CharField(max_length=255)
     description = models.TextField()
@@ -158,6 +172,12 @@ class Patterns(models.Model):
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
+    class Meta:
+        indexes = [
+            # PatternsViewSet.high_confidence: a range seek within the user's patterns
+            models.Index(fields=['user', '-confidence'], name='patterns_user_confidence_idx'),
+        ]
+
     def __str__(self):
         return f"{self.pattern_name} - {self.user.email}"
 
@@ -171,18 +191,40 @@ class ProcessingJobs(models.Model):
         ('failed', 'Failed'),
     ]
 
-    user = models.ForeignKey(CustomUser, on_delete=models.CASCADE, related_name='processing_jobs')
+    user = models.ForeignKey(CustomUser, on_delete=models.CASCADE, related_name='processing_jobs', db_index=False)
     job_id = models.CharField(max_length=255, unique=True)
     job_type = models.CharField(max_length=100)
     status = models.CharField(max_length=20, choices=JOB_STATUS_CHOICES, default='pending')
     priority = models.IntegerField(default=0)
     schedule = models.DateTimeField()
     message = models.TextField(blank=True)
+    # Handler input, e.g. {"image_id": "..."} for colorize-scene (see core/jobs.py)
+    params = models.JSONField(default=dict, blank=True)
+    # Set by the worker that claims the job (manage.py run_job_worker)
+    attempts = models.PositiveIntegerField(default=0)
+    worker = models.CharField(max_length=255, blank=True)
+    started_at = models.DateTimeField(null=True, blank=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
     class Meta:
         ordering = ['-priority', 'schedule']
+        indexes = [
+            models.Index(fields=['user', '-priority', 'schedule'], name='processingjobs_user_order_idx'),
+            # Pending and running rows only, grouped by user: the fair-share claim query in core/scheduling.py
+            # reads just these columns
+            models.Index(
+                fields=['user', 'status', '-priority', 'schedule', 'job_type'],
+                condition=models.Q(status__in=['pending', 'running']),
+                name='processingjobs_active_idx',
+            ),
+            # Heads of the claim query with JOB_FAIR_SHARE off: the queue's first jobs by priority and by waiting time
+            models.Index(fields=['-priority', 'schedule'], condition=models.Q(status='pending'),
+                         name='processingjobs_queue_idx'),
+            models.Index(fields=['schedule'], condition=models.Q(status='pending'),
+                         name='processingjobs_queue_age_idx'),
+        ]
 
     def __str__(self):
         return f"Job {self.job_id} - {self.job_type} ({self.status})"
@@ -202,7 +244,7 @@ class JobResults(models.Model):
 
 class ViaEvents(models.Model):
     """Via events tracking"""
-    user = models.ForeignKey(CustomUser, on_delete=models.CASCADE, related_name='via_events')
+    user = models.ForeignKey(CustomUser, on_delete=models.CASCADE, related_name='via_events', db_index=False)
     event_id = models.CharField(max_length=255)
     via_id = models.CharField(max_length=255)
     image = models.CharField(max_length=500)
@@ -212,13 +254,18 @@ class ViaEvents(models.Model):
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
+    class Meta:
+        indexes = [
+            models.Index(fields=['user', '-created_at', '-id'], name='viaevents_user_created_idx'),
+        ]
+
     def __str__(self):
         return f"Via Event {self.event_id} - {self.user.email}"
 
 
 class ProcessingOutputs(models.Model):
     """Processing outputs"""
-    user = models.ForeignKey(CustomUser, on_delete=models.CASCADE, related_name='processing_outputs')
+    user = models.ForeignKey(CustomUser, on_delete=models.CASCADE, related_name='processing_outputs', db_index=False)
     output_id = models.CharField(max_length=255, unique=True)
     source_format = models.CharField(max_length=100)
     text = models.TextField()
@@ -227,6 +274,11 @@ class ProcessingOutputs(models.Model):
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
+    class Meta:
+        indexes = [
+            models.Index(fields=['user', 'source_format'], name='processingoutputs_format_idx'),
+        ]
+
     def __str__(self):
         return f"Output {self.output_id} - {self.user.email}"
 
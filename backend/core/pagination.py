@@ -0,0 +1,95 @@
+"""
+Keyset pagination for tables that only grow (events, notifications, ...).
+
+PageNumberPagination runs a COUNT(*) and an OFFSET scan, so page N reads
+N pages of rows. These paginators filter on the last row served instead:
+``ORDER BY created_at DESC, id DESC`` continues from
+``(created_at, id) < (last.created_at, last.id)``, an index seek that
+costs the same on any page. The ordering always ends in ``id``, so
+positions are unique and cursors never need DRF's tie-breaking offsets.
+"""
+import json
+
+from django.core.exceptions import ValidationError
+from django.db.models import Q
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import CursorPagination
+
+
+def _reverse_ordering(ordering):
+    return tuple(name[1:] if name.startswith('-') else f'-{name}' for name in ordering)
+
+
+class KeysetPagination(CursorPagination):
+    """
+    Newest first on ``(created_at, id)``. The response carries ``next`` and
+    ``previous`` links with opaque cursors and no count.
+    """
+    ordering = ('-created_at', '-id')
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.request = request
+        self.page_size = self.get_page_size(request)
+        if not self.page_size:
+            return None
+
+        self.base_url = request.build_absolute_uri()
+        self.ordering = self.get_ordering(request, queryset, view)
+        self.cursor = self.decode_cursor(request)
+        reverse = self.cursor is not None and self.cursor.reverse
+        current_position = None if self.cursor is None else self.cursor.position
+
+        queryset = queryset.order_by(*(_reverse_ordering(self.ordering) if reverse else self.ordering))
+        if current_position is not None:
+            queryset = queryset.filter(self._beyond(queryset.model, current_position, reverse))
+
+        # One extra row tells whether another page follows
+        results = list(queryset[:self.page_size + 1])
+        self.page = results[:self.page_size]
+        following_position = None
+        if len(results) > len(self.page):
+            following_position = self._get_position_from_instance(results[-1], self.ordering)
+
+        if reverse:
+            self.page.reverse()
+            self.has_next = current_position is not None
+            self.has_previous = following_position is not None
+            self.next_position = current_position
+            self.previous_position = following_position
+        else:
+            self.has_next = following_position is not None
+            self.has_previous = current_position is not None
+            self.next_position = following_position
+            self.previous_position = current_position
+
+        if (self.has_previous or self.has_next) and self.template is not None:
+            self.display_page_controls = True
+        return self.page
+
+    def _get_position_from_instance(self, instance, ordering):
+        fields = [instance._meta.get_field(name.lstrip('-')) for name in ordering]
+        return json.dumps([field.value_to_string(instance) for field in fields], separators=(',', ':'))
+
+    def _beyond(self, model, position, reverse):
+        """Rows after ``position`` in the direction of travel, as a lexicographic comparison on the ordering"""
+        try:
+            raw = json.loads(position)
+            names = [name.lstrip('-') for name in self.ordering]
+            if not isinstance(raw, list) or len(raw) != len(names):
+                raise ValueError(position)
+            values = [model._meta.get_field(name).to_python(value) for name, value in zip(names, raw)]
+        except (TypeError, ValueError, ValidationError):
+            raise NotFound(self.invalid_cursor_message)
+
+        lookups = ['lt' if name.startswith('-') != reverse else 'gt' for name in self.ordering]
+        beyond, equal = Q(), {}
+        for name, lookup, value in zip(names, lookups, values):
+            beyond |= Q(**equal, **{f'{name}__{lookup}': value})
+            equal[name] = value
+        # The leading column's bound on its own lets the planner start the index range at the cursor
+        return Q(**{f'{names[0]}__{lookups[0]}e': values[0]}) & beyond
+
+
+class TimestampKeysetPagination(KeysetPagination):
+    """Most recent first on ``(timestamp, id)``, for Events"""
+    ordering = ('-timestamp', '-id')
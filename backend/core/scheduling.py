@@ -0,0 +1,122 @@
+"""
+Order in which job workers claim ProcessingJobs.
+
+Claiming strictly by ``-priority, schedule`` lets one user's backlog of
+high-priority jobs starve everyone else and leaves low-priority jobs
+waiting forever. Due jobs are ranked instead by:
+
+* fair share: a user's k-th queued job gets turn ``running + k``, where
+  ``running`` counts that user's running jobs, so users with work queued
+  take turns whatever the size of their backlog;
+* aged priority: ``priority + seconds waited / JOB_AGING_SECONDS``, so
+  every JOB_AGING_SECONDS in the queue is worth one priority level. It
+  orders a user's own jobs, users on the same turn (by their best
+  waiting job), and all jobs when JOB_FAIR_SHARE is off;
+* per-type caps: JOB_TYPE_CONCURRENCY bounds the running jobs of a type
+  across all workers.
+
+Aged priority is not something an index can order by, so without fair
+share a queue's next jobs are ranked from two index-ordered heads: its
+``limit`` first jobs by ``-priority, schedule`` (``processingjobs_queue_idx``)
+and its ``limit`` longest-waiting jobs (``processingjobs_queue_age_idx``).
+A job that has waited long enough to outrank the priority head is among
+the longest-waiting, so aging still overrides priority and nothing
+starves, while only ``2 * limit`` rows are read in one query.
+
+With fair share the turns come from one window query over the active
+rows, which ``processingjobs_active_idx`` covers already grouped by user
+(PostgreSQL then only sorts within each user, as an incremental sort).
+In each user's partition ``ROW_NUMBER()`` puts their due jobs first, by
+aged priority, then their running jobs; window counts of both give the
+k-th due job its turn ``running + k`` without any per-user queries.
+Shares and caps are worked out per claim cycle, so workers claiming at
+the same moment can overshoot a cap by one cycle's claims.
+"""
+from django.conf import settings
+from django.db.models import (
+    Case, Count, ExpressionWrapper, F, FloatField, Func, IntegerField, Max, Q, Value, When, Window,
+)
+from django.db.models.functions import RowNumber
+
+from .models import ProcessingJobs
+
+
+class Epoch(Func):
+    """Seconds since the Unix epoch of a datetime expression"""
+    output_field = FloatField()
+
+    def as_postgresql(self, compiler, connection, **extra_context):
+        return self.as_sql(compiler, connection, template='EXTRACT(EPOCH FROM %(expressions)s)::double precision',
+                           **extra_context)
+
+    def as_sqlite(self, compiler, connection, **extra_context):
+        return self.as_sql(compiler, connection, template='((julianday(%(expressions)s) - 2440587.5) * 86400.0)',
+                           **extra_context)
+
+    def as_mysql(self, compiler, connection, **extra_context):
+        return self.as_sql(compiler, connection, template='UNIX_TIMESTAMP(%(expressions)s)', **extra_context)
+
+
+def aged_priority(now, aging_seconds):
+    if aging_seconds <= 0:
+        return ExpressionWrapper(F('priority') * 1.0, output_field=FloatField())
+    waited = Value(now.timestamp()) - Epoch('schedule')
+    return ExpressionWrapper(F('priority') + waited / aging_seconds, output_field=FloatField())
+
+
+def ranked(rows, now, aging_seconds):
+    """``(pk, priority, schedule)`` rows sorted by aged priority, best first"""
+    def key(row):
+        pk, priority, schedule = row
+        waited = (now - schedule).total_seconds() / aging_seconds if aging_seconds > 0 else 0.0
+        return -(priority + waited), schedule, pk
+    return sorted(rows, key=key)
+
+
+def running_by_type(job_types):
+    return dict(
+        ProcessingJobs.objects.filter(status='running', job_type__in=job_types)
+        .order_by().values('job_type').annotate(running=Count('pk')).values_list('job_type', 'running')
+    )
+
+
+def candidate_ids(limit, job_types, now, aging_seconds=None, fair_share=None):
+    """
+    Primary keys of pending jobs in claim order. Up to ``limit`` turns
+    for each user (``limit * limit`` jobs in all; ``2 * limit`` without
+    fair share) are returned, which leaves spare candidates for rows other
+    workers lock first and for types that reach their cap.
+    """
+    aging_seconds = settings.JOB_AGING_SECONDS if aging_seconds is None else aging_seconds
+    fair_share = settings.JOB_FAIR_SHARE if fair_share is None else fair_share
+    queue = ProcessingJobs.objects.filter(status='pending', schedule__lte=now, job_type__in=job_types)
+    if not fair_share:
+        heads = Q(pk__in=queue.order_by('-priority', 'schedule').values('pk')[:limit])
+        if aging_seconds > 0:
+            heads |= Q(pk__in=queue.order_by('schedule').values('pk')[:limit])
+        rows = ProcessingJobs.objects.filter(heads).order_by().values_list('pk', 'priority', 'schedule')
+        return [pk for pk, *_ in ranked(rows, now, aging_seconds)]
+
+    score = aged_priority(now, aging_seconds)
+    pending = Case(When(status='pending', then=1), output_field=IntegerField())
+    mine = {'partition_by': [F('user')]}
+    turns = (
+        # status__in repeats the partial index condition so planners pick processingjobs_active_idx
+        ProcessingJobs.objects.filter(status__in=['pending', 'running'], job_type__in=job_types)
+        .filter(Q(status='running') | Q(schedule__lte=now))
+        .annotate(
+            score=score,
+            # A user's due jobs come first in their partition, best aged priority first, then their running jobs
+            k=Window(RowNumber(), order_by=[pending.asc(nulls_last=True), F('score').desc(), F('schedule'), F('pk')],
+                     **mine),
+            queued=Window(Count(pending), **mine),
+            running=Window(Count(Case(When(status='running', then=1))), **mine),
+            best=Window(Max(Case(When(status='pending', then=F('score')))), **mine),
+        )
+        # k <= queued keeps only the due jobs, k <= limit each user's next ``limit`` of them
+        .filter(k__lte=F('queued'))
+        .filter(k__lte=limit)
+        .annotate(turn=F('running') + F('k'))
+        .order_by('turn', F('best').desc(), 'pk')
+    )
+    return list(turns.values_list('pk', flat=True)[:limit * limit])
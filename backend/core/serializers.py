@@ -1,4 +1,5 @@
 from rest_framework import serializers
+from rest_framework.permissions import SAFE_METHODS
 from django.contrib.auth import get_user_model
 from .models import (
     CustomUser, UserCredentials, UserSettings, Sessions, Images,
@@ -9,8 +10,85 @@ from .models import (
 User = get_user_model()
 
 
-
-class UserCredentialsSerializer(serializers.ModelSerializer):
+def _request_query(context):
+    """
+    Method and query parameters of the request being answered, or
+    ``(None, {})`` outside one. Views that keep the request out of the
+    context (it makes file fields absolute URLs) pass ``method`` and
+    ``query_params`` instead.
+    """
+    request = context.get('request')
+    if request is not None:
+        return request.method, request.query_params
+    return context.get('method'), context.get('query_params', {})
+
+
+def _param_paths(query_params, name):
+    return {path.strip() for path in query_params.get(name, '').split(',') if path.strip()}
+
+
+def requested_paths(query_params):
+    """Dotted paths named in ?fields= and ?expand=, with their prefixes (expanding a.b expands a)"""
+    paths = set()
+    for path in _param_paths(query_params, 'fields') | _param_paths(query_params, 'expand'):
+        parts = path.split('.')
+        paths.update('.'.join(parts[:i]) for i in range(1, len(parts) + 1))
+    return paths
+
+
+def includes(context, path):
+    """
+    Whether the expandable field at dotted ``path`` (e.g. ``images``,
+    ``processing_jobs.result.result_data``) is serialized for the request in
+    ``context``. Viewsets ask the same question to decide what to load.
+    """
+    method, query_params = _request_query(context)
+    if method not in SAFE_METHODS:
+        return True
+    # Retrieving one object shows its own heavy fields; lists and nested objects only on request
+    if '.' not in path and getattr(context.get('view'), 'action', None) == 'retrieve':
+        return True
+    return path in requested_paths(query_params)
+
+
+class SparseFieldsMixin:
+    """
+    Sparse fieldsets for GET responses.
+
+    ``?fields=id,status`` keeps only the named fields and ``?expand=images``
+    adds fields listed in ``Meta.expandable_fields``, which are left out by
+    default. Both take dotted paths into nested serializers, e.g.
+    ``?expand=processing_jobs.result.result_data``.
+    """
+
+    def _path(self):
+        names, node = [], self
+        while node.parent is not None:
+            if node.field_name:
+                names.append(node.field_name)
+            node = node.parent
+        return '.'.join(reversed(names))
+
+    def get_fields(self):
+        fields = super().get_fields()
+        path = self._path()
+        prefix = f'{path}.' if path else ''
+        for name in getattr(self.Meta, 'expandable_fields', ()):
+            if not includes(self.context, prefix + name):
+                fields.pop(name, None)
+        method, query_params = _request_query(self.context)
+        if method in SAFE_METHODS:
+            selected = {
+                name[len(prefix):].split('.')[0] for name in _param_paths(query_params, 'fields')
+                if name.startswith(prefix)
+            }
+            if selected:
+                fields = {name: field for name, field in fields.items() if name in selected}
+        return fields
+
+
+
+class UserCredentialsSerializer(SparseFieldsMixin, serializers.ModelSerializer):
     class Meta:
         model = UserCredentials
         fields = ['id', 'user', 'user_id', 'username', 'password_hash', 
@@ -23,7 +101,7 @@ class UserCredentialsSerializer(serializers.ModelSerializer):
         }
 
 
-class UserSettingsSerializer(serializers.ModelSerializer):
+class UserSettingsSerializer(SparseFieldsMixin, serializers.ModelSerializer):
     class Meta:
         model = UserSettings
         fields = ['id', 'user', 'user_id', 'meta_analysis_after_days', 
@@ -34,7 +112,7 @@ class UserSettingsSerializer(serializers.ModelSerializer):
         }
 
 
-class ImagesSerializer(serializers.ModelSerializer):
+class ImagesSerializer(SparseFieldsMixin, serializers.ModelSerializer):
     class Meta:
         model = Images
         fields = ['id', 'session', 'user_id', 'image_id', 'storage_path', 
@@ -45,7 +123,7 @@ class ImagesSerializer(serializers.ModelSerializer):
         }
 
 
-class SessionsSerializer(serializers.ModelSerializer):
+class SessionsSerializer(SparseFieldsMixin, serializers.ModelSerializer):
     images = ImagesSerializer(many=True, read_only=True)
     
     class Meta:
@@ -53,13 +131,14 @@ class SessionsSerializer(serializers.ModelSerializer):
         fields = ['id', 'user', 'session_id', 'username', 'text', 'type', 
                  'date', 'total_cnt', 'user_status', 'user_status_date', 
                  'post_analysis_at', 'images', 'created_at', 'updated_at']
+        expandable_fields = ['images']
         extra_kwargs = {
             'created_at': {'read_only': True},
             'updated_at': {'read_only': True},
         }
 
 
-class NotificationsSerializer(serializers.ModelSerializer):
+class NotificationsSerializer(SparseFieldsMixin, serializers.ModelSerializer):
     class Meta:
         model = Notifications
         fields = ['id', 'user', 'user_id', 'notification_type', 
@@ -71,7 +150,7 @@ class NotificationsSerializer(serializers.ModelSerializer):
         }
 
 
-class EventsSerializer(serializers.ModelSerializer):
+class EventsSerializer(SparseFieldsMixin, serializers.ModelSerializer):
     class Meta:
         model = Events
         fields = ['id', 'user', 'chat_session', 'event_id', 'event_type', 
@@ -82,7 +161,7 @@ class EventsSerializer(serializers.ModelSerializer):
         }
 
 
-class PatternsSerializer(serializers.ModelSerializer):
+class PatternsSerializer(SparseFieldsMixin, serializers.ModelSerializer):
     class Meta:
         model = Patterns
         fields = ['id', 'user', 'pattern_id', 'pattern_name', 'description', 
@@ -93,52 +172,60 @@ class PatternsSerializer(serializers.ModelSerializer):
         }
 
 
-class JobResultsSerializer(serializers.ModelSerializer):
+class JobResultsSerializer(SparseFieldsMixin, serializers.ModelSerializer):
     class Meta:
         model = JobResults
         fields = ['id', 'job', 'result_id', 'result_data', 'created_at', 'updated_at']
+        expandable_fields = ['result_data']
         extra_kwargs = {
             'created_at': {'read_only': True},
             'updated_at': {'read_only': True},
         }
 
 
-class ProcessingJobsSerializer(serializers.ModelSerializer):
+class ProcessingJobsSerializer(SparseFieldsMixin, serializers.ModelSerializer):
     result = JobResultsSerializer(read_only=True)
     
     class Meta:
         model = ProcessingJobs
         fields = ['id', 'user', 'job_id', 'job_type', 'status', 'priority', 
-                 'schedule', 'message', 'result', 'created_at', 'updated_at']
+                 'schedule', 'message', 'params', 'attempts', 'worker', 'started_at',
+                 'finished_at', 'result', 'created_at', 'updated_at']
         extra_kwargs = {
+            'attempts': {'read_only': True},
+            'worker': {'read_only': True},
+            'started_at': {'read_only': True},
+            'finished_at': {'read_only': True},
             'created_at': {'read_only': True},
             'updated_at': {'read_only': True},
         }
 
 
-class ViaEventsSerializer(serializers.ModelSerializer):
+class ViaEventsSerializer(SparseFieldsMixin, serializers.ModelSerializer):
     class Meta:
         model = ViaEvents
         fields = ['id', 'user', 'event_id', 'via_id', 'image', 'stage_status', 
                  'stage_data', 'message', 'created_at', 'updated_at']
+        expandable_fields = ['stage_data']
         extra_kwargs = {
             'created_at': {'read_only': True},
             'updated_at': {'read_only': True},
         }
 
 
-class ProcessingOutputsSerializer(serializers.ModelSerializer):
+class ProcessingOutputsSerializer(SparseFieldsMixin, serializers.ModelSerializer):
     class Meta:
         model = ProcessingOutputs
         fields = ['id', 'user', 'output_id', 'source_format', 'text', 
                  'storage_path', 'meta_data', 'created_at', 'updated_at']
+        expandable_fields = ['meta_data']
         extra_kwargs = {
             'created_at': {'read_only': True},
             'updated_at': {'read_only': True},
         }
 
 
-class SourceDownloadsSerializer(serializers.ModelSerializer):
+class SourceDownloadsSerializer(SparseFieldsMixin, serializers.ModelSerializer):
     class Meta:
         model = SourceDownloads
         fields = ['id', 'user', 'source_id', 'user_id', 'created_at', 'updated_at']
@@ -217,7 +304,7 @@ class CustomRegisterSerializer(RegisterSerializer):
         user.save()
         return user
 
-class CustomUserSerializer(serializers.ModelSerializer):
+class CustomUserSerializer(SparseFieldsMixin, serializers.ModelSerializer):
     avatar = serializers.ImageField(required=False)
     processing_jobs = ProcessingJobsSerializer(many=True, read_only=True)
     images = ImagesSerializer(many=True, read_only=True)
@@ -229,6 +316,7 @@ class CustomUserSerializer(serializers.ModelSerializer):
             'avatar', 'date_joined', 'is_active', 'password',
             'processing_jobs', 'images'
         ]
+        expandable_fields = ['processing_jobs']
         read_only_fields = ['id', 'date_joined']
         extra_kwargs = {'password': {'write_only': True}}
 
@@ -0,0 +1,16 @@
+from django.db.models.signals import post_save
+from django.dispatch import receiver
+
+from .events import publish_job, publish_via_event
+from .models import ProcessingJobs, ViaEvents
+
+
+# Saves through the API and admin; the job worker changes status with .update() and publishes itself
+@receiver(post_save, sender=ProcessingJobs)
+def job_saved(sender, instance, **kwargs):
+    publish_job(instance)
+
+
+@receiver(post_save, sender=ViaEvents)
+def via_event_saved(sender, instance, **kwargs):
+    publish_via_event(instance)
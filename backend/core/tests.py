@@ -1,13 +1,49 @@
-from django.test import TestCase
+import base64
+import multiprocessing
+import os
+import shutil
+import signal
+import tempfile
+import threading
+import time
+from datetime import timedelta
+
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
 from django.contrib.auth import get_user_model
 from rest_framework.test import APITestCase
 from rest_framework import status
 from django.urls import reverse
-from .models import Sessions, Notifications, Patterns
+from .models import Images, Sessions, Notifications, Patterns
 
 User = get_user_model()
 
 
+def randomize_batchnorm_stats(model, mean_range=0.5):
+    """Give BatchNorm layers non-trivial running stats, so Conv/BN folding has something to fold"""
+    import torch
+
+    for module in model.modules():
+        if isinstance(module, torch.nn.BatchNorm2d):
+            module.running_mean.uniform_(-mean_range, mean_range)
+            module.running_var.uniform_(0.5, 2.0)
+    return model
+
+
+def fake_colorizer(backend=None):
+    """A CPU SARColorizer without weights; ``backend`` stands in for the generator"""
+    import torch
+    from model.inference import SARColorizer
+
+    colorizer = SARColorizer.__new__(SARColorizer)
+    colorizer.device = torch.device('cpu')
+    if backend is not None:
+        colorizer.backend = backend
+    return colorizer
+
+
 class CustomUserModelTest(TestCase):
     def setUp(self):
         self.user = User.objects.create_user(
@@ -142,4 +178,1497 @@ class NotificationsAPITest(APITestCase):
         response = self.client.post(url)
         self.assertEqual(response.status_code, status.HTTP_200_OK)
         notification.refresh_from_db()
-        self.assertTrue(notification.is_read)
\ No newline at end of file
+        self.assertTrue(notification.is_read)
+
+class MicroBatcherTest(TestCase):
+    class FakeColorizer:
+        def __init__(self):
+            self.batch_sizes = []
+
+        def forward(self, input_tensor):
+            self.batch_sizes.append(input_tensor.shape[0])
+            return input_tensor.repeat(1, 3, 1, 1)
+
+    def test_concurrent_requests_share_forward(self):
+        import torch
+        from model.batching import MicroBatcher
+
+        colorizer = self.FakeColorizer()
+        batcher = MicroBatcher(colorizer, max_batch_size=4, window_ms=200)
+        results = {}
+
+        def run(i):
+            results[i] = batcher.forward(torch.full((1, 1, 8, 8), float(i)))
+
+        threads = [threading.Thread(target=run, args=(i,)) for i in range(4)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+
+        self.assertEqual(colorizer.batch_sizes, [4])
+        for i, output in results.items():
+            self.assertEqual(tuple(output.shape), (1, 3, 8, 8))
+            self.assertTrue(bool((output == i).all()))
+
+    def test_batches_run_concurrently_up_to_the_limit(self):
+        import torch
+        from model.batching import MicroBatcher
+
+        running, peak, lock = [0], [0], threading.Lock()
+
+        class SlowColorizer:
+            def forward(self, input_tensor):
+                with lock:
+                    running[0] += 1
+                    peak[0] = max(peak[0], running[0])
+                time.sleep(0.2)
+                with lock:
+                    running[0] -= 1
+                return input_tensor.repeat(1, 3, 1, 1)
+
+        batcher = MicroBatcher(SlowColorizer(), max_batch_size=1, window_ms=0, concurrency=3)
+        threads = [threading.Thread(target=batcher.forward, args=(torch.zeros(1, 1, 4, 4),)) for _ in range(6)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        self.assertEqual(peak[0], 3)
+
+    def test_batch_limit_counts_samples(self):
+        import torch
+        from model.batching import MicroBatcher
+
+        colorizer = self.FakeColorizer()
+        batcher = MicroBatcher(colorizer, max_batch_size=4, window_ms=200)
+        results = {}
+
+        def run(i, samples):
+            results[i] = batcher.forward(torch.full((samples, 1, 8, 8), float(i)))
+
+        # Tiled requests of 2, 2 and 3 tiles: the third would overflow the first batch, so it starts the next
+        threads = []
+        for i, samples in enumerate([2, 2, 3]):
+            threads.append(threading.Thread(target=run, args=(i, samples)))
+            threads[-1].start()
+            time.sleep(0.02)
+        for t in threads:
+            t.join()
+
+        self.assertEqual(colorizer.batch_sizes, [4, 3])
+        for i, samples in enumerate([2, 2, 3]):
+            self.assertEqual(tuple(results[i].shape), (samples, 3, 8, 8))
+            self.assertTrue(bool((results[i] == i).all()))
+
+
+class WorkerPoolTest(TestCase):
+    class DoublingColorizer:
+        checkpoint_id = 'doubling'
+        model_id = 'doubling|optimize=none|backend=eager'
+        device = 'cpu'
+
+        def forward(self, input_tensor):
+            # Negative inputs stand in for a request that outlives the client's timeout
+            if bool((input_tensor < 0).any()):
+                time.sleep(1.0)
+            return input_tensor.repeat(1, 3, 1, 1) * 2
+
+    @staticmethod
+    def serve(socket_path, colorizer_factory):
+        from multiprocessing import resource_tracker
+        from model.workers import serve
+
+        # A separate process in production; forked from the test process the pool would share the
+        # client's resource tracker, which then sees segments unregistered twice
+        resource_tracker._resource_tracker = resource_tracker.ResourceTracker()
+        serve(socket_path, colorizer_factory, num_workers=1)
+
+    def setUp(self):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory, True)
+        self.socket_path = os.path.join(directory, 'workers.sock')
+        self.server = multiprocessing.get_context('fork').Process(
+            target=self.serve, args=(self.socket_path, self.DoublingColorizer),
+        )
+        self.server.start()
+        self.addCleanup(self.server.join, 10)
+        self.addCleanup(self.server.terminate)
+        deadline = time.monotonic() + 10
+        while not os.path.exists(self.socket_path) and time.monotonic() < deadline:
+            time.sleep(0.05)
+
+    def test_round_trip_through_shared_memory(self):
+        import torch
+        from model.workers import WorkerPoolBackend
+
+        backend = WorkerPoolBackend(self.socket_path, timeout=10)
+        self.addCleanup(backend.close)
+        self.assertEqual(backend.info()['workers'], 1)
+        for shape in ((2, 1, 8, 8), (1, 1, 32, 16)):  # the second outgrows and replaces the segments
+            inputs = torch.rand(shape)
+            output = backend(inputs)
+            self.assertEqual(tuple(output.shape), (shape[0], 3) + shape[2:])
+            self.assertTrue(torch.equal(output, inputs.repeat(1, 3, 1, 1) * 2))
+
+    def test_timed_out_requests_leave_their_segments_behind(self):
+        import torch
+        from multiprocessing import shared_memory
+        from model.workers import WorkerPoolBackend
+
+        backend = WorkerPoolBackend(self.socket_path, timeout=0.3)
+        self.addCleanup(backend.close)
+        backend(torch.ones(1, 1, 4, 4))
+        stale = backend._local.output.name
+        with self.assertRaises(OSError):
+            backend(torch.full((1, 1, 4, 4), -1.0))
+        # The worker still writes the late result, but into a segment no later request reads
+        with self.assertRaises(FileNotFoundError):
+            shared_memory.SharedMemory(name=stale)
+        self.assertIsNone(backend._local.output)
+
+        backend.timeout = 10
+        self.assertTrue(torch.equal(backend(torch.ones(1, 1, 4, 4)), torch.full((1, 3, 4, 4), 2.0)))
+        self.assertNotEqual(backend._local.output.name, stale)
+
+    def test_workers_unmap_segments_the_client_replaced(self):
+        from types import SimpleNamespace
+        from unittest import mock
+        from model.workers import _Segments
+
+        def attach_fake(name):
+            return SimpleNamespace(name=name, close=mock.Mock())
+
+        segments = _Segments()
+        with mock.patch('model.workers._attach', side_effect=attach_fake) as attach:
+            first = segments.get('psm_first', ('client', 'output'))
+            self.assertIs(segments.get('psm_first', ('client', 'output')), first)
+            segments.get('psm_second', ('client', 'output'))
+        self.assertEqual(attach.call_count, 2)
+        first.close.assert_called_once_with()
+        self.assertEqual(len(segments._segments), 1)
+
+    def test_dead_workers_are_replaced(self):
+        import torch
+        from model.workers import WorkerPoolBackend
+
+        backend = WorkerPoolBackend(self.socket_path, timeout=10)
+        self.addCleanup(backend.close)
+        pid = backend.info()['pid']
+        os.kill(pid, signal.SIGKILL)
+        # The next connection waits in the listen backlog until the replacement accepts it
+        self.assertNotEqual(backend.info()['pid'], pid)
+        self.assertTrue(torch.equal(backend(torch.ones(1, 1, 4, 4)), torch.full((1, 3, 4, 4), 2.0)))
+
+
+class TiledColorizationTest(TestCase):
+    class IdentityColorizer:
+        device = 'cpu'
+
+        def forward(self, input_tensor):
+            return input_tensor.repeat(1, 3, 1, 1)
+
+    def test_tiles_blend_back_to_native_resolution(self):
+        import numpy as np
+        from model.tiling import colorize_tiled
+
+        rng = np.random.default_rng(0)
+        scene = rng.integers(0, 256, size=(300, 517), dtype=np.uint8)
+        output = colorize_tiled(self.IdentityColorizer(), scene, tile_size=64, overlap=16, batch_size=3)
+
+        self.assertEqual(output.shape, (300, 517, 3))
+        diff = np.abs(output.astype(np.int16) - scene[:, :, None].astype(np.int16))
+        self.assertLessEqual(int(diff.max()), 1)
+
+    def test_full_mode_pads_runs_once_and_crops(self):
+        import io
+        import numpy as np
+        from PIL import Image
+
+        shapes = []
+
+        def backend(input_tensor):
+            shapes.append(tuple(input_tensor.shape))
+            return input_tensor.repeat(1, 3, 1, 1)
+
+        colorizer = fake_colorizer(backend)
+        scene = np.random.default_rng(0).integers(0, 256, size=(300, 517), dtype=np.uint8)
+        upload = io.BytesIO()
+        Image.fromarray(scene).save(upload, format='PNG')
+
+        upload.seek(0)
+        output = np.array(colorizer.colorize_image(upload, mode='full'))
+        self.assertEqual(shapes, [(1, 1, 512, 768)])
+        self.assertEqual(output.shape, (300, 517, 3))
+        diff = np.abs(output.astype(np.int16) - scene[:, :, None].astype(np.int16))
+        self.assertLessEqual(int(diff.max()), 1)
+
+        # Above max_pixels the same request goes through 256x256 tiles
+        shapes.clear()
+        upload.seek(0)
+        output = colorizer.colorize_image(upload, mode='full', max_pixels=256 * 256, batch_size=8)
+        self.assertEqual(output.size, (517, 300))
+        self.assertTrue(all(shape[2:] == (256, 256) for shape in shapes))
+
+
+class PrePostProcessingTest(TestCase):
+    def test_round_trip_reuses_input_buffer(self):
+        import numpy as np
+        import torch
+        from PIL import Image
+
+        colorizer = fake_colorizer()
+        rng = np.random.default_rng(0)
+        image = Image.fromarray(rng.integers(0, 256, size=(256, 256, 3), dtype=np.uint8))
+
+        first = colorizer.preprocess_image(image)
+        expected = torch.from_numpy(np.array(image.convert('L'))).float() / 127.5 - 1.0
+        self.assertEqual(tuple(first.shape), (1, 1, 256, 256))
+        self.assertTrue(torch.allclose(first[0, 0], expected, atol=1e-6))
+        second = colorizer.preprocess_image(image.resize((400, 300)))
+        self.assertEqual(first.data_ptr(), second.data_ptr())
+
+        output = colorizer.postprocess(expected.expand(1, 3, 256, 256).clone())
+        self.assertEqual((output.mode, output.size), ('RGB', (256, 256)))
+        diff = np.abs(np.array(output)[:, :, 0].astype(np.int16) - np.array(image.convert('L')).astype(np.int16))
+        self.assertLessEqual(int(diff.max()), 1)
+
+    def test_large_uploads_decode_at_reduced_size(self):
+        import io
+        import numpy as np
+        from PIL import Image
+
+        colorizer = fake_colorizer()
+        scene = Image.fromarray(np.random.default_rng(0).integers(0, 256, size=(2400, 3000, 3), dtype=np.uint8))
+        for fmt in ('JPEG', 'PNG'):
+            upload = io.BytesIO()
+            scene.save(upload, format=fmt)
+            upload.seek(0)
+            reduced = colorizer.load_image(upload)
+            self.assertEqual(reduced.mode, 'L')
+            self.assertGreaterEqual(min(reduced.size), 512)
+            self.assertLess(min(reduced.size), 1200)
+
+            upload.seek(0)
+            self.assertEqual(colorizer.load_array(upload).shape, (2400, 3000))
+
+
+class TiffWindowReaderTest(TestCase):
+    def test_reads_16bit_windows_without_decoding_whole_scene(self):
+        import io
+        import numpy as np
+        from PIL import Image
+        from model.raster import TiffWindowReader, open_raster
+
+        rng = np.random.default_rng(0)
+        scene = rng.integers(0, 65535, size=(300, 517), dtype=np.uint16)
+        buffer = io.BytesIO()
+        Image.fromarray(scene).save(buffer, format='TIFF')
+
+        reader = TiffWindowReader(buffer.getvalue())
+        self.assertEqual(reader.shape, (300, 517))
+        self.assertTrue((reader[10:50, 20:90] == scene[10:50, 20:90]).all())
+        self.assertTrue((reader[::3, ::5] == scene[::3, ::5]).all())
+
+        raster = open_raster(buffer)
+        self.assertEqual(raster[0:8, 0:8].dtype, np.uint8)
+        self.assertEqual(buffer.tell(), 0)
+
+    def test_db_conversion_follows_units(self):
+        import io
+        import numpy as np
+        from PIL import Image, TiffImagePlugin
+        from model.raster import GDAL_METADATA, open_raster
+
+        def tiff(scene, units=None):
+            info = TiffImagePlugin.ImageFileDirectory_v2()
+            if units:
+                item = f'<Item name="" sample="0" role="unittype">{units}</Item>'
+                info[GDAL_METADATA] = f'<GDALMetadata>{item}</GDALMetadata>'
+                info.tagtype[GDAL_METADATA] = 2
+            buffer = io.BytesIO()
+            Image.fromarray(scene).save(buffer, format='TIFF', tiffinfo=info, dpi=(72, 72))
+            return buffer
+
+        rng = np.random.default_rng(0)
+        linear = rng.gamma(1.0, 0.05, size=(64, 80)).astype(np.float32)
+        decibels = 10 * np.log10(linear)
+
+        self.assertTrue(open_raster(tiff(linear)).db)
+        # Linear power is never negative, so negative floats are already in dB
+        self.assertFalse(open_raster(tiff(decibels)).db)
+        # The GeoTIFF band unit wins over the data, and an explicit db over both
+        self.assertFalse(open_raster(tiff(linear, units='dB')).db)
+        self.assertTrue(open_raster(tiff(decibels, units='linear')).db)
+        self.assertTrue(open_raster(tiff(decibels), db=True).db)
+
+        already_db = open_raster(tiff(decibels))[:, :]
+        self.assertEqual(already_db.min(), 0)
+        self.assertEqual(already_db.max(), 255)
+
+    def test_8bit_color_falls_back_to_pil(self):
+        import io
+        import numpy as np
+        from PIL import Image
+        from model.raster import TiffWindowReader, open_raster
+
+        rng = np.random.default_rng(0)
+        scene = rng.integers(0, 256, size=(40, 60, 3), dtype=np.uint8)
+        buffer = io.BytesIO()
+        Image.fromarray(scene).save(buffer, format='TIFF')
+
+        self.assertEqual(TiffWindowReader(buffer.getvalue()).samples, 3)
+        # Luminance needs every channel, which only PIL's convert('L') uses
+        self.assertIsNone(open_raster(buffer))
+        self.assertEqual(buffer.tell(), 0)
+
+
+class ResultCacheTest(TestCase):
+    def test_concurrent_misses_are_coalesced(self):
+        from model.cache import ResultCache
+
+        cache = ResultCache(memory_bytes=1024)
+        calls = []
+
+        def compute():
+            calls.append(1)
+            time.sleep(0.1)
+            return b'colorized'
+
+        threads = [threading.Thread(target=cache.get_or_compute, args=('key', compute)) for _ in range(5)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+
+        self.assertEqual(len(calls), 1)
+        self.assertEqual(cache.get_or_compute('key', compute), b'colorized')
+        stats = cache.stats()
+        self.assertEqual(stats['misses'], 1)
+        self.assertEqual(stats['coalesced'] + stats['hits'], 5)
+
+    def test_disk_tier_evicts_least_recently_used(self):
+        from model.cache import ResultCache
+
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        cache = ResultCache(memory_bytes=0, directory=directory, disk_bytes=25)
+        for age, key in enumerate(('aaaa', 'bbbb', 'cccc')):
+            cache.put(key, b'x' * 10)
+            # Explicit access times: filesystem mtime resolution can be too coarse to order back-to-back writes
+            os.utime(cache._path(key), (1_000_000 + age, 1_000_000 + age))
+
+        self.assertIsNone(cache.get('aaaa'))
+        self.assertEqual(ResultCache(directory=directory).get('cccc'), b'x' * 10)
+        self.assertLessEqual(cache.stats()['disk_bytes'], 25)
+
+    def test_tiers_account_bytes_across_overwrites(self):
+        from model.cache import ResultCache
+
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        cache = ResultCache(memory_bytes=25, directory=directory, disk_bytes=1024)
+        for _ in range(3):
+            cache.put('aaaa', b'x' * 10)
+        cache.put('bbbb', b'y' * 10)
+        self.assertEqual(cache.stats()['disk_bytes'], 20)
+        self.assertEqual(cache.stats()['memory_bytes'], 20)
+
+        cache.put('cccc', b'z' * 10)
+        self.assertEqual(cache.stats()['memory_items'], 2)
+        self.assertEqual(cache.stats()['memory_bytes'], 20)
+        cache.put('dddd', b'w' * 30)
+        self.assertEqual(cache.stats()['memory_bytes'], 20)
+
+    def test_processes_sharing_a_directory_share_its_budget(self):
+        from model.cache import ResultCache
+
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        # One instance per gunicorn worker; each sees the others' files on its next rescan
+        first, second = (ResultCache(memory_bytes=0, directory=directory, disk_bytes=25, disk_rescan_seconds=0)
+                         for _ in range(2))
+        first.put('aaaa', b'x' * 10)
+        second.put('bbbb', b'x' * 10)
+        first.put('cccc', b'x' * 10)
+        self.assertLessEqual(sum(os.path.getsize(os.path.join(root, name))
+                                 for root, _, names in os.walk(directory) for name in names), 25)
+
+    def test_keys_follow_the_serving_config(self):
+        import io
+        from model.cache import CachedColorizer, ResultCache
+
+        class CountingColorizer:
+            calls = 0
+
+            def colorize_encoded(self, image_file, fmt='png', **options):
+                CountingColorizer.calls += 1
+                return b'colorized'
+
+        cache = ResultCache(memory_bytes=1024)
+        for serving_id in ('ckpt|optimize=none|backend=eager|raster_db=None',
+                           'ckpt|optimize=none|backend=eager|raster_db=None',
+                           'ckpt|optimize=torchscript|backend=eager|raster_db=None',
+                           'ckpt|optimize=none|backend=eager|raster_db=False'):
+            CachedColorizer(CountingColorizer(), cache, serving_id).colorize_encoded(io.BytesIO(b'scene'))
+        self.assertEqual(CountingColorizer.calls, 3)
+
+
+class RuntimeConfigTest(TestCase):
+    def test_candidates_fit_cores_and_best_respects_latency_budget(self):
+        from model.runtime import _best, layout_candidates, load_runtime_config, save_runtime_config
+
+        for processes, intra, inter in layout_candidates(8, inter_op_threads=(1,)):
+            self.assertLessEqual(processes * intra, 8)
+        self.assertIn((4, 2, 1), layout_candidates(8, inter_op_threads=(1,)))
+
+        trials = [
+            {'images_per_s': 40.0, 'p99_ms': 300.0},
+            {'images_per_s': 25.0, 'p99_ms': 90.0},
+            {'images_per_s': 10.0, 'p99_ms': 40.0},
+        ]
+        self.assertEqual(_best(trials)['images_per_s'], 40.0)
+        self.assertEqual(_best(trials, max_p99_ms=100)['images_per_s'], 25.0)
+        self.assertEqual(_best(trials, max_p99_ms=10)['p99_ms'], 40.0)
+
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'runtime.json')
+            self.assertIsNone(load_runtime_config(path))
+            save_runtime_config({'format': 'sarnet-runtime-v1', 'intra_op_threads': 2}, path)
+            self.assertEqual(load_runtime_config(path)['intra_op_threads'], 2)
+
+    def test_batch_size_setting_caps_the_tuned_one(self):
+        from core.views import inference_batch_size
+
+        with override_settings(INFERENCE_MAX_BATCH_SIZE=1):
+            self.assertEqual(inference_batch_size({'max_batch_size': 8}), 1)
+        with override_settings(INFERENCE_MAX_BATCH_SIZE=8):
+            self.assertEqual(inference_batch_size({'max_batch_size': 4}), 4)
+            self.assertEqual(inference_batch_size(None), 8)
+
+
+class BenchmarkTest(TestCase):
+    def test_compare_flags_regressions_in_both_directions(self):
+        from model.benchmark import compare, summarize
+
+        latency = summarize([0.010, 0.011, 0.012, 0.030])
+        self.assertEqual(latency['p50'], 11.5)
+        self.assertLessEqual(latency['p95'], latency['p99'])
+
+        def report(p50, images_per_s):
+            return {'results': [{
+                'name': 'model/transpose/fused/batch1',
+                'latency_ms': {'p50': p50, 'p95': p50, 'p99': p50, 'mean': p50},
+                'images_per_s': images_per_s,
+                'peak_rss_mb': 500.0,
+            }]}
+
+        _, regressions = compare(report(10.0, 100.0), report(10.5, 96.0), threshold=0.1)
+        self.assertEqual(regressions, [])
+        _, regressions = compare(report(10.0, 100.0), report(10.0, 80.0), threshold=0.1)
+        self.assertEqual([row['metric'] for row in regressions], ['images_per_s'])
+        _, regressions = compare(report(10.0, 100.0), report(13.0, 100.0), threshold=0.1)
+        self.assertIn('latency_ms.p50', [row['metric'] for row in regressions])
+
+
+class InferenceBuildTest(TestCase):
+    def test_fused_generator_matches_original(self):
+        import torch
+        from model.architecture import Generator
+        from model.optimize import build_inference_model, check_equivalence, fuse_generator
+
+        torch.manual_seed(0)
+        generator = Generator(c_in=1, c_out=3)
+        randomize_batchnorm_stats(generator)
+        generator.eval()
+
+        fused = fuse_generator(generator)
+        self.assertFalse(any(isinstance(m, (torch.nn.BatchNorm2d, torch.nn.Dropout)) for m in fused.modules()))
+
+        example = torch.randn(1, 1, 256, 256)
+        frozen = build_inference_model(generator, example, mode='torchscript')
+        self.assertLess(check_equivalence(generator, frozen, example.contiguous(memory_format=torch.channels_last)), 1e-4)
+
+    def test_fused_serving_artifact_loads_without_refolding(self):
+        import torch
+        from unittest import mock
+        from model.architecture import Generator
+        from model.artifact import export_serving_artifact
+        from model.inference import SARColorizer
+
+        torch.manual_seed(0)
+        generator = Generator(c_in=1, c_out=3)
+        randomize_batchnorm_stats(generator)
+        generator.eval()
+
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        checkpoint = os.path.join(directory, 'checkpoint.pth')
+        torch.save({'generator_state_dict': generator.state_dict()}, checkpoint)
+        metadata = export_serving_artifact(checkpoint, os.path.join(directory, 'generator.pt'))
+        self.assertTrue(metadata['architecture']['fused'])
+        self.assertLess(metadata['equivalence_max_diff'], 1e-4)
+
+        with mock.patch('model.inference.build_inference_model') as rebuild:
+            colorizer = SARColorizer(checkpoint_path=os.path.join(directory, 'generator.pt'), optimize='fused')
+        rebuild.assert_not_called()
+        self.assertTrue(colorizer.channels_last)
+        self.assertFalse(any(isinstance(m, torch.nn.BatchNorm2d) for m in colorizer.model.modules()))
+        example = torch.randn(1, 1, 256, 256)
+        with torch.no_grad():
+            self.assertLess((colorizer.forward(example) - generator(example)).abs().max().item(), 1e-4)
+
+    def test_serving_artifact_round_trip_adopts_the_mapped_weights(self):
+        import torch
+        from unittest import mock
+        from model import artifact
+        from model.architecture import Generator
+        from model.inference import SARColorizer
+
+        torch.manual_seed(0)
+        generator = Generator(c_in=1, c_out=3).eval()
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        checkpoint = os.path.join(directory, 'checkpoint.pth')
+        path = os.path.join(directory, 'generator.pt')
+        torch.save({'generator_state_dict': generator.state_dict(), 'optimizer_state_dict': {}}, checkpoint)
+        metadata = artifact.export_serving_artifact(checkpoint, path, fuse=False)
+        self.assertFalse(metadata['architecture']['fused'])
+        self.assertEqual(metadata['sha256'], artifact.file_sha256(path))
+
+        loaded = []
+
+        def load(*args, **kwargs):
+            loaded.append(artifact.load_serving_artifact(*args, **kwargs)[0])
+            return loaded[-1], metadata
+
+        with mock.patch('model.inference.load_serving_artifact', side_effect=load):
+            colorizer = SARColorizer(checkpoint_path=path, verify_checksum=True)
+        self.assertEqual(colorizer.checkpoint_id, metadata['sha256'])
+        # Built on the meta device, then every parameter and buffer is the mapped tensor itself
+        state_dict = colorizer.model.state_dict()
+        self.assertEqual(set(state_dict), set(loaded[0]))
+        for name, tensor in state_dict.items():
+            self.assertEqual(tensor.device.type, 'cpu', name)
+            self.assertEqual(tensor.data_ptr(), loaded[0][name].data_ptr(), name)
+        example = torch.randn(1, 1, 256, 256)
+        with torch.no_grad():
+            self.assertTrue(torch.equal(colorizer.forward(example), generator(example)))
+
+        with open(path, 'r+b') as f:
+            f.seek(-1, os.SEEK_END)
+            last = f.read(1)
+            f.seek(-1, os.SEEK_END)
+            f.write(bytes([last[0] ^ 1]))
+        with self.assertRaisesRegex(ValueError, 'checksum'):
+            artifact.load_serving_artifact(path, verify=True)
+        with open(path, 'ab') as f:
+            f.write(b'\0')
+        with self.assertRaisesRegex(ValueError, 'truncated'):
+            artifact.load_serving_artifact(path)
+
+
+class QuantizationTest(TestCase):
+    def test_int8_export_tracks_fp32_and_loads_without_calibrating(self):
+        import warnings
+        import torch
+        from unittest import mock
+        from model.architecture import Generator
+        from model.artifact import export_quantized_artifact
+        from model.inference import SARColorizer
+        from model.quantize import quantization_report, quantize_generator
+
+        torch.manual_seed(0)
+        generator = Generator(c_in=1, c_out=3)
+        randomize_batchnorm_stats(generator, mean_range=0.1)
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        checkpoint = os.path.join(directory, 'checkpoint.pth')
+        torch.save({'generator_state_dict': generator.state_dict()}, checkpoint)
+        colorizer = SARColorizer(checkpoint_path=checkpoint)
+
+        def speckle(count):
+            # Log-compressed multi-look speckle in [-1, 1], like preprocessed SAR intensity
+            intensity = torch.distributions.Gamma(4.0, 4.0).sample((count, 1, 256, 256))
+            intensity = torch.log1p(torch.nn.functional.avg_pool2d(intensity, 3, 1, 1))
+            return intensity / intensity.amax(dim=(2, 3), keepdim=True) * 2 - 1
+
+        calibration, held_out = speckle(8), speckle(4)
+        with warnings.catch_warnings(record=True) as caught:
+            warnings.simplefilter('always')
+            quantized = quantize_generator(colorizer.model, calibration)
+            report = quantization_report(colorizer.model, quantized, held_out, runs=1)
+        # Skip-connection concats are requantized explicitly, so their inputs never disagree on qparams
+        self.assertEqual([str(w.message) for w in caught if 'quantization parameters' in str(w.message)], [])
+        self.assertGreater(report['psnr_db'], 32.0)
+        self.assertGreater(report['ssim'], 0.75)
+
+        path = os.path.join(directory, 'generator_int8.ts')
+        export_quantized_artifact(quantized, calibration[:1], path, colorizer.checkpoint_id, report)
+        with mock.patch('model.quantize.prepare_fx') as prepare:
+            int8 = SARColorizer(checkpoint_path=checkpoint, optimize='int8', quantized_path=path)
+        prepare.assert_not_called()
+        self.assertEqual(int8.quantization_report, report)
+        self.assertNotEqual(int8.checkpoint_id, colorizer.checkpoint_id)
+        with torch.no_grad():
+            self.assertTrue(torch.equal(int8.forward(held_out), quantized(held_out)))
+
+        export_quantized_artifact(quantized, calibration[:1], path, 'another-checkpoint', report)
+        with self.assertRaisesRegex(ValueError, 'different checkpoint'):
+            SARColorizer(checkpoint_path=checkpoint, optimize='int8', quantized_path=path)
+
+
+class InferenceBackendTest(TestCase):
+    """TorchScript and ONNX Runtime backends against eager PyTorch, on a two-block U-Net"""
+
+    def tiny_generator(self):
+        import torch
+        from torch import nn
+        from model.architecture import DownsamplingBlock, UpsamplingBlock
+
+        class TinyUnet(nn.Module):
+            def __init__(self):
+                super().__init__()
+                self.down = DownsamplingBlock(1, 4)
+                self.up = UpsamplingBlock(4, 4, use_dropout=True)
+                self.final = nn.Sequential(nn.Conv2d(5, 3, 3, 1, padding=1), nn.Tanh())
+
+            def forward(self, x):
+                return self.final(torch.cat([x, self.up(self.down(x))], 1))
+
+        torch.manual_seed(0)
+        model = TinyUnet()
+        randomize_batchnorm_stats(model)
+        return model.eval()
+
+    def assertMatchesEager(self, backend, model, atol=1e-5):
+        import torch
+        from model.backends import EagerBackend
+
+        # A batch and size other than the 1x1x256x256 example the builds are traced/exported with
+        inputs = torch.rand(3, 1, 64, 96) * 2 - 1
+        expected = EagerBackend(model, torch.device('cpu'))(inputs)
+        actual = backend(inputs)
+        self.assertEqual(actual.shape, expected.shape)
+        self.assertLess((actual - expected).abs().max().item(), atol)
+
+    def test_torchscript_matches_eager(self):
+        import torch
+        from model.backends import create_backend
+
+        model = self.tiny_generator()
+        built = create_backend('torchscript', model, torch.device('cpu'))
+        self.assertMatchesEager(built, model)
+
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        path = os.path.join(directory, 'generator.ts')
+        torch.jit.save(built.module, path)
+        self.assertMatchesEager(create_backend('torchscript', None, torch.device('cpu'), path=path), model)
+
+    def test_onnxruntime_matches_eager(self):
+        import importlib.util
+        import torch
+        from model.backends import create_backend, export_onnx
+
+        if importlib.util.find_spec('onnxruntime') is None:
+            self.skipTest('onnxruntime is not installed')
+        model = self.tiny_generator()
+        self.assertMatchesEager(create_backend('onnxruntime', model, torch.device('cpu')), model)
+
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        path = export_onnx(model, os.path.join(directory, 'generator.onnx'))
+        self.assertMatchesEager(create_backend('onnxruntime', None, torch.device('cpu'), path=path), model)
+
+    def test_backends_must_implement_call(self):
+        import torch
+        from model.backends import InferenceBackend
+
+        class Incomplete(InferenceBackend):
+            name = 'incomplete'
+
+        with self.assertRaises(TypeError):
+            Incomplete(torch.device('cpu'))
+
+    def test_torchscript_build_needs_the_eager_backend(self):
+        from model.inference import SARColorizer
+
+        # Rejected before the checkpoint is even opened
+        for backend in ('torchscript', 'onnxruntime'):
+            with self.assertRaisesRegex(ValueError, 'eager backend'):
+                SARColorizer('missing.pth', optimize='torchscript', backend=backend)
+
+
+class AsyncPredictTest(TestCase):
+    class ThreadReportingColorizer:
+        def colorize_encoded(self, image_file, fmt='png', **options):
+            return f'{fmt}:{threading.current_thread().name}'.encode()
+
+    async def test_missing_image(self):
+        response = await self.async_client.post('/api/predict/')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    async def test_inference_runs_on_executor(self):
+        from unittest import mock
+        from django.core.files.uploadedfile import SimpleUploadedFile
+
+        upload = SimpleUploadedFile('scene.png', b'not-decoded-by-fake', content_type='image/png')
+        with mock.patch('core.views.get_colorizer', return_value=self.ThreadReportingColorizer()):
+            response = await self.async_client.post('/api/predict/', {'image': upload})
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertTrue(base64.b64decode(response.json()['colorized_image']).startswith(b'png:sar-inference'))
+
+    async def test_binary_response_for_image_accept(self):
+        from unittest import mock
+        from django.core.files.uploadedfile import SimpleUploadedFile
+
+        upload = SimpleUploadedFile('scene.png', b'not-decoded-by-fake', content_type='image/png')
+        with mock.patch('core.views.get_colorizer', return_value=self.ThreadReportingColorizer()):
+            response = await self.async_client.post('/api/predict/', {'image': upload}, headers={'accept': 'image/webp'})
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response['Content-Type'], 'image/webp')
+        body = b''.join([chunk async for chunk in response.streaming_content])
+        self.assertTrue(body.startswith(b'webp:'))
+
+    async def test_batch_streams_zip_and_ndjson(self):
+        import io
+        import json
+        import zipfile
+        from unittest import mock
+        from django.core.files.uploadedfile import SimpleUploadedFile
+
+        archive = io.BytesIO()
+        with zipfile.ZipFile(archive, 'w') as zf:
+            zf.writestr('scenes/c.tif', b'c')
+            zf.writestr('notes.txt', b'skipped')
+
+        def uploads():
+            return {
+                'images': [SimpleUploadedFile('a.png', b'a'), SimpleUploadedFile('b.jpg', b'b')],
+                'archive': SimpleUploadedFile('scenes.zip', archive.getvalue(), content_type='application/zip'),
+            }
+
+        with mock.patch('core.views.get_colorizer', return_value=self.ThreadReportingColorizer()):
+            response = await self.async_client.post('/api/predict/batch/?format=webp', uploads())
+            body = b''.join([chunk async for chunk in response.streaming_content])
+            self.assertEqual(response['Content-Type'], 'application/zip')
+            with zipfile.ZipFile(io.BytesIO(body)) as zf:
+                self.assertEqual(sorted(zf.namelist()), ['a.webp', 'b.webp', 'scenes/c.webp'])
+                self.assertTrue(zf.read('a.webp').startswith(b'webp:sar-inference'))
+
+            response = await self.async_client.post('/api/predict/batch/', uploads(),
+                                                    headers={'accept': 'application/x-ndjson'})
+            body = b''.join([chunk async for chunk in response.streaming_content])
+            lines = [json.loads(line) for line in body.decode().splitlines()]
+            self.assertEqual(sorted(line['name'] for line in lines), ['a.png', 'b.jpg', 'scenes/c.tif'])
+            self.assertTrue(all(line['content_type'] == 'image/png' for line in lines))
+
+    async def test_unsupported_format(self):
+        from django.core.files.uploadedfile import SimpleUploadedFile
+
+        upload = SimpleUploadedFile('scene.png', b'', content_type='image/png')
+        response = await self.async_client.post('/api/predict/?format=gif', {'image': upload})
+        self.assertEqual(response.status_code, status.HTTP_406_NOT_ACCEPTABLE)
+
+
+class MetricsTest(TestCase):
+    def test_stage_and_endpoint_metrics_are_exported(self):
+        import io
+        import numpy as np
+        from PIL import Image
+        from prometheus_client import REGISTRY
+
+        def count(name, **labels):
+            return REGISTRY.get_sample_value(name, labels) or 0.0
+
+        colorizer = fake_colorizer(lambda input_tensor: input_tensor.repeat(1, 3, 1, 1))
+        upload = io.BytesIO()
+        Image.fromarray(np.zeros((64, 64), dtype=np.uint8)).save(upload, format='PNG')
+        upload.seek(0)
+
+        stages = ('decode', 'preprocess', 'forward', 'postprocess', 'encode')
+        before = {stage: count('sarnet_inference_stage_seconds_count', stage=stage) for stage in stages}
+        colorizer.colorize_encoded(upload, 'png')
+        for stage in stages:
+            self.assertEqual(count('sarnet_inference_stage_seconds_count', stage=stage), before[stage] + 1)
+
+        self.client.get('/api/health/')
+        with override_settings(METRICS_TOKEN='scrape-secret'):
+            self.assertEqual(self.client.get('/api/metrics/').status_code, 401)
+            self.assertEqual(
+                self.client.get('/api/metrics/', HTTP_AUTHORIZATION='Bearer wrong').status_code, 401
+            )
+            response = self.client.get('/api/metrics/', HTTP_AUTHORIZATION='Bearer scrape-secret')
+        self.assertEqual(response.status_code, 200)
+        body = response.content.decode()
+        self.assertIn('sarnet_inference_stage_seconds_bucket', body)
+        self.assertIn('sarnet_http_request_duration_seconds_count{method="GET",status="200",view="health_check"}', body)
+
+    def test_metrics_are_hidden_without_a_token(self):
+        with override_settings(METRICS_TOKEN=''):
+            self.assertEqual(self.client.get('/api/metrics/').status_code, 404)
+
+
+class JobEngineTest(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(email='jobs@example.com', password='testpass123')
+
+    def create_job(self, job_id, job_type='colorize-scene', priority=0, minutes=-1, **params):
+        from .models import ProcessingJobs
+
+        return ProcessingJobs.objects.create(
+            user=self.user, job_id=job_id, job_type=job_type, priority=priority,
+            schedule=timezone.now() + timedelta(minutes=minutes), params=params,
+        )
+
+    def test_claims_due_jobs_by_priority_once(self):
+        from core.jobs import claim_jobs
+
+        self.create_job('low', priority=1, minutes=-10)
+        self.create_job('high', priority=5)
+        self.create_job('future', priority=9, minutes=10)
+        self.create_job('unknown', job_type='no-such-handler', priority=9)
+
+        claimed = claim_jobs('worker-a', limit=5)
+        self.assertEqual([job.job_id for job in claimed], ['high', 'low'])
+        self.assertTrue(all(job.status == 'running' and job.attempts == 1 and job.worker == 'worker-a'
+                            for job in claimed))
+        self.assertEqual(claim_jobs('worker-b', limit=5), [])
+
+    def test_result_written_with_completion_and_failures_retry(self):
+        from unittest import mock
+        from core import jobs
+        from .models import JobResults, ProcessingJobs
+
+        job = self.create_job('ok')
+        with mock.patch.dict(jobs._handlers, {'colorize-scene': lambda job: {'bytes': 3}}):
+            self.assertEqual(jobs.run_job(jobs.claim_jobs('w', 1)[0]), 'completed')
+        job.refresh_from_db()
+        self.assertEqual(job.status, 'completed')
+        self.assertEqual(JobResults.objects.get(job=job).result_data, {'bytes': 3})
+
+        # Running it again replaces the result rather than adding a second row
+        ProcessingJobs.objects.filter(pk=job.pk).update(status='pending')
+        with mock.patch.dict(jobs._handlers, {'colorize-scene': lambda job: {'bytes': 4}}):
+            self.assertEqual(jobs.run_job(jobs.claim_jobs('w', 1)[0]), 'completed')
+        self.assertEqual(JobResults.objects.get(job=job).result_data, {'bytes': 4})
+
+        flaky = self.create_job('flaky')
+
+        def boom(job):
+            raise OSError('disk full')
+
+        with override_settings(JOB_WORKER_MAX_ATTEMPTS=2, JOB_WORKER_RETRY_DELAY=0), \
+                mock.patch.dict(jobs._handlers, {'colorize-scene': boom}):
+            self.assertEqual(jobs.run_job(jobs.claim_jobs('w', 1)[0]), 'retried')
+            self.assertEqual(jobs.run_job(jobs.claim_jobs('w', 1)[0]), 'failed')
+        flaky.refresh_from_db()
+        self.assertEqual((flaky.status, flaky.attempts, flaky.message), ('failed', 2, 'disk full'))
+        self.assertFalse(JobResults.objects.filter(job=flaky).exists())
+
+    def test_stale_jobs_are_requeued_and_late_results_dropped(self):
+        from core import jobs
+        from .models import JobResults, ProcessingJobs
+
+        self.create_job('stale')
+        claimed = jobs.claim_jobs('dead-worker', 1)[0]
+        ProcessingJobs.objects.filter(pk=claimed.pk).update(updated_at=claimed.updated_at.replace(year=2000))
+        self.assertEqual(jobs.requeue_stale(60), (1, 0))
+
+        again = jobs.claim_jobs('live-worker', 1)[0]
+        self.assertEqual(again.attempts, 2)
+        self.assertEqual(jobs._complete(claimed, {'from': 'dead-worker'}), 'lost')
+        self.assertEqual(jobs._complete(again, {'from': 'live-worker'}), 'completed')
+        self.assertEqual(JobResults.objects.get(job=again).result_data, {'from': 'live-worker'})
+
+    def test_colorize_handler_stores_output(self):
+        from unittest import mock
+        from django.core.files.base import ContentFile
+        from django.core.files.storage import FileSystemStorage
+        from core import jobs
+
+        with tempfile.TemporaryDirectory() as media:
+            storage = FileSystemStorage(location=media, base_url='/media/')
+            scene = storage.save(f'uploads/{self.user.pk}/scene.png', ContentFile(b'scene'))
+            calls = []
+
+            def run_prediction(image_file, mode=None, fmt='png'):
+                calls.append((image_file.read(), mode, fmt))
+                return b'colorized'
+
+            session = Sessions.objects.create(user=self.user, session_id='jobs', username='jobs', text='', type='image',
+                                              date=timezone.now(), user_status='active')
+            Images.objects.create(session=session, user_id=str(self.user.id), image_id='scene',
+                                  storage_path=f'http://testserver/media/{scene}')
+            job = self.create_job('tiles', job_type='tiled-colorize', storage_path=f'http://testserver/media/{scene}',
+                                  format='webp')
+            with mock.patch.object(jobs, 'default_storage', storage), \
+                    mock.patch('core.views.run_prediction', run_prediction):
+                self.assertEqual(jobs.run_job(jobs.claim_jobs('w', 1)[0]), 'completed')
+                job.refresh_from_db()
+                self.assertEqual(calls, [(b'scene', 'tiled', 'webp')])
+                output = f'colorized/{self.user.pk}/tiles.webp'
+                self.assertEqual(job.result.result_data['storage_path'], output)
+                with storage.open(output) as colorized:
+                    self.assertEqual(colorized.read(), b'colorized')
+
+            missing = self.create_job('missing', image_id='nope')
+            with mock.patch.object(jobs, 'default_storage', storage):
+                self.assertEqual(jobs.run_job(jobs.claim_jobs('w', 1)[0]), 'failed')
+            missing.refresh_from_db()
+            self.assertEqual((missing.attempts, missing.message), (1, 'Image nope not found'))
+
+            # Another user's upload stays out of reach, even through a row this user wrote pointing at it
+            other = User.objects.create_user(email='other@example.com', password='testpass123')
+            theirs = storage.save(f'uploads/{other.pk}/other.png', ContentFile(b'not yours'))
+            Images.objects.create(session=session, user_id=str(self.user.id), image_id='borrowed', storage_path=theirs)
+            for job_id, params in (('foreign', {'storage_path': theirs}), ('borrowed', {'image_id': 'borrowed'}),
+                                   ('escape', {'storage_path': f'uploads/{self.user.pk}/../{other.pk}/other.png'})):
+                foreign = self.create_job(job_id, **params)
+                with mock.patch.object(jobs, 'default_storage', storage):
+                    self.assertEqual(jobs.run_job(jobs.claim_jobs('w', 1)[0]), 'failed')
+                foreign.refresh_from_db()
+                self.assertEqual(foreign.message, f'{theirs} is not one of your stored files')
+
+
+class EventStreamTest(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(email='events@example.com', password='testpass123')
+
+    def test_changes_are_published_on_commit(self):
+        import json
+        from unittest import mock
+        from core import events, jobs
+        from .models import ProcessingJobs, ViaEvents
+
+        with mock.patch.object(events.broker, 'dispatch') as dispatch, \
+                mock.patch.dict(jobs._handlers, {'colorize-scene': lambda job: {}}):
+            with self.captureOnCommitCallbacks(execute=True):
+                ProcessingJobs.objects.create(user=self.user, job_id='j1', job_type='colorize-scene',
+                                              schedule=timezone.now())
+                self.assertFalse(dispatch.called)
+            with self.captureOnCommitCallbacks(execute=True):
+                jobs.run_job(jobs.claim_jobs('w', 1)[0])
+            with self.captureOnCommitCallbacks(execute=True):
+                ViaEvents.objects.create(user=self.user, event_id='e1', via_id='v1', image='scene.png',
+                                         stage_status='despeckle', stage_data={'progress': 0.5}, message='')
+
+        messages = [json.loads(call.args[0]) for call in dispatch.call_args_list]
+        self.assertTrue(all(message['user'] == str(self.user.pk) for message in messages))
+        self.assertEqual([(m['event'], m['data'].get('status')) for m in messages],
+                         [('job', 'pending'), ('job', 'running'), ('job', 'completed'), ('via_event', None)])
+        self.assertEqual(messages[-1]['data']['stage_data'], {'progress': 0.5})
+
+    async def test_stream_relays_events_for_the_user(self):
+        import asyncio
+        import json
+        from rest_framework_simplejwt.tokens import AccessToken
+        from core import events
+        from .models import ProcessingJobs
+
+        response = await self.async_client.get('/api/events/stream/')
+        self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
+
+        await ProcessingJobs.objects.acreate(user=self.user, job_id='active', job_type='colorize-scene',
+                                             status='running', schedule=timezone.now())
+        token = str(AccessToken.for_user(self.user))
+        response = await self.async_client.get('/api/events/stream/', headers={'Authorization': f'Bearer {token}'})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response['Content-Type'], 'text/event-stream')
+        stream = aiter(response.streaming_content)
+        self.assertEqual(await anext(stream), b'retry: 3000\n\n')
+        self.assertIn(b'"job_id":"active"', await anext(stream))
+
+        events.broker.dispatch(events.encode({'user': 'someone-else', 'event': 'job', 'data': {'id': 1}}))
+        events.broker.dispatch(events.encode({'user': str(self.user.pk), 'event': 'via_event',
+                                              'data': {'id': 7, 'stage_status': 'done'}}))
+        chunk = (await anext(stream)).decode()
+        self.assertTrue(chunk.startswith('event: via_event\ndata: '))
+        self.assertEqual(json.loads(chunk.split('data: ', 1)[1]), {'id': 7, 'stage_status': 'done'})
+
+        # A client disconnect cancels the task streaming the response
+        pending = asyncio.ensure_future(anext(stream))
+        await asyncio.sleep(0)
+        pending.cancel()
+        with self.assertRaises(asyncio.CancelledError):
+            await pending
+        self.assertNotIn(str(self.user.pk), events.broker._subscriptions)
+
+    def stream_ticket(self):
+        from rest_framework_simplejwt.tokens import AccessToken
+
+        response = self.client.post('/api/events/stream/ticket/',
+                                    HTTP_AUTHORIZATION=f'Bearer {AccessToken.for_user(self.user)}')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        return response.json()['ticket']
+
+    def test_streams_open_with_short_lived_tickets(self):
+        from unittest import mock
+        from django.core import signing
+        from rest_framework_simplejwt.tokens import AccessToken
+
+        self.assertEqual(self.client.post('/api/events/stream/ticket/').status_code, status.HTTP_401_UNAUTHORIZED)
+        ticket = self.stream_ticket()
+        response = self.client.get('/api/events/stream/', {'ticket': ticket})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        response.close()
+
+        # Access tokens do not work in the URL, nor do tickets past their lifetime or other signed values
+        rejected = [str(AccessToken.for_user(self.user)), signing.dumps(str(self.user.pk))]
+        for value in rejected:
+            response = self.client.get('/api/events/stream/', {'ticket': value})
+            self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
+        response = self.client.get('/api/events/stream/', {'token': str(AccessToken.for_user(self.user))})
+        self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
+        with mock.patch('time.time', return_value=time.time() + 3600):
+            response = self.client.get('/api/events/stream/', {'ticket': ticket})
+        self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
+
+    def test_wsgi_stream_delivers_through_the_response_iterator(self):
+        import json
+        from core import events
+
+        response = self.client.get('/api/events/stream/', {'ticket': self.stream_ticket()})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        # Nothing is subscribed until the server starts consuming the stream
+        self.assertNotIn(str(self.user.pk), events.broker._subscriptions)
+        stream = iter(response.streaming_content)
+        self.assertEqual(next(stream), b'retry: 3000\n\n')
+
+        # Dispatched from another thread, as the PostgreSQL listener does
+        thread = threading.Thread(target=events.broker.dispatch, args=(events.encode(
+            {'user': str(self.user.pk), 'event': 'job', 'data': {'id': 3, 'status': 'running'}}
+        ),))
+        thread.start()
+        thread.join()
+        chunk = next(stream).decode()
+        self.assertTrue(chunk.startswith('event: job\ndata: '))
+        self.assertEqual(json.loads(chunk.split('data: ', 1)[1]), {'id': 3, 'status': 'running'})
+
+        with override_settings(EVENTS_KEEPALIVE_SECONDS=0.01):
+            self.assertEqual(next(stream), b': keepalive\n\n')
+        # The server closes the response when the client goes away
+        response.close()
+        self.assertNotIn(str(self.user.pk), events.broker._subscriptions)
+
+    def test_listener_reconnects_end_streams_with_resync(self):
+        from unittest import mock
+        from core import events
+
+        response = self.client.get('/api/events/stream/', {'ticket': self.stream_ticket()})
+        stream = iter(response.streaming_content)
+        self.assertEqual(next(stream), b'retry: 3000\n\n')
+
+        calls = []
+
+        def listen(reconnected):
+            calls.append(reconnected)
+            if reconnected:
+                events.broker.resync()
+                raise SystemExit
+            raise ConnectionError('server closed the connection')
+
+        # The first connection drops; notifications sent until the next LISTEN are lost
+        listener = events.PostgresListener(events.broker)
+        with mock.patch.object(listener, '_listen', listen), mock.patch('core.events.time.sleep'), \
+                mock.patch('core.events.logger'):
+            with self.assertRaises(SystemExit):
+                listener.run()
+        self.assertEqual(calls, [False, True])
+
+        with override_settings(EVENTS_KEEPALIVE_SECONDS=60):
+            self.assertEqual(next(stream), b'event: resync\ndata: {}\n\n')
+        with self.assertRaises(StopIteration):
+            next(stream)
+        response.close()
+        self.assertNotIn(str(self.user.pk), events.broker._subscriptions)
+
+        # A reader blocked on its queue wakes up at once rather than after the keepalive interval
+        subscription = events.broker.subscribe(self.user.pk)
+        self.addCleanup(events.broker.unsubscribe, subscription)
+        timer = threading.Timer(0.1, events.broker.resync)
+        timer.start()
+        started = time.monotonic()
+        self.assertIsNone(subscription.get(60))
+        self.assertLess(time.monotonic() - started, 5)
+        self.assertTrue(subscription.stale)
+        timer.join()
+
+
+class JobSchedulingTest(TestCase):
+    def setUp(self):
+        self.heavy = User.objects.create_user(email='heavy@example.com', password='testpass123')
+        self.light = User.objects.create_user(email='light@example.com', password='testpass123')
+
+    def create_jobs(self, user, prefix, count, job_type='colorize-scene', priority=0, minutes=-1, status='pending'):
+        from .models import ProcessingJobs
+
+        return [
+            ProcessingJobs.objects.create(
+                user=user, job_id=f'{prefix}{i}', job_type=job_type, priority=priority, status=status,
+                schedule=timezone.now() + timedelta(minutes=minutes, seconds=i),
+            ).pk
+            for i in range(count)
+        ]
+
+    def candidates(self, limit, **policy):
+        from core.scheduling import candidate_ids
+        from .models import ProcessingJobs
+
+        policy = {'aging_seconds': 0, 'fair_share': True, **policy}
+        pks = candidate_ids(limit, ['colorize-scene', 'tiled-colorize'], timezone.now(), **policy)
+        names = dict(ProcessingJobs.objects.values_list('pk', 'job_id'))
+        return [names[pk] for pk in pks][:limit]
+
+    def test_users_take_turns_whatever_their_backlog(self):
+        self.create_jobs(self.heavy, 'h', 20, priority=9)
+        self.create_jobs(self.light, 'l', 2)
+        self.assertEqual(self.candidates(4), ['h0', 'l0', 'h1', 'l1'])
+        self.assertEqual(self.candidates(4, fair_share=False), ['h0', 'h1', 'h2', 'h3'])
+
+        # Jobs already running count against the user's share
+        self.create_jobs(self.heavy, 'hr', 2, status='running')
+        self.assertEqual(self.candidates(3), ['l0', 'l1', 'h0'])
+
+    def test_waiting_ages_priority(self):
+        self.create_jobs(self.light, 'old', 1, priority=0, minutes=-60)
+        self.create_jobs(self.heavy, 'new', 1, priority=5)
+        self.assertEqual(self.candidates(2), ['new0', 'old0'])
+        # 60 minutes at one level per 5 minutes outweighs 5 levels of priority
+        self.assertEqual(self.candidates(2, aging_seconds=300), ['old0', 'new0'])
+        self.assertEqual(self.candidates(2, aging_seconds=300, fair_share=False), ['old0', 'new0'])
+
+        # Within a user too: two hours of waiting outrank the user's own newer priority-5 job
+        self.create_jobs(self.heavy, 'stale', 1, priority=0, minutes=-120)
+        self.assertEqual(self.candidates(3), ['new0', 'old0', 'stale0'])
+        self.assertEqual(self.candidates(3, aging_seconds=300), ['stale0', 'old0', 'new0'])
+        self.assertEqual(self.candidates(3, aging_seconds=300, fair_share=False), ['stale0', 'old0', 'new0'])
+
+    def test_type_caps_count_running_jobs(self):
+        from core.jobs import claim_jobs
+
+        self.create_jobs(self.heavy, 'tiled', 5, job_type='tiled-colorize', priority=9)
+        self.create_jobs(self.light, 'scene', 3)
+        self.create_jobs(self.light, 'busy', 1, job_type='tiled-colorize', status='running')
+        with override_settings(JOB_TYPE_CONCURRENCY={'tiled-colorize': 1}):
+            self.assertEqual([job.job_id for job in claim_jobs('w', 2)], ['scene0', 'scene1'])
+        with override_settings(JOB_TYPE_CONCURRENCY={'tiled-colorize': 3}):
+            # The light user's running job also takes one of their turns
+            self.assertEqual([job.job_id for job in claim_jobs('w', 8)], ['tiled0', 'tiled1', 'scene2'])
+
+
+class QueryPlanTest(APITestCase):
+    """
+    EXPLAINs every query the per-user viewset actions run and fails on full
+    table scans or sorts. It checks that some index serves each query, not
+    which one: SQLite only uses a partial index when the query repeats its
+    condition exactly, so it can pick a different index than PostgreSQL
+    (e.g. processingjobs_user_order_idx for ProcessingJobsViewSet.pending).
+    """
+
+    def setUp(self):
+        from .models import (
+            Events, JobResults, ProcessingJobs, ProcessingOutputs, SourceDownloads, ViaEvents,
+        )
+
+        now = timezone.now()
+        self.users = [User.objects.create_user(email=f'plan{u}@example.com', password='testpass123')
+                      for u in range(3)]
+        for u, user in enumerate(self.users):
+            rows = range(30)
+            sessions = Sessions.objects.bulk_create(
+                Sessions(user=user, session_id=f's{u}-{i}', username='plan', text='', type='chat', date=now,
+                         user_status='active') for i in rows
+            )
+            Notifications.objects.bulk_create(
+                Notifications(user=user, notification_type='info', notification_channel='email', title=f'n{i}',
+                              message='', is_read=i % 3 == 0) for i in rows
+            )
+            Events.objects.bulk_create(
+                Events(user=user, chat_session=sessions[i], event_id=f'e{u}-{i}', event_type='click',
+                       timestamp=now - timedelta(minutes=i)) for i in rows
+            )
+            Patterns.objects.bulk_create(
+                Patterns(user=user, pattern_id=f'p{u}-{i}', pattern_name='p', description='', confidence=i / 30)
+                for i in rows
+            )
+            jobs = ProcessingJobs.objects.bulk_create(
+                ProcessingJobs(user=user, job_id=f'j{u}-{i}', job_type='colorize-scene', priority=i % 4,
+                               status=('pending', 'running', 'completed')[i % 3], schedule=now) for i in rows
+            )
+            JobResults.objects.bulk_create(
+                JobResults(job=job, result_id=f'r{job.job_id}', result_data={}) for job in jobs[2::3]
+            )
+            ViaEvents.objects.bulk_create(
+                ViaEvents(user=user, event_id=f'v{i}', via_id='via', image='', stage_status='done', stage_data={},
+                          message='') for i in rows
+            )
+            ProcessingOutputs.objects.bulk_create(
+                ProcessingOutputs(user=user, output_id=f'o{u}-{i}', source_format=('tiff', 'png')[i % 2], text='',
+                                  storage_path='', meta_data={}) for i in rows
+            )
+            SourceDownloads.objects.bulk_create(SourceDownloads(user=user, source_id=f'd{u}-{i}') for i in rows)
+        self.user = self.users[1]
+        self.client.force_authenticate(user=self.user)
+
+    def plan(self, sql):
+        with connection.cursor() as cursor:
+            if connection.vendor == 'postgresql':
+                # Seeded tables are tiny; with seq scans and sorts priced out, any left means no index fits
+                cursor.execute('SET LOCAL enable_seqscan = off')
+                cursor.execute('SET LOCAL enable_sort = off')
+                cursor.execute(f'EXPLAIN {sql}')
+                return '\n'.join(row[0] for row in cursor.fetchall())
+            cursor.execute(f'EXPLAIN QUERY PLAN {sql}')
+            return '\n'.join(row[-1] for row in cursor.fetchall())
+
+    def assertIndexed(self, method, url, **kwargs):
+        import re
+
+        with CaptureQueriesContext(connection) as queries:
+            response = getattr(self.client, method)(url, **kwargs)
+        self.assertLess(response.status_code, 300, url)
+        full_scan = re.compile(r'Seq Scan on core_\w+|^\s*(->\s*)?Sort\s|\bSCAN core_\w+|TEMP B-TREE FOR .*ORDER BY',
+                               re.MULTILINE)
+        checked = 0
+        for query in queries.captured_queries:
+            sql = query['sql']
+            if not re.match(r'(SELECT|UPDATE|DELETE)\b', sql) or 'core_' not in sql:
+                continue
+            plan = self.plan(sql)
+            self.assertIsNone(full_scan.search(plan), f'{method.upper()} {url}\n{sql}\n{plan}')
+            checked += 1
+        self.assertGreater(checked, 0, url)
+
+    def test_list_actions_use_indexes(self):
+        for basename in ('sessions', 'notifications', 'events', 'patterns', 'processingjobs', 'jobresults',
+                         'viaevents', 'processingoutputs', 'sourcedownloads', 'usercredentials', 'usersettings'):
+            self.assertIndexed('get', reverse(f'{basename}-list'))
+
+    def test_later_keyset_pages_use_indexes(self):
+        for basename in ('sessions', 'notifications', 'events', 'viaevents'):
+            response = self.client.get(reverse(f'{basename}-list'))
+            self.assertIndexed('get', response.data['next'])
+
+    def test_filtered_actions_use_indexes(self):
+        self.assertIndexed('get', reverse('notifications-unread'))
+        self.assertIndexed('get', reverse('patterns-high-confidence'))
+        self.assertIndexed('get', reverse('processingjobs-pending'))
+        # ?format= doubles as DRF's renderer override, so json is the one value that reaches the action
+        self.assertIndexed('get', reverse('processingoutputs-by-format'), data={'format': 'json'})
+        self.assertIndexed('post', reverse('notifications-mark-all-read'))
+
+    def test_detail_actions_use_indexes(self):
+        from .models import Events, ProcessingJobs
+
+        session = Sessions.objects.filter(user=self.user).first()
+        notification = Notifications.objects.filter(user=self.user).first()
+        job = ProcessingJobs.objects.filter(user=self.user, status='pending').first()
+        self.assertIndexed('get', reverse('sessions-detail', kwargs={'pk': session.pk}))
+        self.assertIndexed('post', reverse('sessions-mark-analyzed', kwargs={'pk': session.pk}))
+        self.assertIndexed('get', reverse('events-detail', kwargs={'pk': Events.objects.filter(user=self.user)[0].pk}))
+        self.assertIndexed('post', reverse('notifications-mark-read', kwargs={'pk': notification.pk}))
+        self.assertIndexed('post', reverse('processingjobs-cancel', kwargs={'pk': job.pk}))
+        self.assertIndexed('delete', reverse('sessions-clear-history'))
+
+
+class QueryBudgetMixin:
+    """
+    assertQueryBudget(url, budget, seed) requests ``url`` after seed(1) and
+    again after seed(PAGE_SIZE + 5), and fails unless both responses run the
+    same number of queries, at most ``budget``: a nested serializer without
+    a matching prefetch adds queries per row and shows up as a difference.
+    """
+
+    def assertQueryBudget(self, url, budget, seed, **kwargs):
+        from django.conf import settings
+
+        counts = []
+        for rows in (1, settings.REST_FRAMEWORK['PAGE_SIZE'] + 5):
+            seed(rows)
+            with CaptureQueriesContext(connection) as queries:
+                response = self.client.get(url, **kwargs)
+            self.assertEqual(response.status_code, status.HTTP_200_OK, url)
+            counts.append(len(queries))
+        sql = '\n'.join(query['sql'] for query in queries.captured_queries)
+        self.assertEqual(counts[0], counts[1], f'{url}: query count grows with the rows returned\n{sql}')
+        self.assertLessEqual(counts[1], budget, f'{url}: {counts[1]} queries, budget {budget}\n{sql}')
+
+
+class QueryBudgetTest(QueryBudgetMixin, APITestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(email='budget@example.com', password='testpass123')
+        self.client.force_authenticate(user=self.user)
+
+    def seed_jobs(self, user, count):
+        from .models import JobResults, ProcessingJobs
+
+        start = ProcessingJobs.objects.count()
+        jobs = ProcessingJobs.objects.bulk_create(
+            ProcessingJobs(user=user, job_id=f'budget-{start + i}', job_type='colorize-scene', status='completed',
+                           schedule=timezone.now()) for i in range(count)
+        )
+        JobResults.objects.bulk_create(JobResults(job=job, result_id=f'r-{job.job_id}', result_data={}) for job in jobs)
+
+    def seed_own_jobs(self, count):
+        self.seed_jobs(self.user, count)
+
+    def seed_sessions(self, count):
+        start = Sessions.objects.count()
+        for i in range(start, start + count):
+            session = Sessions.objects.create(user=self.user, session_id=f'budget-{i}', username='budget', text='',
+                                              type='image', date=timezone.now(), user_status='active')
+            Images.objects.bulk_create(
+                Images(session=session, user_id=str(self.user.id), image_id=f'{i}-{k}', storage_path='')
+                for k in range(2)
+            )
+
+    def seed_users(self, count):
+        start = User.objects.count()
+        for i in range(start, start + count):
+            self.seed_jobs(User.objects.create_user(email=f'budget{i}@example.com', password='testpass123'), 2)
+
+    def test_sessions_prefetch_images(self):
+        # sessions (keyset paginated, so no count), their images
+        self.assertQueryBudget(reverse('sessions-list'), 2, self.seed_sessions, data={'expand': 'images'})
+
+    def test_jobs_join_their_results(self):
+        self.assertQueryBudget(reverse('processingjobs-list'), 2, self.seed_own_jobs,
+                               data={'expand': 'result.result_data'})
+        self.assertQueryBudget(reverse('jobresults-list'), 2, self.seed_own_jobs, data={'expand': 'result_data'})
+
+    def test_users_prefetch_jobs_and_results(self):
+        # page count, users, their jobs joined to results
+        expand = {'expand': 'processing_jobs.result.result_data'}
+        self.assertQueryBudget(reverse('user-list'), 3, self.seed_users, data=expand)
+
+        def seed_and_reauthenticate(count):
+            self.seed_own_jobs(count)
+            # A fresh instance per request, as real authentication loads; it carries no prefetched jobs
+            self.client.force_authenticate(user=User.objects.get(pk=self.user.pk))
+
+        self.assertQueryBudget(reverse('user-me'), 1, seed_and_reauthenticate, data=expand)
+
+
+class KeysetPaginationTest(APITestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(email='pages@example.com', password='testpass123')
+        self.client.force_authenticate(user=self.user)
+        Notifications.objects.bulk_create(
+            Notifications(user=self.user, notification_type='info', notification_channel='email', title=f'n{i}',
+                          message='') for i in range(45)
+        )
+        # Runs of equal timestamps, as bulk inserts produce; id orders rows within each run
+        now = timezone.now()
+        for i, pk in enumerate(Notifications.objects.values_list('pk', flat=True)):
+            Notifications.objects.filter(pk=pk).update(created_at=now.replace(microsecond=0) - timedelta(seconds=i // 7))
+        self.expected = list(Notifications.objects.order_by('-created_at', '-id').values_list('pk', flat=True))
+
+    def walk(self, url, link):
+        pages = []
+        while url:
+            response = self.client.get(url)
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+            pages.append([row['id'] for row in response.data['results']])
+            url = response.data[link]
+        return pages
+
+    def test_pages_cover_every_row_once_in_both_directions(self):
+        forward = self.walk(reverse('notifications-list'), 'next')
+        self.assertEqual([len(page) for page in forward], [20, 20, 5])
+        self.assertEqual(sum(forward, []), self.expected)
+        self.assertNotIn('count', self.client.get(reverse('notifications-list')).data)
+
+        last = self.client.get(reverse('notifications-list'))
+        while last.data['next']:
+            last = self.client.get(last.data['next'])
+        backward = self.walk(last.data['previous'], 'previous')
+        self.assertEqual(sum(reversed(backward), []) + [row['id'] for row in last.data['results']], self.expected)
+
+    def test_later_pages_seek_instead_of_counting_and_offsetting(self):
+        url = self.client.get(reverse('notifications-list')).data['next']
+        url = self.client.get(url).data['next']
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(url)
+        self.assertEqual([row['id'] for row in response.data['results']], self.expected[40:])
+        self.assertEqual(len(queries), 1)
+        self.assertNotIn('COUNT', queries[0]['sql'])
+        self.assertNotIn('OFFSET', queries[0]['sql'])
+
+    def test_rejects_tampered_cursors(self):
+        for position in ('nonsense', '["2024-01-01T00:00:00+00:00"]', '["not a date","1"]'):
+            cursor = base64.b64encode(f'p={position}'.encode()).decode()
+            response = self.client.get(reverse('notifications-list'), {'cursor': cursor})
+            self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND, position)
+
+    def test_events_page_on_timestamp(self):
+        from .models import Events
+
+        Events.objects.bulk_create(
+            Events(user=self.user, event_id=f'e{i}', event_type='click', timestamp=timezone.now() - timedelta(hours=i % 5))
+            for i in range(25)
+        )
+        pages = self.walk(reverse('events-list'), 'next')
+        self.assertEqual(sum(pages, []), list(Events.objects.order_by('-timestamp', '-id').values_list('pk', flat=True)))
+
+
+class SparseFieldsTest(APITestCase):
+    def setUp(self):
+        from .models import JobResults, ProcessingJobs
+
+        self.user = User.objects.create_user(email='sparse@example.com', password='testpass123')
+        self.client.force_authenticate(user=self.user)
+        self.session = Sessions.objects.create(user=self.user, session_id='sparse', username='sparse', text='',
+                                               type='image', date=timezone.now(), user_status='active')
+        Images.objects.create(session=self.session, user_id=str(self.user.id), image_id='img', storage_path='')
+        job = ProcessingJobs.objects.create(user=self.user, job_id='sparse-job', job_type='colorize-scene',
+                                            status='completed', schedule=timezone.now())
+        JobResults.objects.create(job=job, result_id='sparse-result', result_data={'tiles': list(range(100))})
+
+    def test_heavy_fields_only_on_request(self):
+        listed = self.client.get(reverse('sessions-list')).data['results'][0]
+        self.assertNotIn('images', listed)
+        expanded = self.client.get(reverse('sessions-list'), {'expand': 'images'}).data['results'][0]
+        self.assertEqual([image['image_id'] for image in expanded['images']], ['img'])
+        # Retrieving one object shows its own heavy fields
+        self.assertIn('images', self.client.get(reverse('sessions-detail', kwargs={'pk': self.session.pk})).data)
+
+    def test_dotted_paths_reach_nested_serializers(self):
+        me = reverse('user-me')
+        self.assertNotIn('processing_jobs', self.client.get(me).data)
+        job = self.client.get(me, {'expand': 'processing_jobs'}).data['processing_jobs'][0]
+        self.assertEqual(job['result']['result_id'], 'sparse-result')
+        self.assertNotIn('result_data', job['result'])
+        job = self.client.get(me, {'expand': 'processing_jobs.result.result_data'}).data['processing_jobs'][0]
+        self.assertEqual(len(job['result']['result_data']['tiles']), 100)
+
+        data = self.client.get(me, {'fields': 'id,processing_jobs.status'}).data
+        self.assertEqual(set(data), {'id', 'processing_jobs'})
+        self.assertEqual(data['processing_jobs'], [{'status': 'completed'}])
+
+    def test_me_keeps_avatar_a_path(self):
+        self.user.avatar = 'avatars/a.png'
+        self.user.save()
+        self.assertEqual(self.client.get(reverse('user-me')).data['avatar'], '/media/avatars/a.png')
+        patched = self.client.patch(reverse('user-me'), {'first_name': 'Ada'})
+        self.assertEqual(patched.data['avatar'], '/media/avatars/a.png')
+
+    def test_unrequested_columns_are_not_loaded(self):
+        with CaptureQueriesContext(connection) as queries:
+            self.client.get(reverse('jobresults-list'))
+        self.assertFalse(any('result_data' in query['sql'] for query in queries.captured_queries))
+        with CaptureQueriesContext(connection) as queries:
+            self.client.get(reverse('user-me'))
+        self.assertFalse(any('core_processingjobs' in query['sql'] for query in queries.captured_queries))
+
+    def test_writes_keep_every_field(self):
+        response = self.client.post(reverse('viaevents-list') + '?fields=id', {
+            'user': str(self.user.id), 'event_id': 'v1', 'via_id': 'via', 'image': 'img', 'stage_status': 'done',
+            'stage_data': {'stage': 1}, 'message': 'ok',
+        }, format='json')
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED, response.data)
+        self.assertEqual(response.data['stage_data'], {'stage': 1})
+        listed = self.client.get(reverse('viaevents-list'), {'fields': 'id,stage_data'}).data['results'][0]
+        self.assertEqual(listed, {'id': response.data['id'], 'stage_data': {'stage': 1}})
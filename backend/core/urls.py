@@ -1,5 +1,5 @@
 from django.urls import path, include
-from .views import health_check, predict
+from .views import event_stream, event_stream_ticket, health_check, predict, predict_batch, prometheus_metrics
 from rest_framework.routers import DefaultRouter
 from rest_framework_simplejwt.views import (
     TokenObtainPairView,
@@ -32,9 +32,15 @@ router.register(r'source-downloads', SourceDownloadsViewSet, basename='sourcedow
 urlpatterns = [
     # Health check (public)
     path('health/', health_check, name='health_check'),
+    path('metrics/', prometheus_metrics, name='metrics'),
     
     # Prediction endpoint
     path('predict/', predict, name='predict'),
+    path('predict/batch/', predict_batch, name='predict_batch'),
+
+    # Job and ViaEvents progress over Server-Sent Events (ahead of the router, which would read 'stream' as an Events pk)
+    path('events/stream/', event_stream, name='event_stream'),
+    path('events/stream/ticket/', event_stream_ticket, name='event_stream_ticket'),
 
     # JWT Token endpoints
     path('token/', TokenObtainPairView.as_view(), name='token_obtain_pair'),
@@ -3,11 +3,37 @@ from rest_framework.decorators import action, api_view, permission_classes
 from rest_framework.response import Response
 from rest_framework.permissions import IsAuthenticated, AllowAny
 from django.contrib.auth import get_user_model
+from django.core import signing
+from django.db.models import Prefetch, prefetch_related_objects
 from django.shortcuts import get_object_or_404
 from django.utils import timezone
-from django.core.files.uploadedfile import InMemoryUploadedFile
+from django.core.files.uploadedfile import InMemoryUploadedFile, TemporaryUploadedFile
+from django.core.handlers.asgi import ASGIRequest
+from django.http import Http404, HttpResponse, JsonResponse, StreamingHttpResponse
+from asgiref.sync import sync_to_async
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.exceptions import AuthenticationFailed, InvalidToken
+from prometheus_client import CONTENT_TYPE_LATEST, REGISTRY, CollectorRegistry, generate_latest, multiprocess
+from model.codecs import CONTENT_TYPES, JSON, negotiate
 from model.inference import SARColorizer
+from model.batching import MicroBatcher
+from model.cache import ResultCache, CachedColorizer
+from model.workers import RemoteColorizer
+from model.runtime import load_runtime_config
+from model.metrics import EXECUTOR_QUEUED, INFERENCE_IN_FLIGHT
 import uuid
+import asyncio
+import base64
+import hmac
+import io
+import json
+import logging
+import threading
+import zipfile
+from concurrent.futures import ThreadPoolExecutor
+from .events import broker, encode as encode_event, job_data
+from .jobs import user_storage_name
+from .pagination import KeysetPagination, TimestampKeysetPagination
 from .models import (
     CustomUser, UserCredentials, UserSettings, Sessions, Images,
     Notifications, Events, Patterns, ProcessingJobs, JobResults,
@@ -18,7 +44,7 @@ from .serializers import (
     SessionsSerializer, ImagesSerializer, NotificationsSerializer,
     EventsSerializer, PatternsSerializer, ProcessingJobsSerializer,
     JobResultsSerializer, ViaEventsSerializer, ProcessingOutputsSerializer,
-    SourceDownloadsSerializer
+    SourceDownloadsSerializer, includes
 )
 from rest_framework import viewsets, permissions, status
 from rest_framework.decorators import action
@@ -35,21 +61,40 @@ import os
 
 
 User = get_user_model()
+logger = logging.getLogger(__name__)
+
+def user_prefetch(context):
+    """What CustomUserSerializer will read besides the user row: its jobs, each with its result (reverse one-to-one)"""
+    if not includes(context, 'processing_jobs'):
+        return ()
+    jobs = ProcessingJobs.objects.select_related('result')
+    if not includes(context, 'processing_jobs.result.result_data'):
+        jobs = jobs.defer('result__result_data')
+    return (Prefetch('processing_jobs', queryset=jobs),)
+
+
 class CustomUserViewSet(viewsets.ModelViewSet):
     queryset = CustomUser.objects.all()
     serializer_class = CustomUserSerializer
     permission_classes = [IsAuthenticated]
     parser_classes = [MultiPartParser, FormParser]
 
+    def get_queryset(self):
+        return super().get_queryset().prefetch_related(*user_prefetch(self.get_serializer_context()))
+
     @action(detail=False, methods=['get', 'patch'], url_path='me')
     def me(self, request):
         user = request.user
+        # No request in the context: avatar stays a path, which the frontend prefixes with the API host
+        context = {'view': self, 'method': request.method, 'query_params': request.query_params}
         if request.method == 'PATCH':
-            serializer = CustomUserSerializer(user, data=request.data, partial=True)
+            serializer = CustomUserSerializer(user, data=request.data, partial=True, context=context)
             serializer.is_valid(raise_exception=True)
             serializer.save()
+            prefetch_related_objects([user], *user_prefetch(context))
             return Response(serializer.data)
-        serializer = CustomUserSerializer(user)
+        prefetch_related_objects([user], *user_prefetch(context))
+        serializer = CustomUserSerializer(user, context=context)
         return Response(serializer.data)
 
 
@@ -59,6 +104,7 @@ class CustomUserViewSet(viewsets.ModelViewSet):
         serializer = self.get_serializer(request.user, data=request.data, partial=True, context={'request': request})
         if serializer.is_valid():
             serializer.save()
+            prefetch_related_objects([request.user], *user_prefetch(serializer.context))
             return Response(serializer.data)
         return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
@@ -89,6 +135,7 @@ class CustomUserViewSet(viewsets.ModelViewSet):
 
         # Serialize and return the user so frontend gets new avatar URL (serializer should expose avatar.url)
         serializer = self.get_serializer(user, context={'request': request})
+        prefetch_related_objects([user], *user_prefetch(serializer.context))
         return Response(serializer.data, status=status.HTTP_200_OK)
 
 
@@ -126,9 +173,13 @@ class UserSettingsViewSet(viewsets.ModelViewSet):
 class SessionsViewSet(viewsets.ModelViewSet):
     serializer_class = SessionsSerializer
     permission_classes = [IsAuthenticated]
+    pagination_class = KeysetPagination
 
     def get_queryset(self):
-        return Sessions.objects.filter(user=self.request.user)
+        sessions = Sessions.objects.filter(user=self.request.user)
+        if includes(self.get_serializer_context(), 'images'):
+            sessions = sessions.prefetch_related('images')
+        return sessions
 
     def perform_create(self, serializer):
         serializer.save(user=self.request.user)
@@ -169,7 +220,8 @@ class ImagesViewSet(viewsets.ModelViewSet):
 
         if file_obj and not storage_path:
             # Save file and set storage_path to relative path (ImageField uses storage)
-            fname = f"uploads/{image_id}_{file_obj.name}"
+            # Under the user's own directory: the job handlers take the prefix as proof of ownership
+            fname = user_storage_name('uploads', request.user.id, f"{image_id}_{file_obj.name}")
             saved_path = default_storage.save(fname, file_obj)  # returns relative path
             # Provide URL for frontend
             storage_path = request.build_absolute_uri(settings.MEDIA_URL + saved_path)
@@ -253,6 +305,7 @@ class ImagesViewSet(viewsets.ModelViewSet):
 class NotificationsViewSet(viewsets.ModelViewSet):
     serializer_class = NotificationsSerializer
     permission_classes = [IsAuthenticated]
+    pagination_class = KeysetPagination
 
     def get_queryset(self):
         return Notifications.objects.filter(user=self.request.user)
@@ -285,6 +338,7 @@ class NotificationsViewSet(viewsets.ModelViewSet):
 class EventsViewSet(viewsets.ModelViewSet):
     serializer_class = EventsSerializer
     permission_classes = [IsAuthenticated]
+    pagination_class = TimestampKeysetPagination
 
     def get_queryset(self):
         return Events.objects.filter(user=self.request.user)
@@ -316,7 +370,10 @@ class ProcessingJobsViewSet(viewsets.ModelViewSet):
     permission_classes = [IsAuthenticated]
 
     def get_queryset(self):
-        return ProcessingJobs.objects.filter(user=self.request.user)
+        jobs = ProcessingJobs.objects.filter(user=self.request.user).select_related('result')
+        if not includes(self.get_serializer_context(), 'result.result_data'):
+            jobs = jobs.defer('result__result_data')
+        return jobs
 
     def perform_create(self, serializer):
         serializer.save(user=self.request.user)
@@ -346,15 +403,22 @@ class JobResultsViewSet(viewsets.ReadOnlyModelViewSet):
     permission_classes = [IsAuthenticated]
 
     def get_queryset(self):
-        return JobResults.objects.filter(job__user=self.request.user)
+        results = JobResults.objects.filter(job__user=self.request.user)
+        if not includes(self.get_serializer_context(), 'result_data'):
+            results = results.defer('result_data')
+        return results
 
 
 class ViaEventsViewSet(viewsets.ModelViewSet):
     serializer_class = ViaEventsSerializer
     permission_classes = [IsAuthenticated]
+    pagination_class = KeysetPagination
 
     def get_queryset(self):
-        return ViaEvents.objects.filter(user=self.request.user)
+        events = ViaEvents.objects.filter(user=self.request.user)
+        if not includes(self.get_serializer_context(), 'stage_data'):
+            events = events.defer('stage_data')
+        return events
 
     def perform_create(self, serializer):
         serializer.save(user=self.request.user)
@@ -365,7 +429,10 @@ class ProcessingOutputsViewSet(viewsets.ModelViewSet):
     permission_classes = [IsAuthenticated]
 
     def get_queryset(self):
-        return ProcessingOutputs.objects.filter(user=self.request.user)
+        outputs = ProcessingOutputs.objects.filter(user=self.request.user)
+        if not includes(self.get_serializer_context(), 'meta_data'):
+            outputs = outputs.defer('meta_data')
+        return outputs
 
     def perform_create(self, serializer):
         serializer.save(user=self.request.user)
@@ -396,49 +463,473 @@ class SourceDownloadsViewSet(viewsets.ModelViewSet):
 @api_view(['GET'])
 @permission_classes([AllowAny])
 def health_check(request):
-    return Response({'status': 'ok'})
+    data = {'status': 'ok'}
+    if _result_cache is not None:
+        data['cache'] = _result_cache.stats()
+    return Response(data)
+
+def prometheus_metrics(request):
+    """
+    Prometheus scrape endpoint (aggregates all server processes when PROMETHEUS_MULTIPROC_DIR is set).
+
+    Scrapers authenticate with ``Authorization: Bearer <METRICS_TOKEN>``; without a token configured the
+    endpoint does not exist.
+    """
+    if not settings.METRICS_TOKEN:
+        raise Http404
+    scheme, _, token = request.headers.get('Authorization', '').partition(' ')
+    if scheme.lower() != 'bearer' or not hmac.compare_digest(token.encode(), settings.METRICS_TOKEN.encode()):
+        return HttpResponse(status=401, headers={'WWW-Authenticate': 'Bearer realm="metrics"'})
+    registry = REGISTRY
+    if os.environ.get('PROMETHEUS_MULTIPROC_DIR'):
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+    return HttpResponse(generate_latest(registry), content_type=CONTENT_TYPE_LATEST)
 
 # Initialize colorizer as a singleton
 _colorizer = None
+_colorizer_lock = threading.Lock()
+_result_cache = None
+
+def get_result_cache():
+    global _result_cache
+    if _result_cache is None:
+        _result_cache = ResultCache(
+            memory_bytes=settings.INFERENCE_CACHE_MEMORY_BYTES,
+            directory=settings.INFERENCE_CACHE_DIR or None,
+            disk_bytes=settings.INFERENCE_CACHE_DISK_BYTES,
+        )
+    return _result_cache
+
+def raster_db_setting():
+    """INFERENCE_RASTER_DB as ScaledRaster's db argument (None decides per file)"""
+    return {'true': True, 'false': False}.get(settings.INFERENCE_RASTER_DB.lower())
+
+def local_colorizer_options():
+    """SARColorizer arguments from settings (also used by autotune_inference for its trial processes)"""
+    return dict(
+        checkpoint_path=settings.INFERENCE_CHECKPOINT_PATH,
+        verify_checksum=settings.INFERENCE_VERIFY_CHECKSUM,
+        optimize=settings.INFERENCE_OPTIMIZE or None,
+        quantized_path=settings.INFERENCE_INT8_PATH or None,
+        backend=settings.INFERENCE_BACKEND,
+        backend_path=settings.INFERENCE_BACKEND_PATH or None,
+        raster_db=raster_db_setting(),
+    )
+
+def create_local_colorizer():
+    """SARColorizer that owns the model in this process (also used by run_inference_workers)"""
+    return SARColorizer(runtime_config=settings.INFERENCE_RUNTIME_CONFIG or None, **local_colorizer_options())
+
+def inference_batch_size(runtime_config):
+    """MicroBatcher batch size: the tuned one, capped by INFERENCE_MAX_BATCH_SIZE (so 1 still disables batching)"""
+    if runtime_config:
+        return min(settings.INFERENCE_MAX_BATCH_SIZE, runtime_config['max_batch_size'])
+    return settings.INFERENCE_MAX_BATCH_SIZE
 
 def get_colorizer():
     global _colorizer
-    if _colorizer is None:
-        _colorizer = SARColorizer(checkpoint_path="model/checkpoint_epoch_200.pth")
+    if _colorizer is not None:
+        return _colorizer
+    # Several executor threads may ask for the colorizer before it is built
+    with _colorizer_lock:
+        if _colorizer is not None:
+            return _colorizer
+        # With a worker pool configured the model lives there, not in the web process
+        if settings.INFERENCE_WORKER_SOCKET:
+            colorizer = RemoteColorizer(
+                settings.INFERENCE_WORKER_SOCKET,
+                timeout=settings.INFERENCE_WORKER_TIMEOUT,
+                raster_db=raster_db_setting(),
+            )
+        else:
+            colorizer = create_local_colorizer()
+        serving_id = colorizer.serving_id
+        # Concurrent requests share one forward pass when batching is enabled
+        max_batch_size = inference_batch_size(load_runtime_config(settings.INFERENCE_RUNTIME_CONFIG or None))
+        if max_batch_size > 1:
+            colorizer = MicroBatcher(
+                colorizer,
+                max_batch_size=max_batch_size,
+                window_ms=settings.INFERENCE_BATCH_WINDOW_MS,
+                # A worker pool runs one forward pass per worker process; keep every worker busy
+                concurrency=getattr(colorizer, 'workers', 1),
+            )
+        # Re-uploads of the same scene are served from the result cache
+        if settings.INFERENCE_CACHE_ENABLED:
+            colorizer = CachedColorizer(colorizer, get_result_cache(), serving_id)
+        _colorizer = colorizer
     return _colorizer
 
-@api_view(['POST'])
-@permission_classes([AllowAny])
-def predict(request):
-    """Endpoint to colorize SAR images"""
+def run_prediction(image_file, mode=None, fmt='png'):
+    """Blocking colorization + encoding of one upload; runs on the inference executor"""
+    colorizer = get_colorizer()
+    # ✅ Change 'sar_colorizer' to 'colorizer'
+    options = dict(settings.INFERENCE_ENCODER_OPTIONS.get(fmt, {}))
+    if mode in ('tiled', 'full'):
+        # 'full' falls back to tiles for scenes above INFERENCE_FULL_MAX_PIXELS
+        options.update(
+            mode=mode,
+            tile_size=settings.INFERENCE_TILE_SIZE,
+            overlap=settings.INFERENCE_TILE_OVERLAP,
+            batch_size=settings.INFERENCE_TILE_BATCH_SIZE,
+        )
+        if mode == 'full':
+            options['max_pixels'] = settings.INFERENCE_FULL_MAX_PIXELS
+    return colorizer.colorize_encoded(image_file, fmt, **options)
+
+async def _stream(data, chunk_size=64 * 1024):
+    view = memoryview(data)
+    for start in range(0, len(view), chunk_size):
+        yield view[start:start + chunk_size]
+
+# Inference runs here so the event loop keeps serving health checks and CRUD traffic
+_inference_executor = ThreadPoolExecutor(
+    max_workers=settings.INFERENCE_ASYNC_THREADS,
+    thread_name_prefix='sar-inference',
+)
+
+def run_on_executor(fn, *args):
+    """Await fn(*args) on the inference executor; time spent waiting for a thread counts as queued"""
+    EXECUTOR_QUEUED.inc()
+    queued = [True]
+    queued_lock = threading.Lock()
+
+    def dequeue():
+        with queued_lock:
+            if queued[0]:
+                queued[0] = False
+                EXECUTOR_QUEUED.dec()
+
+    def run():
+        dequeue()
+        return fn(*args)
+
+    future = asyncio.get_running_loop().run_in_executor(_inference_executor, run)
+    # A cancelled task may never reach run()
+    future.add_done_callback(lambda _: dequeue())
+    return future
+
+async def predict(request):
+    """Endpoint to colorize SAR images (async: the forward pass is awaited, not run on the request thread)"""
+    if request.method != 'POST':
+        return JsonResponse({'detail': f'Method "{request.method}" not allowed.'}, status=status.HTTP_405_METHOD_NOT_ALLOWED)
+
+    # Under ASGI the body has already been received asynchronously, so this does not block on the client
     if 'image' not in request.FILES:
-        return Response(
+        return JsonResponse(
             {'error': 'No image provided'}, 
             status=status.HTTP_400_BAD_REQUEST
         )
     
     image_file = request.FILES['image']
-    if not isinstance(image_file, InMemoryUploadedFile):
-        return Response(
+    # Large uploads are spooled to disk; the TIFF reader memory-maps them from there
+    if not isinstance(image_file, (InMemoryUploadedFile, TemporaryUploadedFile)):
+        return JsonResponse(
             {'error': 'Invalid file format'}, 
             status=status.HTTP_400_BAD_REQUEST
         )
+
+    # Raw image/png|webp|jpeg bodies when asked for via Accept or ?format=; base64 JSON otherwise
+    fmt = negotiate(request.headers.get('Accept'), request.GET.get('format'))
+    if fmt is None:
+        return JsonResponse(
+            {'error': f"Unsupported output format; choose from {', '.join(CONTENT_TYPES)} or json"},
+            status=status.HTTP_406_NOT_ACCEPTABLE
+        )
     
     try:
-        colorizer = get_colorizer()
-        # ✅ Change 'sar_colorizer' to 'colorizer'
-        result = colorizer.colorize(image_file)
+        with INFERENCE_IN_FLIGHT.track_inprogress():
+            encoded = await run_on_executor(
+                run_prediction, image_file, request.POST.get('mode'), 'png' if fmt == JSON else fmt
+            )
+
+        if fmt != JSON:
+            response = StreamingHttpResponse(_stream(encoded), content_type=CONTENT_TYPES[fmt])
+            response['Content-Length'] = str(len(encoded))
+            response['Vary'] = 'Accept'
+            return response
         
         # ✅ Your colorize method returns a base64 string, not a dict
         # So we need to adjust the response
-        return Response({
-            'colorized_image': result
+        return JsonResponse({
+            'colorized_image': base64.b64encode(encoded).decode()
         }, status=status.HTTP_200_OK)
         
     except Exception as e:
-        import traceback
-        print(traceback.format_exc())  # Print full traceback for debugging
-        return Response(
+        logger.exception('Colorization failed')
+        return JsonResponse(
             {'error': str(e)},
             status=status.HTTP_500_INTERNAL_SERVER_ERROR
-        )
\ No newline at end of file
+        )
+
+# Public endpoint like the other DRF views (set directly: csrf_exempt only wraps async views on Django 5+)
+predict.csrf_exempt = True
+
+
+BATCH_IMAGE_EXTENSIONS = ('.png', '.jpg', '.jpeg', '.tif', '.tiff', '.webp', '.bmp')
+NDJSON = 'application/x-ndjson'
+
+def _batch_sources(request):
+    """(name, opener) for every uploaded image and every image inside uploaded ZIP archives"""
+    for upload in request.FILES.getlist('images'):
+        yield upload.name, lambda upload=upload: upload
+    for upload in request.FILES.getlist('archive'):
+        archive = zipfile.ZipFile(upload)
+        for info in archive.infolist():
+            name = info.filename
+            if info.is_dir() or name.startswith('__MACOSX/') or not name.lower().endswith(BATCH_IMAGE_EXTENSIONS):
+                continue
+            if info.file_size > settings.INFERENCE_BATCH_MAX_ENTRY_BYTES:
+                yield name, ValueError(f'Archive entry is larger than {settings.INFERENCE_BATCH_MAX_ENTRY_BYTES} bytes')
+                continue
+            # Entries are inflated on the executor thread; ZipFile reads of distinct members are thread-safe
+            yield name, lambda archive=archive, info=info: io.BytesIO(archive.read(info))
+
+def _predict_source(opener, mode, fmt):
+    return run_prediction(opener(), mode, fmt)
+
+async def _colorize_batch(sources, mode, fmt, window):
+    """
+    Yield ``(name, encoded bytes or exception)`` in completion order.
+
+    At most ``window`` images are in flight, so concurrent forwards can share
+    micro-batches while memory stays bounded however many files were sent.
+    """
+    sources = iter(sources)
+    pending = {}
+
+    def fill():
+        while len(pending) < window:
+            item = next(sources, None)
+            if item is None:
+                return
+            name, opener = item
+            if isinstance(opener, Exception):
+                failed = asyncio.get_running_loop().create_future()
+                failed.set_exception(opener)
+                pending[failed] = name
+            else:
+                pending[run_on_executor(_predict_source, opener, mode, fmt)] = name
+
+    fill()
+    try:
+        while pending:
+            done, _ = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            for future in done:
+                name = pending.pop(future)
+                exception = future.exception()
+                if exception is not None:
+                    logger.warning('Batch colorization of %s failed: %s', name, exception)
+                yield name, exception if exception is not None else future.result()
+            fill()
+    finally:
+        # Client went away: drop what has not started yet
+        for future in pending:
+            future.cancel()
+
+class _ZipStream:
+    """Write-only sink for zipfile that hands back what was written since the last drain"""
+
+    def __init__(self):
+        self._chunks = []
+
+    def write(self, data):
+        self._chunks.append(bytes(data))
+        return len(data)
+
+    def flush(self):
+        pass
+
+    def drain(self):
+        data, self._chunks = b''.join(self._chunks), []
+        return data
+
+def _output_name(name, fmt, used):
+    stem = os.path.splitext(name)[0]
+    candidate, n = f'{stem}.{fmt}', 2
+    while candidate in used:
+        candidate, n = f'{stem}-{n}.{fmt}', n + 1
+    used.add(candidate)
+    return candidate
+
+async def _stream_zip(results, fmt):
+    sink = _ZipStream()
+    errors = {}
+    used = set()
+    with INFERENCE_IN_FLIGHT.track_inprogress():
+        # The sink cannot seek, so entries are written with data descriptors as soon as each one is ready
+        with zipfile.ZipFile(sink, 'w', compression=zipfile.ZIP_STORED) as archive:
+            async for name, result in results:
+                if isinstance(result, Exception):
+                    errors[name] = str(result)
+                    continue
+                archive.writestr(_output_name(name, fmt, used), result)
+                yield sink.drain()
+            if errors:
+                archive.writestr('errors.json', json.dumps(errors, indent=2))
+        yield sink.drain()
+
+async def _stream_ndjson(results, fmt):
+    with INFERENCE_IN_FLIGHT.track_inprogress():
+        async for name, result in results:
+            if isinstance(result, Exception):
+                line = {'name': name, 'error': str(result)}
+            else:
+                line = {'name': name, 'content_type': CONTENT_TYPES[fmt],
+                        'colorized_image': base64.b64encode(result).decode()}
+            yield (json.dumps(line) + '\n').encode()
+
+async def predict_batch(request):
+    """
+    Colorize many images in one request.
+
+    Send ``images`` (repeatable) and/or ``archive`` (ZIP) as multipart
+    fields, plus the same ``mode`` as predict. Results stream back as they
+    complete: a ZIP of ``<name>.<format>`` entries (default, with an
+    errors.json for failed inputs) or NDJSON with ``Accept:
+    application/x-ndjson`` / ``?output=ndjson``. ``?format=`` picks the
+    image codec (png, webp, jpeg).
+    """
+    if request.method != 'POST':
+        return JsonResponse({'detail': f'Method "{request.method}" not allowed.'}, status=status.HTTP_405_METHOD_NOT_ALLOWED)
+
+    fmt = negotiate(None, request.GET.get('format') or 'png')
+    output = request.GET.get('output') or ('ndjson' if NDJSON in request.headers.get('Accept', '') else 'zip')
+    if fmt not in CONTENT_TYPES or output not in ('zip', 'ndjson'):
+        return JsonResponse(
+            {'error': f"Choose format from {', '.join(CONTENT_TYPES)} and output from zip, ndjson"},
+            status=status.HTTP_406_NOT_ACCEPTABLE
+        )
+    if not request.FILES.getlist('images') and not request.FILES.getlist('archive'):
+        return JsonResponse({'error': 'No images provided'}, status=status.HTTP_400_BAD_REQUEST)
+
+    try:
+        sources = list(_batch_sources(request))
+    except zipfile.BadZipFile:
+        return JsonResponse({'error': 'Archive is not a valid ZIP file'}, status=status.HTTP_400_BAD_REQUEST)
+    if not sources:
+        return JsonResponse({'error': 'No images found in the upload'}, status=status.HTTP_400_BAD_REQUEST)
+    if len(sources) > settings.INFERENCE_BATCH_MAX_FILES:
+        return JsonResponse(
+            {'error': f'At most {settings.INFERENCE_BATCH_MAX_FILES} images per batch'},
+            status=status.HTTP_400_BAD_REQUEST
+        )
+
+    results = _colorize_batch(sources, request.POST.get('mode'), fmt, settings.INFERENCE_BATCH_CONCURRENCY)
+    if output == 'ndjson':
+        return StreamingHttpResponse(_stream_ndjson(results, fmt), content_type=NDJSON)
+    response = StreamingHttpResponse(_stream_zip(results, fmt), content_type='application/zip')
+    response['Content-Disposition'] = 'attachment; filename="colorized.zip"'
+    return response
+
+predict_batch.csrf_exempt = True
+
+
+
+EVENT_KINDS = ('job', 'via_event')
+# Keeps stream tickets from being accepted as any other signed value, and vice versa
+STREAM_TICKET_SALT = 'core.events.stream'
+
+def _sse(event, data):
+    return f'event: {event}\ndata: {encode_event(data)}\n\n'.encode()
+
+def _stream_user(request):
+    """
+    JWT from the Authorization header, or a ?ticket= from event_stream_ticket
+    since browser EventSource cannot set headers. Access tokens are never
+    put in the URL, where proxies and server logs would record them.
+    """
+    if request.GET.get('ticket'):
+        try:
+            user_id = signing.loads(request.GET['ticket'], salt=STREAM_TICKET_SALT,
+                                    max_age=settings.EVENTS_TICKET_SECONDS)
+        except signing.BadSignature:
+            return None
+        return get_user_model().objects.filter(pk=user_id).first()
+    try:
+        authenticated = JWTAuthentication().authenticate(request)
+    except (AuthenticationFailed, InvalidToken):
+        return None
+    return authenticated[0] if authenticated else None
+
+@api_view(['POST'])
+def event_stream_ticket(request):
+    """
+    Short-lived ticket that opens the caller's event stream (and nothing
+    else): ``new EventSource('/api/events/stream/?ticket=...')``. It is
+    checked when the stream connects, so fetch a new one to reconnect
+    after EVENTS_TICKET_SECONDS.
+    """
+    ticket = signing.dumps(str(request.user.pk), salt=STREAM_TICKET_SALT)
+    return Response({'ticket': ticket, 'expires_in': settings.EVENTS_TICKET_SECONDS})
+
+def _stream_snapshot(user, kinds):
+    """The user's pending and running jobs, so a client never misses a change made before it subscribed"""
+    if 'job' not in kinds:
+        return []
+    active = ProcessingJobs.objects.filter(user=user, status__in=('pending', 'running'))
+    return [_sse('job', job_data(job)) for job in active]
+
+def _stream_frame(message):
+    # Comment lines keep proxies from timing out idle streams and surface disconnects
+    return b': keepalive\n\n' if message is None else _sse(message['event'], message['data'])
+
+def _event_stream(user, kinds):
+    """The stream for WSGI: a thread blocks on the subscription's queue for as long as the client listens"""
+    # Subscribed on first iteration, in the thread that streams, and before reading the snapshot:
+    # a change committed in between is sent twice rather than lost
+    subscription = broker.subscribe(user.pk, kinds)
+    try:
+        yield f'retry: {settings.EVENTS_RETRY_MS}\n\n'.encode()
+        yield from _stream_snapshot(user, kinds)
+        while not subscription.stale:
+            yield _stream_frame(subscription.get(settings.EVENTS_KEEPALIVE_SECONDS))
+        # Events were dropped or missed: tell the client to refetch, then end so EventSource reconnects
+        yield _sse('resync', {})
+    finally:
+        broker.unsubscribe(subscription)
+
+async def _aevent_stream(user, kinds):
+    """The same stream for ASGI, subscribed on the event loop that serves it"""
+    subscription = broker.subscribe(user.pk, kinds, asynchronous=True)
+    try:
+        yield f'retry: {settings.EVENTS_RETRY_MS}\n\n'.encode()
+        for frame in await sync_to_async(_stream_snapshot)(user, kinds):
+            yield frame
+        while not subscription.stale:
+            yield _stream_frame(await subscription.get(settings.EVENTS_KEEPALIVE_SECONDS))
+        yield _sse('resync', {})
+    finally:
+        broker.unsubscribe(subscription)
+
+def event_stream(request):
+    """
+    Server-Sent Events feed of the user's job status changes (``event: job``)
+    and ViaEvents stage updates (``event: via_event``) as they are committed.
+
+    The stream opens with the user's pending and running jobs, so a client
+    never misses a change between loading the page and subscribing.
+    ``?types=job,via_event`` narrows the feed. An ``event: resync`` means
+    the client fell behind, or the server lost its database listener for a
+    while, and should refetch over REST.
+
+    Under WSGI (runserver, gunicorn sync workers) every open stream holds a
+    server thread; under ASGI streams wait on the event loop instead.
+    """
+    if request.method != 'GET':
+        return JsonResponse({'detail': f'Method "{request.method}" not allowed.'}, status=status.HTTP_405_METHOD_NOT_ALLOWED)
+    user = _stream_user(request)
+    if user is None or not user.is_active:
+        return JsonResponse({'detail': 'Authentication credentials were not provided.'}, status=status.HTTP_401_UNAUTHORIZED)
+    kinds = [kind for kind in request.GET.get('types', ','.join(EVENT_KINDS)).split(',') if kind]
+    if not kinds or set(kinds) - set(EVENT_KINDS):
+        return JsonResponse({'error': f"types must be a subset of {', '.join(EVENT_KINDS)}"}, status=status.HTTP_400_BAD_REQUEST)
+
+    # Each handler only streams its own kind of iterator without buffering the whole of it first
+    stream = _aevent_stream(user, kinds) if isinstance(request, ASGIRequest) else _event_stream(user, kinds)
+    response = StreamingHttpResponse(stream, content_type='text/event-stream')
+    response['Cache-Control'] = 'no-cache'
+    # Stop nginx from buffering the stream
+    response['X-Accel-Buffering'] = 'no'
+    return response
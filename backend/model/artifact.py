@@ -0,0 +1,148 @@
+# backend/model/artifact.py
+import hashlib
+import json
+import os
+
+import torch
+
+from .architecture import Generator
+from .optimize import check_equivalence, fuse_generator, fused_layout
+
+ARTIFACT_FORMAT = 'sarnet-serving-v1'
+QUANTIZED_FORMAT = 'sarnet-int8-v1'
+
+
+def metadata_path(artifact_path):
+    return artifact_path + '.json'
+
+
+def is_serving_artifact(path):
+    return os.path.exists(metadata_path(path))
+
+
+def file_sha256(path, chunk_size=4 * 1024 * 1024):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(chunk_size), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def build_generator(architecture):
+    """
+    Untrained generator with the layer structure of an artifact's weights.
+
+    Build it under ``torch.device('meta')`` to skip the random init when the
+    weights are assigned afterwards.
+    """
+    model = Generator(c_in=architecture['c_in'], c_out=architecture['c_out'])
+    return fused_layout(model) if architecture.get('fused') else model
+
+
+def export_serving_artifact(checkpoint_path, output_path, c_in=1, c_out=3, fuse=True, atol=1e-4):
+    """
+    Write a generator-only, weights-only copy of a training checkpoint.
+
+    Optimizer/discriminator state from ``fit`` is dropped and every tensor is
+    stored as a contiguous CPU tensor so the file can be memory-mapped.
+    With ``fuse`` BatchNorm is folded into the convs and Dropout removed
+    (inference-only weights, conv weights stored channels_last) once the
+    fused generator matches the original within ``atol``, so loading needs
+    no rebuild. Architecture and a sha256 checksum go to
+    ``<output_path>.json``. Returns the metadata dict.
+    """
+    checkpoint = torch.load(checkpoint_path, map_location='cpu')
+    state_dict = checkpoint.get('generator_state_dict', checkpoint)
+    max_diff = None
+    if fuse:
+        model = Generator(c_in=c_in, c_out=c_out)
+        model.load_state_dict(state_dict)
+        fused = fuse_generator(model).to(memory_format=torch.channels_last)
+        example = torch.randn(2, c_in, 256, 256).contiguous(memory_format=torch.channels_last)
+        max_diff = check_equivalence(model, fused, example, atol=atol)
+        state_dict = fused.state_dict()
+    state_dict = {
+        name: tensor.detach().cpu().contiguous(
+            memory_format=torch.channels_last if fuse and tensor.dim() == 4 else torch.contiguous_format
+        )
+        for name, tensor in state_dict.items()
+    }
+
+    tmp_path = output_path + '.tmp'
+    torch.save(state_dict, tmp_path)
+    os.replace(tmp_path, output_path)
+
+    metadata = {
+        'format': ARTIFACT_FORMAT,
+        'architecture': {'name': 'UnetGenerator', 'c_in': c_in, 'c_out': c_out, 'fused': fuse},
+        'sha256': file_sha256(output_path),
+        'size': os.path.getsize(output_path),
+        'parameters': int(sum(t.numel() for t in state_dict.values() if t.is_floating_point())),
+        'source_checkpoint': os.path.basename(checkpoint_path),
+        'equivalence_max_diff': max_diff,
+        'torch_version': torch.__version__,
+    }
+    with open(metadata_path(output_path), 'w') as f:
+        json.dump(metadata, f, indent=2)
+    return metadata
+
+
+def load_serving_artifact(artifact_path, verify=False):
+    """
+    Memory-map a serving artifact. Returns ``(state_dict, metadata)``.
+
+    Tensors are backed by the file's pages, so processes forked after the
+    load (or that map the same file) share them instead of holding private
+    copies. ``verify`` re-hashes the file against the recorded checksum.
+    """
+    with open(metadata_path(artifact_path)) as f:
+        metadata = json.load(f)
+    if metadata.get('format') != ARTIFACT_FORMAT:
+        raise ValueError(f"Unsupported serving artifact format: {metadata.get('format')}")
+    if os.path.getsize(artifact_path) != metadata['size']:
+        raise ValueError(f'Serving artifact {artifact_path} is truncated or was modified')
+    if verify and file_sha256(artifact_path) != metadata['sha256']:
+        raise ValueError(f'Serving artifact {artifact_path} failed checksum verification')
+
+    state_dict = torch.load(artifact_path, map_location='cpu', mmap=True, weights_only=True)
+    return state_dict, metadata
+
+
+def export_quantized_artifact(quantized, example_input, output_path, source_id, report):
+    """
+    Save an INT8 generator from quantize_generator as TorchScript.
+
+    ``<output_path>.json`` records the checkpoint it was calibrated from
+    (``source_id``, a SARColorizer checkpoint_id) and its quantization
+    report. Returns the metadata dict.
+    """
+    with torch.no_grad():
+        traced = torch.jit.trace(quantized, example_input)
+    tmp_path = output_path + '.tmp'
+    torch.jit.save(traced, tmp_path)
+    os.replace(tmp_path, output_path)
+
+    metadata = {
+        'format': QUANTIZED_FORMAT,
+        'source': source_id,
+        'sha256': file_sha256(output_path),
+        'size': os.path.getsize(output_path),
+        'report': report,
+        'torch_version': torch.__version__,
+    }
+    with open(metadata_path(output_path), 'w') as f:
+        json.dump(metadata, f, indent=2)
+    return metadata
+
+
+def load_quantized_artifact(path):
+    """Load an INT8 generator written by export_quantized_artifact. Returns ``(module, metadata)``."""
+    with open(metadata_path(path)) as f:
+        metadata = json.load(f)
+    if metadata.get('format') != QUANTIZED_FORMAT:
+        raise ValueError(f"Unsupported INT8 artifact format: {metadata.get('format')}")
+    if os.path.getsize(path) != metadata['size']:
+        raise ValueError(f'INT8 artifact {path} is truncated or was modified')
+    module = torch.jit.load(path, map_location='cpu')
+    module.eval()
+    return module, metadata
@@ -0,0 +1,128 @@
+# backend/model/backends.py
+import abc
+import io
+
+import torch
+
+from .optimize import build_inference_model, fuse_generator
+
+
+class InferenceBackend(abc.ABC):
+    """
+    Runs the generator: [N,1,H,W] float input in [-1, 1] -> [N,3,H,W] output.
+
+    Every backend takes and returns torch tensors on ``device`` so
+    SARColorizer's pre/post-processing is identical whichever one is used.
+    """
+
+    name = None
+
+    def __init__(self, device):
+        self.device = device
+
+    @abc.abstractmethod
+    def __call__(self, input_tensor):
+        """[N,3,H,W] generator output for ``input_tensor``"""
+
+
+class EagerBackend(InferenceBackend):
+    """Plain PyTorch module (also used for the fused and INT8 builds)"""
+
+    name = 'eager'
+
+    def __init__(self, model, device, channels_last=False):
+        super().__init__(device)
+        self.model = model
+        self.channels_last = channels_last
+
+    def __call__(self, input_tensor):
+        if self.channels_last:
+            input_tensor = input_tensor.contiguous(memory_format=torch.channels_last)
+        with torch.no_grad():
+            return self.model(input_tensor)
+
+
+class TorchScriptBackend(InferenceBackend):
+    """Frozen TorchScript module, loaded from a file or traced from the eager generator"""
+
+    name = 'torchscript'
+
+    def __init__(self, model, device, path=None):
+        super().__init__(device)
+        if path:
+            self.module = torch.jit.load(path, map_location=device)
+        else:
+            example = torch.randn(1, 1, 256, 256, device=device)
+            self.module = build_inference_model(model, example, mode='torchscript', channels_last=True)
+        self.module.eval()
+
+    def __call__(self, input_tensor):
+        with torch.no_grad():
+            return self.module(input_tensor.contiguous(memory_format=torch.channels_last))
+
+
+class OnnxRuntimeBackend(InferenceBackend):
+    """ONNX Runtime with the CPU execution provider"""
+
+    name = 'onnxruntime'
+
+    def __init__(self, model, device, path=None, intra_op_threads=0, inter_op_threads=0):
+        super().__init__(device)
+        try:
+            import onnxruntime as ort
+        except ImportError:
+            raise ImportError('The onnxruntime backend needs the onnxruntime package (pip install onnxruntime)')
+
+        options = ort.SessionOptions()
+        options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        options.intra_op_num_threads = intra_op_threads
+        options.inter_op_num_threads = inter_op_threads
+        source = path if path else export_onnx(model, io.BytesIO()).getvalue()
+        self.session = ort.InferenceSession(source, options, providers=['CPUExecutionProvider'])
+        self.input_name = self.session.get_inputs()[0].name
+
+    def __call__(self, input_tensor):
+        inputs = input_tensor.detach().cpu().contiguous().numpy()
+        output = self.session.run(None, {self.input_name: inputs})[0]
+        return torch.from_numpy(output).to(self.device)
+
+
+BACKENDS = {
+    EagerBackend.name: EagerBackend,
+    TorchScriptBackend.name: TorchScriptBackend,
+    OnnxRuntimeBackend.name: OnnxRuntimeBackend,
+}
+
+
+def create_backend(name, model, device, path=None, channels_last=False, intra_op_threads=0, inter_op_threads=0):
+    """Thread counts only apply to onnxruntime, which keeps its own pools (torch's are set process-wide)"""
+    if name not in BACKENDS:
+        raise ValueError(f"Unknown inference backend '{name}' (choose from {', '.join(BACKENDS)})")
+    if name == EagerBackend.name:
+        return EagerBackend(model, device, channels_last=channels_last)
+    if name == OnnxRuntimeBackend.name:
+        return OnnxRuntimeBackend(model, device, path=path, intra_op_threads=intra_op_threads,
+                                  inter_op_threads=inter_op_threads)
+    return BACKENDS[name](model, device, path=path)
+
+
+def export_onnx(model, output, opset_version=17):
+    """
+    Export a Conv/BN-fused UnetGenerator to ONNX.
+
+    Batch, height and width are dynamic axes. ``output`` is a path or a
+    binary file-like; it is returned.
+    """
+    fused = fuse_generator(model).cpu()
+    example = torch.randn(1, 1, 256, 256)
+    torch.onnx.export(
+        fused, (example,), output,
+        input_names=['input'], output_names=['output'],
+        dynamic_axes={
+            'input': {0: 'batch', 2: 'height', 3: 'width'},
+            'output': {0: 'batch', 2: 'height', 3: 'width'},
+        },
+        opset_version=opset_version,
+        dynamo=False,
+    )
+    return output
@@ -0,0 +1,127 @@
+# backend/model/batching.py
+import base64
+import queue
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+
+import torch
+
+from . import metrics
+
+
+class MicroBatcher:
+    """
+    Dynamic micro-batching in front of a shared SARColorizer.
+
+    Requests that arrive within ``window_ms`` of each other are stacked
+    into one [N,1,H,W] tensor and sent through a single forward pass; each
+    caller gets back its own slice. ``max_batch_size`` bounds N, the
+    samples in the pass, not the requests: a tiled request brings a batch
+    of tiles, and one larger than the limit runs on its own. Exposes the
+    same ``colorize*`` methods as SARColorizer.
+
+    Up to ``concurrency`` batches are in flight at once (one per worker
+    process when the colorizer forwards to a worker pool); the next batch
+    is only collected once a slot is free, so requests keep accumulating
+    into it meanwhile.
+    """
+
+    def __init__(self, colorizer, max_batch_size=8, window_ms=5.0, concurrency=1):
+        self.colorizer = colorizer
+        self.max_batch_size = max(1, int(max_batch_size))
+        self.window = max(0.0, float(window_ms)) / 1000.0
+        self.concurrency = max(1, int(concurrency))
+        self._queue = queue.Queue()
+        # A request that did not fit the previous batch; it starts the next one
+        self._carry = None
+        self._slots = threading.BoundedSemaphore(self.concurrency)
+        self._executor = ThreadPoolExecutor(max_workers=self.concurrency, thread_name_prefix='sar-batch')
+        self._worker = threading.Thread(target=self._run, name='sar-micro-batcher', daemon=True)
+        self._worker.start()
+
+    def __getattr__(self, name):
+        # Attributes such as checkpoint_id and device come from the colorizer
+        return getattr(self.colorizer, name)
+
+    def submit(self, input_tensor):
+        """Queue a [1,1,H,W] tensor and return a Future resolving to its [1,3,H,W] output"""
+        future = Future()
+        metrics.BATCHER_QUEUED.inc()
+        self._queue.put((input_tensor, future))
+        return future
+
+    def forward(self, input_tensor):
+        return self.submit(input_tensor).result()
+
+    # The colorizer's pipeline with its forward passes routed through the batch queue
+
+    def colorize_image(self, image_file, **options):
+        return self.colorizer.colorize_image(image_file, forward=self.forward, **options)
+
+    def colorize_encoded(self, image_file, fmt='png', quality=None, effort=None, **options):
+        return self.colorizer.colorize_encoded(image_file, fmt, quality=quality, effort=effort, forward=self.forward,
+                                               **options)
+
+    def colorize(self, image_file):
+        return base64.b64encode(self.colorize_encoded(image_file)).decode()
+
+    def colorize_full_resolution(self, image_file, tile_size=256, overlap=32, batch_size=8):
+        encoded = self.colorize_encoded(image_file, mode='tiled', tile_size=tile_size, overlap=overlap,
+                                        batch_size=batch_size)
+        return base64.b64encode(encoded).decode()
+
+    def _collect(self):
+        """Block for the first request, then gather more until the window closes or the batch is full"""
+        first, self._carry = self._carry or self._queue.get(), None
+        batch = [first]
+        samples = first[0].shape[0]
+        deadline = time.monotonic() + self.window
+        while samples < self.max_batch_size:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                item = self._queue.get(timeout=remaining)
+            except queue.Empty:
+                break
+            if samples + item[0].shape[0] > self.max_batch_size:
+                self._carry = item
+                break
+            batch.append(item)
+            samples += item[0].shape[0]
+        metrics.BATCHER_QUEUED.dec(len(batch))
+        metrics.BATCH_SIZE.observe(samples)
+        return batch
+
+    def _run(self):
+        while True:
+            self._slots.acquire()
+            batch = self._collect()
+            # Only tensors of the same shape can be stacked; group them
+            groups = {}
+            for input_tensor, future in batch:
+                if future.set_running_or_notify_cancel():
+                    groups.setdefault(tuple(input_tensor.shape[1:]), []).append((input_tensor, future))
+            self._executor.submit(self._dispatch_groups, list(groups.values()))
+
+    def _dispatch_groups(self, groups):
+        try:
+            for items in groups:
+                self._dispatch(items)
+        finally:
+            self._slots.release()
+
+    def _dispatch(self, items):
+        try:
+            inputs = torch.cat([input_tensor for input_tensor, _ in items], dim=0)
+            outputs = self.colorizer.forward(inputs)
+        except Exception as e:
+            for _, future in items:
+                future.set_exception(e)
+            return
+        offset = 0
+        for input_tensor, future in items:
+            n = input_tensor.shape[0]
+            future.set_result(outputs[offset:offset + n])
+            offset += n
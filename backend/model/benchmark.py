@@ -0,0 +1,273 @@
+# backend/model/benchmark.py
+import io
+import os
+import platform
+import resource
+import sys
+import time
+from datetime import datetime, timezone
+
+import numpy as np
+import torch
+from PIL import Image
+
+from .architecture import Generator
+from .codecs import encode_image
+from .optimize import build_inference_model
+from .runtime import cpu_count
+from .tiling import colorize_tiled
+
+FORMAT = 'sarnet-benchmark-v1'
+
+# Generator variants exercised by the model suite (keyword arguments for UnetGenerator)
+VARIANTS = {
+    'transpose': {},
+    'upsample-nearest': {'use_upsampling': True, 'mode': 'nearest'},
+    'upsample-bilinear': {'use_upsampling': True, 'mode': 'bilinear'},
+}
+BUILDS = ('eager', 'fused', 'torchscript')
+PIPELINE_STAGES = ('decode', 'preprocess', 'forward', 'postprocess', 'encode')
+TILED_STAGES = ('decode', 'tiled', 'encode')
+
+# Metrics where a larger value is better; everything else is compared as lower-is-better
+HIGHER_IS_BETTER = ('images_per_s',)
+
+
+def reset_peak_rss():
+    """Reset the kernel's high-water mark so the next peak_rss_mb covers one case (Linux only)"""
+    try:
+        with open('/proc/self/clear_refs', 'w') as f:
+            f.write('5')
+    except OSError:
+        pass
+
+
+def peak_rss_mb():
+    try:
+        with open('/proc/self/status') as f:
+            for line in f:
+                if line.startswith('VmHWM:'):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    # ru_maxrss never resets, so this is the process-wide peak (KiB on Linux, bytes on macOS)
+    maxrss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return maxrss / (1024 * 1024 if sys.platform == 'darwin' else 1024)
+
+
+def summarize(samples_s):
+    """Latency percentiles in milliseconds for a list of durations in seconds"""
+    ms = np.asarray(samples_s, dtype=np.float64) * 1000.0
+    return {
+        'p50': round(float(np.percentile(ms, 50)), 3),
+        'p95': round(float(np.percentile(ms, 95)), 3),
+        'p99': round(float(np.percentile(ms, 99)), 3),
+        'mean': round(float(ms.mean()), 3),
+    }
+
+
+def synthetic_sar(height, width, seed=0):
+    """
+    uint8 scene that looks like single-look SAR intensity: smooth backscatter
+    structure with multiplicative, exponentially distributed speckle.
+    """
+    rng = np.random.default_rng(seed)
+    y = np.linspace(0, 6 * np.pi, height, dtype=np.float32)[:, None]
+    x = np.linspace(0, 9 * np.pi, width, dtype=np.float32)[None, :]
+    backscatter = 0.6 + 0.3 * np.sin(y) * np.cos(x) + 0.1 * np.sin(3 * x + y)
+    speckle = rng.exponential(1.0, size=(height, width)).astype(np.float32)
+    db = 10 * np.log10(np.maximum(backscatter * speckle, 1e-4))
+    return np.clip((db + 25) * 255 / 35, 0, 255).astype(np.uint8)
+
+
+def encode_scene(scene, fmt):
+    """Upload bytes for a scene; 'tiff' is uncompressed so it takes the windowed raster path"""
+    buffered = io.BytesIO()
+    if fmt == 'tiff':
+        Image.fromarray(scene).save(buffered, format='TIFF')
+    elif fmt == 'jpeg':
+        Image.fromarray(scene).save(buffered, format='JPEG', quality=90)
+    else:
+        Image.fromarray(scene).save(buffered, format='PNG', compress_level=1)
+    return buffered.getvalue()
+
+
+def random_checkpoint(path, seed=0):
+    """Training-format checkpoint with random weights, for machines without the trained model"""
+    torch.manual_seed(seed)
+    torch.save({'generator_state_dict': Generator(c_in=1, c_out=3).state_dict()}, path)
+    return path
+
+
+def _timed(fn, *args, **kwargs):
+    start = time.perf_counter()
+    result = fn(*args, **kwargs)
+    return result, time.perf_counter() - start
+
+
+def _decode(colorizer, data):
+    image = colorizer.load_image(io.BytesIO(data))
+    # load_image can hand back a lazily decoded image; count the decode here, not in preprocess
+    image.load()
+    return image
+
+
+def _run_pipeline(colorizer, data, fmt):
+    stages = {}
+    image, stages['decode'] = _timed(_decode, colorizer, data)
+    input_tensor, stages['preprocess'] = _timed(colorizer.preprocess_image, image)
+    output_tensor, stages['forward'] = _timed(colorizer.forward, input_tensor)
+    output, stages['postprocess'] = _timed(colorizer.postprocess, output_tensor)
+    _, stages['encode'] = _timed(encode_image, output, fmt)
+    return stages
+
+
+def _run_tiled(colorizer, data, fmt, tile_size=256, overlap=32, batch_size=8):
+    stages = {}
+    scene, stages['decode'] = _timed(colorizer.load_array, io.BytesIO(data))
+    output, stages['tiled'] = _timed(colorize_tiled, colorizer, scene, tile_size=tile_size, overlap=overlap,
+                                     batch_size=batch_size)
+    _, stages['encode'] = _timed(encode_image, Image.fromarray(output), fmt)
+    return stages
+
+
+def bench_pipeline(colorizer, size, input_format='png', mode='resize', output_format='png', iterations=20, warmup=3):
+    """End-to-end and per-stage latency of one upload through a SARColorizer"""
+    data = encode_scene(synthetic_sar(size, size), input_format)
+    run, stage_names = (_run_tiled, TILED_STAGES) if mode == 'tiled' else (_run_pipeline, PIPELINE_STAGES)
+    for _ in range(warmup):
+        run(colorizer, data, output_format)
+
+    reset_peak_rss()
+    samples = [run(colorizer, data, output_format) for _ in range(iterations)]
+    totals = [sum(stages.values()) for stages in samples]
+    return {
+        'name': f'pipeline/{mode}/{input_format}/{size}',
+        'suite': 'pipeline',
+        'mode': mode,
+        'input_format': input_format,
+        'output_format': output_format,
+        'size': size,
+        'input_bytes': len(data),
+        'iterations': iterations,
+        'latency_ms': summarize(totals),
+        'images_per_s': round(len(totals) / sum(totals), 3),
+        'stages_ms': {name: summarize([stages[name] for stages in samples]) for name in stage_names},
+        'peak_rss_mb': round(peak_rss_mb(), 1),
+    }
+
+
+def build_variant(variant, build, seed=0):
+    torch.manual_seed(seed)
+    model = Generator(c_in=1, c_out=3, **VARIANTS[variant]).eval()
+    if build == 'eager':
+        return model, False
+    example = torch.randn(1, 1, 256, 256)
+    return build_inference_model(model, example, mode=build, channels_last=True), True
+
+
+def bench_model(variant, build='eager', batch_size=1, iterations=20, warmup=3):
+    """Forward-pass latency and throughput of a generator variant on [batch_size,1,256,256] inputs"""
+    model, channels_last = build_variant(variant, build)
+    inputs = torch.randn(batch_size, 1, 256, 256)
+    if channels_last:
+        inputs = inputs.contiguous(memory_format=torch.channels_last)
+
+    with torch.no_grad():
+        for _ in range(warmup):
+            model(inputs)
+        reset_peak_rss()
+        samples = [_timed(model, inputs)[1] for _ in range(iterations)]
+    return {
+        'name': f'model/{variant}/{build}/batch{batch_size}',
+        'suite': 'model',
+        'variant': variant,
+        'build': build,
+        'batch_size': batch_size,
+        'iterations': iterations,
+        'latency_ms': summarize(samples),
+        'images_per_s': round(batch_size * len(samples) / sum(samples), 3),
+        'peak_rss_mb': round(peak_rss_mb(), 1),
+    }
+
+
+def environment():
+    return {
+        'python': platform.python_version(),
+        'torch_version': torch.__version__,
+        'machine': platform.machine(),
+        'processor': platform.processor(),
+        'cpus': cpu_count(),
+        'intra_op_threads': torch.get_num_threads(),
+        'inter_op_threads': torch.get_num_interop_threads(),
+        'cuda': torch.cuda.is_available(),
+        'pid': os.getpid(),
+    }
+
+
+def run_suite(colorizer=None, suites=('pipeline', 'model'), sizes=(256, 1024, 4096), input_formats=('png', 'jpeg', 'tiff'),
+              modes=('resize',), variants=tuple(VARIANTS), builds=BUILDS, batch_sizes=(1, 4, 8),
+              iterations=20, warmup=3, progress=None):
+    """Run the selected suites and return a JSON-serializable report"""
+    results = []
+
+    def record(result):
+        results.append(result)
+        if progress:
+            progress(result)
+
+    if 'pipeline' in suites:
+        for mode in modes:
+            for input_format in input_formats:
+                for size in sizes:
+                    record(bench_pipeline(colorizer, size, input_format, mode=mode, iterations=iterations,
+                                          warmup=warmup))
+    if 'model' in suites:
+        for variant in variants:
+            for build in builds:
+                for batch_size in batch_sizes:
+                    record(bench_model(variant, build, batch_size, iterations=iterations, warmup=warmup))
+
+    return {
+        'format': FORMAT,
+        'created_at': datetime.now(timezone.utc).isoformat(),
+        'environment': environment(),
+        'results': results,
+    }
+
+
+def _metrics(result):
+    metrics = {f'latency_ms.{key}': value for key, value in result['latency_ms'].items() if key != 'mean'}
+    for stage, summary in result.get('stages_ms', {}).items():
+        metrics[f'stages_ms.{stage}.p50'] = summary['p50']
+    metrics['images_per_s'] = result['images_per_s']
+    metrics['peak_rss_mb'] = result['peak_rss_mb']
+    return metrics
+
+
+def compare(baseline, current, threshold=0.10):
+    """
+    Relative change of every metric for cases present in both reports.
+
+    Returns ``(rows, regressions)``; a regression is a metric that got worse
+    by more than ``threshold`` (0.10 = 10%).
+    """
+    baseline_results = {result['name']: result for result in baseline['results']}
+    rows, regressions = [], []
+    for result in current['results']:
+        reference = baseline_results.get(result['name'])
+        if reference is None:
+            continue
+        before, after = _metrics(reference), _metrics(result)
+        for metric, value in after.items():
+            old = before.get(metric)
+            if not old:
+                continue
+            change = (value - old) / old
+            worse = -change if metric in HIGHER_IS_BETTER else change
+            row = {'name': result['name'], 'metric': metric, 'baseline': old, 'current': value,
+                   'change': round(change, 4), 'regression': worse > threshold}
+            rows.append(row)
+            if row['regression']:
+                regressions.append(row)
+    return rows, regressions
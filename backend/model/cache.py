@@ -0,0 +1,258 @@
+# backend/model/cache.py
+import hashlib
+import os
+import tempfile
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import Future
+
+from . import metrics
+from .inference import SARColorizer
+
+
+def hash_upload(image_file, chunk_size=1024 * 1024):
+    """sha256 of an upload / file-like, read in chunks and rewound afterwards"""
+    digest = hashlib.sha256()
+    if hasattr(image_file, 'chunks'):
+        for chunk in image_file.chunks(chunk_size):
+            digest.update(chunk)
+    else:
+        image_file.seek(0)
+        for chunk in iter(lambda: image_file.read(chunk_size), b''):
+            digest.update(chunk)
+    image_file.seek(0)
+    return digest.hexdigest()
+
+
+class ResultCache:
+    """
+    Two-tier cache for encoded colorization results (bytes).
+
+    An in-process LRU holds the most recent results up to ``memory_bytes`` in
+    total (results vary from a few KB to tens of MB with the scene size and
+    format, so a count would not bound memory); an optional on-disk tier under ``directory`` holds up to ``disk_bytes`` and
+    evicts least recently used files first. Concurrent misses for the same
+    key are coalesced so only one caller computes the value.
+
+    Every process serving the same ``directory`` shares its ``disk_bytes``
+    budget: the usage total is re-read from the directory at least every
+    ``disk_rescan_seconds``, so other processes' writes are counted too.
+    """
+
+    def __init__(self, memory_bytes=64 * 1024 ** 2, directory=None, disk_bytes=1024 ** 3, disk_rescan_seconds=10.0):
+        self.memory_bytes = memory_bytes
+        self.directory = directory
+        self.disk_bytes = disk_bytes
+        self.disk_rescan_seconds = disk_rescan_seconds
+        self._memory = OrderedDict()
+        self._memory_usage = 0
+        self._inflight = {}
+        self._lock = threading.Lock()
+        self._disk_lock = threading.Lock()
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self.coalesced = 0
+        self._disk_usage = 0
+        self._disk_scanned = 0.0
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+            self._rescan()
+
+    def stats(self):
+        with self._lock:
+            return {
+                'hits': self.hits,
+                'disk_hits': self.disk_hits,
+                'misses': self.misses,
+                'coalesced': self.coalesced,
+                'memory_items': len(self._memory),
+                'memory_bytes': self._memory_usage,
+                'disk_bytes': self._disk_usage,
+            }
+
+    def get(self, key):
+        with self._lock:
+            value = self._memory_get(key)
+            if value is not None:
+                self.hits += 1
+                metrics.CACHE_MEMORY_HITS.inc()
+                return value
+        value = self._disk_get(key)
+        if value is not None:
+            with self._lock:
+                self.hits += 1
+                self.disk_hits += 1
+                self._memory_put(key, value)
+            metrics.CACHE_DISK_HITS.inc()
+        return value
+
+    def put(self, key, value):
+        with self._lock:
+            self._memory_put(key, value)
+        self._disk_put(key, value)
+
+    def get_or_compute(self, key, compute):
+        value = self.get(key)
+        if value is not None:
+            return value
+
+        with self._lock:
+            # Another request may have finished while we were checking the disk tier
+            value = self._memory_get(key)
+            if value is not None:
+                self.hits += 1
+                metrics.CACHE_MEMORY_HITS.inc()
+                return value
+            future = self._inflight.get(key)
+            leader = future is None
+            if leader:
+                future = self._inflight[key] = Future()
+                self.misses += 1
+                metrics.CACHE_MISSES.inc()
+            else:
+                self.coalesced += 1
+                metrics.CACHE_COALESCED.inc()
+
+        if not leader:
+            return future.result()
+
+        try:
+            value = compute()
+            self.put(key, value)
+            future.set_result(value)
+            return value
+        except Exception as e:
+            future.set_exception(e)
+            raise
+        finally:
+            with self._lock:
+                self._inflight.pop(key, None)
+
+    # In-process tier (callers hold self._lock)
+
+    def _memory_get(self, key):
+        value = self._memory.get(key)
+        if value is not None:
+            self._memory.move_to_end(key)
+        return value
+
+    def _memory_put(self, key, value):
+        if len(value) > self.memory_bytes:
+            return
+        previous = self._memory.pop(key, None)
+        if previous is not None:
+            self._memory_usage -= len(previous)
+        self._memory[key] = value
+        self._memory_usage += len(value)
+        while self._memory_usage > self.memory_bytes:
+            _, evicted = self._memory.popitem(last=False)
+            self._memory_usage -= len(evicted)
+
+    # On-disk tier
+
+    def _path(self, key):
+        return os.path.join(self.directory, key[:2], key)
+
+    def _disk_entries(self):
+        for root, _, files in os.walk(self.directory):
+            for name in files:
+                path = os.path.join(root, name)
+                try:
+                    st = os.stat(path)
+                except OSError:
+                    continue
+                yield path, st.st_size, st.st_mtime
+
+    def _rescan(self):
+        self._disk_usage = sum(size for _, size, _ in self._disk_entries())
+        self._disk_scanned = time.monotonic()
+
+    def _disk_get(self, key):
+        if not self.directory:
+            return None
+        path = self._path(key)
+        try:
+            with open(path, 'rb') as f:
+                value = f.read()
+            # mtime doubles as last-access time for eviction
+            os.utime(path)
+        except OSError:
+            return None
+        return value
+
+    def _disk_put(self, key, value):
+        if not self.directory:
+            return
+        data = bytes(value)
+        if len(data) > self.disk_bytes:
+            return
+        path = self._path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path))
+        with os.fdopen(fd, 'wb') as f:
+            f.write(data)
+        with self._disk_lock:
+            try:
+                replaced = os.path.getsize(path)
+            except OSError:
+                replaced = 0
+            os.replace(tmp_path, path)
+            self._disk_usage += len(data) - replaced
+            if time.monotonic() - self._disk_scanned >= self.disk_rescan_seconds:
+                self._rescan()
+            if self._disk_usage > self.disk_bytes:
+                self._evict()
+
+    def _evict(self):
+        """Drop least recently used files until the disk tier is back under 90% of its budget"""
+        target = int(self.disk_bytes * 0.9)
+        entries = sorted(self._disk_entries(), key=lambda entry: entry[2])
+        usage = sum(size for _, size, _ in entries)
+        for path, size, _ in entries:
+            if usage <= target:
+                break
+            try:
+                os.remove(path)
+                usage -= size
+            except OSError:
+                pass
+        self._disk_usage = usage
+        self._disk_scanned = time.monotonic()
+
+
+class CachedColorizer:
+    """
+    Wraps a colorizer so repeated uploads of the same scene skip inference.
+
+    Keys combine the sha256 of the input bytes, the colorizer's serving_id
+    (checkpoint, build, backend and raster scaling), the inference mode and
+    the output encoding. Exposes the same ``colorize*`` methods as
+    SARColorizer.
+    """
+
+    def __init__(self, colorizer, cache, serving_id):
+        self.colorizer = colorizer
+        self.cache = cache
+        self.serving_id = serving_id
+
+    def __getattr__(self, name):
+        return getattr(self.colorizer, name)
+
+    def _key(self, image_file, *mode):
+        parts = [hash_upload(image_file), self.serving_id] + [str(m) for m in mode]
+        return hashlib.sha256('|'.join(parts).encode()).hexdigest()
+
+    def colorize_encoded(self, image_file, fmt='png', quality=None, effort=None, **options):
+        # batch_size only changes how the work is split, not the result
+        mode = sorted((k, v) for k, v in options.items() if k != 'batch_size')
+        key = self._key(image_file, fmt, quality, effort, mode)
+        return self.cache.get_or_compute(
+            key,
+            lambda: self.colorizer.colorize_encoded(image_file, fmt, quality=quality, effort=effort, **options),
+        )
+
+    # Legacy base64 entry points go through the cached colorize_encoded above
+    colorize = SARColorizer.colorize
+    colorize_full_resolution = SARColorizer.colorize_full_resolution
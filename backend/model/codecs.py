@@ -0,0 +1,73 @@
+# backend/model/codecs.py
+import io
+
+CONTENT_TYPES = {
+    'png': 'image/png',
+    'webp': 'image/webp',
+    'jpeg': 'image/jpeg',
+}
+JSON = 'json'
+
+
+def encode_image(image, fmt='png', quality=None, effort=None):
+    """
+    Encode a PIL image to bytes.
+
+    ``effort`` is the encoder speed/size trade-off (PNG compress_level 0-9,
+    WebP method 0-6, JPEG: > 0 enables optimized Huffman tables) and
+    ``quality`` applies to the lossy codecs (0-100).
+    """
+    buffered = io.BytesIO()
+    if fmt == 'png':
+        image.save(buffered, format='PNG', compress_level=6 if effort is None else effort)
+    elif fmt == 'webp':
+        image.save(buffered, format='WEBP', quality=90 if quality is None else quality,
+                   method=4 if effort is None else effort)
+    elif fmt == 'jpeg':
+        image.save(buffered, format='JPEG', quality=90 if quality is None else quality,
+                   optimize=bool(effort))
+    else:
+        raise ValueError(f'Unsupported output format: {fmt}')
+    return buffered.getvalue()
+
+
+def negotiate(accept=None, requested=None):
+    """
+    Pick the response format for predict.
+
+    An explicit ``?format=`` wins. Otherwise the Accept header is matched
+    by q-value against the image types and application/json. Clients that
+    do not express a preference (no Accept, ``*/*``) keep getting the legacy
+    base64 JSON. Returns a key of CONTENT_TYPES, ``'json'`` or None (406).
+    """
+    if requested:
+        requested = requested.lower()
+        requested = 'jpeg' if requested == 'jpg' else requested
+        return requested if requested in CONTENT_TYPES or requested == JSON else None
+    if not accept:
+        return JSON
+
+    offers = {content_type: fmt for fmt, content_type in CONTENT_TYPES.items()}
+    offers['application/json'] = JSON
+    best, best_q = None, 0.0
+    for part in accept.split(','):
+        media_type, *params = [token.strip() for token in part.split(';')]
+        q = 1.0
+        for param in params:
+            if param.startswith('q='):
+                try:
+                    q = float(param[2:])
+                except ValueError:
+                    q = 0.0
+        if media_type in offers:
+            fmt = offers[media_type]
+        elif media_type == 'image/*':
+            fmt = 'png'
+        elif media_type == '*/*':
+            fmt = JSON
+        else:
+            continue
+        # Earlier entries win ties
+        if q > best_q:
+            best, best_q = fmt, q
+    return best
@@ -1,46 +1,293 @@
 # backend/model/inference.py
 import torch
 import torch.nn as nn
-import torchvision.transforms as transforms
 from PIL import Image
 from .architecture import Generator  # This should work now
-import io
+from .tiling import colorize_tiled
+from .raster import open_raster
+from .artifact import build_generator, is_serving_artifact, load_quantized_artifact, load_serving_artifact
+from .optimize import build_inference_model
+from .backends import create_backend
+from .runtime import apply_runtime_config, load_runtime_config
+from .codecs import encode_image
+from . import metrics
+import numpy as np
+import os
 import base64
+import logging
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+INPUT_SIZE = (256, 256)
+# The generator halves the resolution eight times, so native-resolution inputs are padded to multiples of this
+FULL_RESOLUTION_MULTIPLE = 256
+# Largest padded input run in one forward pass (activation memory grows ~650 MB per megapixel on CPU)
+FULL_RESOLUTION_MAX_PIXELS = 1024 * 1024
+# Reduced decodes keep at least this many pixels on the shorter side (2x the input for the antialiased resize)
+DECODE_MIN_SIZE = 512
+
+# Per-thread preprocessing buffers, keyed by (shape, pinned)
+_buffers = threading.local()
+
+
+def _normalize(pixels, out):
+    """uint8 -> float in [-1, 1], written straight into ``out`` without temporaries"""
+    np.multiply(pixels, np.float32(1 / 127.5), out=out, casting="unsafe")
+    np.subtract(out, np.float32(1.0), out=out)
+
+
+def full_resolution_pixels(height, width):
+    """Pixels the generator sees for a full-resolution pass over a height x width scene"""
+    multiple = FULL_RESOLUTION_MULTIPLE
+    return (-(-height // multiple) * multiple) * (-(-width // multiple) * multiple)
+
+
+def _input_buffer(shape, pin_memory=False):
+    cache = getattr(_buffers, "tensors", None)
+    if cache is None:
+        cache = _buffers.tensors = {}
+    key = (shape, pin_memory)
+    buffer = cache.get(key)
+    if buffer is None:
+        buffer = cache[key] = torch.empty(shape, dtype=torch.float32, pin_memory=pin_memory)
+    return buffer
+
 
 class SARColorizer:
-    def __init__(self, checkpoint_path="model/checkpoint_epoch_200.pth"):
+    # Linear-to-dB conversion of TIFF backscatter; None decides per file (see ScaledRaster)
+    raster_db = None
+
+    def __init__(self, checkpoint_path="model/checkpoint_epoch_200.pth", verify_checksum=False, optimize=None,
+                 quantized_path=None, backend="eager", backend_path=None, runtime_config=None, raster_db=None):
+        if optimize == "torchscript" and backend != "eager":
+            # The torchscript and onnxruntime backends would trace/export the already scripted module again
+            raise ValueError("optimize=torchscript builds TorchScript already; run it with the eager backend")
+        started = time.perf_counter()
         self.device = torch.device("cuda" if torch.cuda.is_available() else "cpu")
-        
+        self.raster_db = raster_db
+
+        # Thread pools from the autotune_inference command; sized before any work runs on them
+        self.runtime_config = load_runtime_config(runtime_config)
+        threads = {}
+        if self.runtime_config:
+            apply_runtime_config(self.runtime_config)
+            threads = {key: self.runtime_config[key] for key in ("intra_op_threads", "inter_op_threads")}
+
+        self.channels_last = False
+        self.fused = False
+        if is_serving_artifact(checkpoint_path):
+            self._load_serving_artifact(checkpoint_path, verify_checksum)
+        else:
+            self._load_training_checkpoint(checkpoint_path)
+        self.model.eval()
+        self.model.to(self.device)
+
+        self.quantization_report = None
+        if optimize == "int8":
+            self._load_quantized(quantized_path, backend)
+        elif optimize == "fused" and self.fused:
+            logger.info("%s is already fused", checkpoint_path)
+        elif optimize:
+            self._optimize(optimize)
+
+        # backend_path points at a prebuilt TorchScript / ONNX file; without it one is built from self.model
+        self.backend = create_backend(backend, self.model, self.device, path=backend_path,
+                                      channels_last=self.channels_last, **threads)
+        # The weights plus the build that runs them; INT8 checkpoint_ids already name their artifact
+        self.model_id = f"{self.checkpoint_id}|optimize={optimize or 'none'}|backend={backend}"
+
+        self.load_seconds = time.perf_counter() - started
+        metrics.MODEL_LOAD_SECONDS.labels(optimize or "none", backend).set(self.load_seconds)
+        logger.info("Loaded %s (optimize=%s, backend=%s) in %.2fs", checkpoint_path, optimize, backend,
+                    self.load_seconds)
+
+    @property
+    def serving_id(self):
+        """Everything that decides the output for a given upload, for result cache keys"""
+        return f"{self.model_id}|raster_db={self.raster_db}"
+
+    def _load_quantized(self, quantized_path, backend):
+        """Swap in the INT8 generator the quantize_model command calibrated for this checkpoint"""
+        if self.device.type != "cpu":
+            raise ValueError("INT8 inference is only available on CPU")
+        if not quantized_path:
+            raise ValueError("INT8 inference needs a quantized_path written by quantize_model")
+        if backend != "eager":
+            raise ValueError("The INT8 generator is TorchScript already; run it with the eager backend")
+        quantized, metadata = load_quantized_artifact(quantized_path)
+        if metadata["source"] != self.checkpoint_id:
+            raise ValueError(f"{quantized_path} was quantized from a different checkpoint ({metadata['source']})")
+        self.quantization_report = metadata["report"]
+        logger.info("INT8 generator: %s", self.quantization_report)
+        self.model = quantized
+        # INT8 results differ slightly from FP32 ones, so they get their own result cache keys
+        self.checkpoint_id = f"{self.checkpoint_id}:int8:{metadata['sha256']}"
+
+    def _optimize(self, mode):
+        """
+        Swap in a Conv/BN-fused ('fused') or frozen TorchScript ('torchscript') build.
+
+        Builds are checked against the original when they are exported
+        (export_serving_model, build_inference_model), not here.
+        """
+        example = torch.randn(1, 1, 256, 256, device=self.device)
+        self.model = build_inference_model(self.model, example, mode=mode, channels_last=True)
+        self.channels_last = True
+
+    def _load_training_checkpoint(self, checkpoint_path):
         # ✅ Use Generator which is an alias for UnetGenerator
         self.model = Generator(c_in=1, c_out=3)
         
+        # Identifies the weights in result cache keys
+        st = os.stat(checkpoint_path)
+        self.checkpoint_id = f"{os.path.basename(checkpoint_path)}:{st.st_size}:{st.st_mtime_ns}"
+
         checkpoint = torch.load(checkpoint_path, map_location=self.device)
         self.model.load_state_dict(checkpoint["generator_state_dict"])
-        self.model.eval()
-        self.model.to(self.device)
+
+    def _load_serving_artifact(self, artifact_path, verify_checksum):
+        """Memory-mapped, generator-only (and usually Conv/BN-fused) weights written by export_serving_model"""
+        state_dict, metadata = load_serving_artifact(artifact_path, verify=verify_checksum)
+        architecture = metadata["architecture"]
+        self.checkpoint_id = metadata["sha256"]
+        if self.device.type == "cpu":
+            # Build on the meta device and adopt the mapped tensors: no random init, no copy
+            with torch.device("meta"):
+                self.model = build_generator(architecture)
+            self.model.load_state_dict(state_dict, assign=True)
+        else:
+            self.model = build_generator(architecture)
+            self.model.load_state_dict(state_dict)
+        # Fused artifacts store their conv weights channels_last
+        self.fused = self.channels_last = bool(architecture.get("fused"))
     
     def preprocess_image(self, image):
-        transform = transforms.Compose([
-            transforms.Grayscale(num_output_channels=1),
-            transforms.Resize((256, 256)),
-            transforms.ToTensor(),
-            transforms.Normalize((0.5,), (0.5,))
-        ])
-        return transform(image).unsqueeze(0).to(self.device)
+        """
+        [1,1,256,256] generator input in [-1, 1] for a PIL image.
+
+        On CPU the returned tensor is a per-thread buffer that the next call
+        on the same thread overwrites; clone it to keep it around.
+        """
+        if image.mode != "L":
+            image = image.convert("L")
+        if image.size != INPUT_SIZE:
+            image = image.resize(INPUT_SIZE, Image.BILINEAR)
+        pixels = np.asarray(image)
+
+        pinned = self.device.type == "cuda"
+        buffer = _input_buffer((1, 1) + pixels.shape, pin_memory=pinned)
+        _normalize(pixels, buffer.numpy()[0, 0])
+        return buffer.to(self.device, non_blocking=pinned)
+
+    def preprocess_padded(self, pixels):
+        """
+        [1,1,H',W'] generator input for a uint8 [H,W] scene at native resolution,
+        reflect-padded at the bottom/right to multiples of FULL_RESOLUTION_MULTIPLE.
+        """
+        height, width = pixels.shape
+        pad_h = -height % FULL_RESOLUTION_MULTIPLE
+        pad_w = -width % FULL_RESOLUTION_MULTIPLE
+        if pad_h or pad_w:
+            pixels = np.pad(pixels, ((0, pad_h), (0, pad_w)), mode="reflect")
+        # Sizes vary per upload, so this gets its own tensor rather than a per-thread buffer
+        input_tensor = torch.empty((1, 1) + pixels.shape, dtype=torch.float32)
+        _normalize(pixels, input_tensor.numpy()[0, 0])
+        return input_tensor.to(self.device)
     
     def image_to_base64(self, image):
-        buffered = io.BytesIO()
-        image.save(buffered, format="PNG")
-        return base64.b64encode(buffered.getvalue()).decode()
+        return base64.b64encode(encode_image(image, "png")).decode()
+
+    def load_image(self, image_file, min_size=DECODE_MIN_SIZE):
+        """
+        Grayscale PIL image of an upload.
+
+        Large inputs are decoded at reduced size, keeping the shorter side at
+        least ``min_size`` for the 256x256 resize: uncompressed TIFFs are
+        decimated, JPEGs use DCT scaling and other formats are box-reduced
+        after decoding. ``min_size=None`` decodes at full resolution.
+        """
+        raster = open_raster(image_file, db=self.raster_db)
+        if raster is not None:
+            return Image.fromarray(raster.overview(min_size) if min_size else raster[:, :])
+        image = Image.open(image_file)
+        if min_size:
+            # No-op for formats without a reduced-resolution decoder
+            image.draft("L", (min_size, min_size))
+        if image.mode != "L":
+            image = image.convert("L")
+        factor = min(image.size) // min_size if min_size else 1
+        return image.reduce(factor) if factor > 1 else image
+
+    def load_array(self, image_file):
+        """Sliceable uint8 grayscale scene for tiled inference"""
+        raster = open_raster(image_file, db=self.raster_db)
+        if raster is not None:
+            return raster
+        return np.asarray(self.load_image(image_file, min_size=None))
+
+    def forward(self, input_tensor):
+        """Run the generator on a [N,1,H,W] batch and return [N,3,H,W]"""
+        return self.backend(input_tensor)
+
+    def postprocess(self, output_tensor):
+        """[1,3,H,W] generator output in [-1, 1] -> RGB PIL image (denormalizes output_tensor in place)"""
+        pixels = output_tensor.detach()[0].mul_(127.5).add_(127.5).clamp_(0, 255)
+        # The cast truncates like ToPILImage did; one copy gives contiguous HWC uint8
+        rgb = torch.empty(pixels.shape[1:] + pixels.shape[:1], dtype=torch.uint8, device=pixels.device)
+        rgb.copy_(pixels.permute(1, 2, 0))
+        return Image.fromarray(rgb.cpu().numpy())
     
+    def colorize_image(self, image_file, mode=None, tile_size=256, overlap=32, batch_size=8,
+                       max_pixels=FULL_RESOLUTION_MAX_PIXELS, forward=None):
+        """
+        Colorized PIL image.
+
+        The default mode resizes to 256x256. mode="tiled" keeps the native
+        resolution using overlapping tiles; mode="full" runs the whole scene
+        through the generator in one pass (reflect-padded, then cropped) and
+        falls back to tiles when the padded scene exceeds ``max_pixels``.
+        ``forward`` replaces self.forward (MicroBatcher passes its own).
+        """
+        forward = self.forward if forward is None else forward
+        if mode in ("tiled", "full"):
+            with metrics.DECODE_SECONDS.time():
+                scene = self.load_array(image_file)
+            height, width = scene.shape[:2]
+            if mode == "tiled" or full_resolution_pixels(height, width) > max_pixels:
+                with metrics.TILED_SECONDS.time():
+                    output = colorize_tiled(self, scene, tile_size=tile_size, overlap=overlap, batch_size=batch_size,
+                                            forward=forward)
+                return Image.fromarray(output)
+            with metrics.PREPROCESS_SECONDS.time():
+                input_tensor = self.preprocess_padded(np.asarray(scene[:, :]))
+            with metrics.FORWARD_SECONDS.time():
+                output_tensor = forward(input_tensor)
+            with metrics.POSTPROCESS_SECONDS.time():
+                return self.postprocess(output_tensor[:, :, :height, :width])
+        with metrics.DECODE_SECONDS.time():
+            image = self.load_image(image_file)
+            # Decoding can be lazy until the first pixel access; keep it out of the preprocess timing
+            image.load()
+        with metrics.PREPROCESS_SECONDS.time():
+            input_tensor = self.preprocess_image(image)
+        with metrics.FORWARD_SECONDS.time():
+            output_tensor = forward(input_tensor)
+        with metrics.POSTPROCESS_SECONDS.time():
+            return self.postprocess(output_tensor)
+
+    def colorize_encoded(self, image_file, fmt="png", quality=None, effort=None, **options):
+        """Colorized image encoded as png/webp/jpeg bytes (options go to colorize_image)"""
+        image = self.colorize_image(image_file, **options)
+        with metrics.ENCODE_SECONDS.time():
+            return encode_image(image, fmt, quality=quality, effort=effort)
+
     def colorize(self, image_file):
-        image = Image.open(image_file).convert("L")
-        input_tensor = self.preprocess_image(image)
-        
-        with torch.no_grad():
-            output_tensor = self.model(input_tensor)
-        
-        output_tensor = (output_tensor.squeeze(0).cpu() * 0.5 + 0.5).clamp(0, 1)
-        output_image = transforms.ToPILImage()(output_tensor)
-        
-        return self.image_to_base64(output_image)
\ No newline at end of file
+        return base64.b64encode(self.colorize_encoded(image_file)).decode()
+
+    def colorize_full_resolution(self, image_file, tile_size=256, overlap=32, batch_size=8):
+        """Colorize at native resolution using overlapping tiles instead of resizing to 256x256"""
+        encoded = self.colorize_encoded(image_file, mode="tiled", tile_size=tile_size, overlap=overlap,
+                                        batch_size=batch_size)
+        return base64.b64encode(encoded).decode()
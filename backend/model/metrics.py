@@ -0,0 +1,44 @@
+# backend/model/metrics.py
+# Prometheus metrics for the inference path. Label children are bound once here so the hot path only pays
+# for a perf_counter pair and a bucket update per observation. With several server processes set
+# PROMETHEUS_MULTIPROC_DIR (prometheus_client multiprocess mode); gauges are then summed over live processes.
+from prometheus_client import Counter, Gauge, Histogram
+
+# Most stages take milliseconds; forward and tiled passes on CPU take up to tens of seconds
+STAGE_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+INFERENCE_STAGE_SECONDS = Histogram(
+    'sarnet_inference_stage_seconds', 'Time spent in each SARColorizer stage', ['stage'], buckets=STAGE_BUCKETS,
+)
+DECODE_SECONDS = INFERENCE_STAGE_SECONDS.labels('decode')
+PREPROCESS_SECONDS = INFERENCE_STAGE_SECONDS.labels('preprocess')
+FORWARD_SECONDS = INFERENCE_STAGE_SECONDS.labels('forward')
+POSTPROCESS_SECONDS = INFERENCE_STAGE_SECONDS.labels('postprocess')
+TILED_SECONDS = INFERENCE_STAGE_SECONDS.labels('tiled')
+ENCODE_SECONDS = INFERENCE_STAGE_SECONDS.labels('encode')
+
+MODEL_LOAD_SECONDS = Gauge(
+    'sarnet_model_load_seconds', 'Time taken to load and optimize the generator',
+    ['optimize', 'backend'], multiprocess_mode='max',
+)
+
+INFERENCE_IN_FLIGHT = Gauge(
+    'sarnet_inference_in_flight', 'Predict requests being processed', multiprocess_mode='livesum',
+)
+INFERENCE_QUEUED = Gauge(
+    'sarnet_inference_queued', 'Requests waiting for an inference thread or a micro-batch',
+    ['queue'], multiprocess_mode='livesum',
+)
+EXECUTOR_QUEUED = INFERENCE_QUEUED.labels('executor')
+BATCHER_QUEUED = INFERENCE_QUEUED.labels('batcher')
+BATCH_SIZE = Histogram(
+    'sarnet_inference_batch_size', 'Inputs per micro-batched forward pass', buckets=(1, 2, 4, 8, 16, 32),
+)
+
+CACHE_REQUESTS = Counter(
+    'sarnet_result_cache_requests', 'Result cache lookups by outcome', ['result'],
+)
+CACHE_MEMORY_HITS = CACHE_REQUESTS.labels('memory_hit')
+CACHE_DISK_HITS = CACHE_REQUESTS.labels('disk_hit')
+CACHE_MISSES = CACHE_REQUESTS.labels('miss')
+CACHE_COALESCED = CACHE_REQUESTS.labels('coalesced')
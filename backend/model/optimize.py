@@ -0,0 +1,95 @@
+# backend/model/optimize.py
+import copy
+
+import torch
+import torch.nn as nn
+from torch.nn.utils.fusion import fuse_conv_bn_eval
+
+from .architecture import DownsamplingBlock, UpsamplingBlock
+
+
+def _with_bias(conv, bn, transpose=False):
+    """Give ``conv`` the bias folding ``bn`` into it would add, leaving its weights as they are"""
+    if conv.bias is None:
+        conv.bias = nn.Parameter(torch.empty(conv.out_channels, dtype=conv.weight.dtype, device=conv.weight.device))
+    return conv
+
+
+def _fuse_sequential(block, fuse=fuse_conv_bn_eval):
+    """Fold every BatchNorm2d into the conv before it and drop Dropout (eval-mode no-ops)"""
+    layers = []
+    for layer in block:
+        if isinstance(layer, nn.Dropout):
+            continue
+        if isinstance(layer, nn.BatchNorm2d) and layers:
+            prev = layers[-1]
+            if isinstance(prev, (nn.Conv2d, nn.ConvTranspose2d)):
+                layers[-1] = fuse(prev, layer, transpose=isinstance(prev, nn.ConvTranspose2d))
+                continue
+            if isinstance(prev, nn.Sequential) and isinstance(prev[-1], nn.Conv2d):
+                # use_upsampling=True blocks wrap Upsample + Conv2d in their own Sequential
+                layers[-1] = nn.Sequential(*prev[:-1], fuse(prev[-1], layer))
+                continue
+        layers.append(layer)
+    return nn.Sequential(*layers)
+
+
+def fuse_generator(model):
+    """
+    Return an eval-mode copy of a UnetGenerator with Conv/BN folded.
+
+    Only valid for inference: BatchNorm running statistics are baked into
+    the conv weights and Dropout is removed.
+    """
+    fused = copy.deepcopy(model).eval()
+    for module in fused.modules():
+        if isinstance(module, (DownsamplingBlock, UpsamplingBlock)):
+            module.conv_block = _fuse_sequential(module.conv_block)
+    return fused
+
+
+def fused_layout(model):
+    """
+    Restructure a UnetGenerator in place into the layout fuse_generator
+    produces, without computing fused weights. Used to load weights that
+    were fused at export time (build it on the meta device).
+    """
+    model.eval()
+    for module in model.modules():
+        if isinstance(module, (DownsamplingBlock, UpsamplingBlock)):
+            module.conv_block = _fuse_sequential(module.conv_block, fuse=_with_bias)
+    return model
+
+
+def build_inference_model(model, example_input, mode='torchscript', channels_last=True):
+    """
+    Inference build of a generator.
+
+    ``mode='fused'`` returns the folded eager module (ready for
+    ``torch.compile``); ``mode='torchscript'`` additionally traces and
+    freezes it. With ``channels_last`` weights are stored NHWC, which is
+    the faster conv layout on CPU.
+    """
+    fused = fuse_generator(model)
+    if channels_last:
+        fused = fused.to(memory_format=torch.channels_last)
+        example_input = example_input.contiguous(memory_format=torch.channels_last)
+    if mode == 'fused':
+        return fused
+    if mode != 'torchscript':
+        raise ValueError(f'Unknown inference build mode: {mode}')
+    with torch.no_grad():
+        traced = torch.jit.trace(fused, example_input)
+    # optimize_for_inference is not used: its MKLDNN rewrites cannot be saved and reloaded
+    return torch.jit.freeze(traced)
+
+
+def check_equivalence(reference, optimized, example_input, atol=1e-4):
+    """Max absolute difference between the two models; raises if it exceeds ``atol``"""
+    with torch.no_grad():
+        expected = reference.eval()(example_input)
+        actual = optimized(example_input)
+    max_diff = (expected - actual).abs().max().item()
+    if max_diff > atol:
+        raise ValueError(f'Optimized generator diverges from reference (max abs diff {max_diff:.2e} > {atol:.0e})')
+    return max_diff
@@ -0,0 +1,156 @@
+# backend/model/quantize.py
+import os
+import random
+import time
+
+import numpy as np
+import torch
+import torch.nn.functional as F
+from torch.ao.quantization import get_default_qconfig_mapping
+from torch.ao.quantization.quantize_fx import convert_fx, prepare_fx
+
+from .optimize import fuse_generator
+
+IMAGE_EXTENSIONS = ('.png', '.jpg', '.jpeg', '.tif', '.tiff', '.bmp')
+
+
+def find_images(directory):
+    """All image files below ``directory`` (SARColorizationDataset layout: the SAR half may sit in a subfolder)"""
+    paths = []
+    for root, _, files in os.walk(directory):
+        paths.extend(os.path.join(root, name) for name in files if name.lower().endswith(IMAGE_EXTENSIONS))
+    return sorted(paths)
+
+
+def calibration_inputs(colorizer, directory, num_samples=32, tile_size=256, seed=0):
+    """
+    [N,1,tile_size,tile_size] calibration batch sampled from a dataset directory.
+
+    Each sampled image contributes the resized input the default predict path
+    sees and, when large enough, one native-resolution crop like the tiled
+    path sees, so activation ranges cover both.
+    """
+    paths = find_images(directory)
+    if not paths:
+        raise ValueError(f'No calibration images found in {directory}')
+    rng = random.Random(seed)
+    rng.shuffle(paths)
+
+    inputs = []
+    for path in paths[:num_samples]:
+        image = colorizer.load_image(path, min_size=None)
+        # preprocess_image reuses its buffer, so keep a copy
+        inputs.append(colorizer.preprocess_image(image).cpu().clone())
+        if image.width >= tile_size and image.height >= tile_size:
+            x = rng.randint(0, image.width - tile_size)
+            y = rng.randint(0, image.height - tile_size)
+            crop = torch.from_numpy(np.array(image.crop((x, y, x + tile_size, y + tile_size))))
+            inputs.append(crop.view(1, 1, tile_size, tile_size).float().div_(127.5).sub_(1.0))
+    return torch.cat(inputs)
+
+
+def _is_cat(node):
+    return node.op == 'call_function' and node.target is torch.cat
+
+
+def _cat_qparams(prepared):
+    """Calibrated output ``(scale, zero_point)`` of every ``torch.cat`` in a prepared graph, by node name"""
+    qparams = {}
+    for node in prepared.graph.nodes:
+        if _is_cat(node):
+            (observer,) = node.users
+            scale, zero_point = prepared.get_submodule(observer.target).calculate_qparams()
+            qparams[node.name] = (float(scale), int(zero_point))
+    return qparams
+
+
+def _requantize_cats(quantized, qparams):
+    """
+    Give every skip-connection concat the qparams calibrated for it.
+
+    FX observes both inputs of a ``torch.cat`` with one shared observer,
+    but the decoder input is a ReLU output, which keeps the qparams of the
+    conv before it. The plain quantized cat then requantizes to its first
+    input's qparams and warns about the mismatch; ``quantized::cat`` with
+    the cat's calibrated qparams requantizes both inputs explicitly.
+    """
+    for node in quantized.graph.nodes:
+        if _is_cat(node) and node.name in qparams:
+            dim = node.args[1] if len(node.args) > 1 else node.kwargs.get('dim', 0)
+            node.target = torch.ops.quantized.cat
+            node.args = (node.args[0], dim, *qparams[node.name])
+            node.kwargs = {}
+    quantized.recompile()
+    return quantized
+
+
+def quantize_generator(model, calibration, batch_size=8, backend='x86'):
+    """
+    Post-training static INT8 quantization of a UnetGenerator (CPU only).
+
+    BatchNorm is folded first, then FX graph mode observers are calibrated
+    on ``calibration`` and the graph is converted to quantized kernels.
+    """
+    torch.backends.quantized.engine = backend
+    fused = fuse_generator(model).cpu()
+    prepared = prepare_fx(fused, get_default_qconfig_mapping(backend), (calibration[:1],))
+    with torch.no_grad():
+        for start in range(0, calibration.shape[0], batch_size):
+            prepared(calibration[start:start + batch_size])
+    # convert_fx rewrites the prepared graph, observers included
+    qparams = _cat_qparams(prepared)
+    return _requantize_cats(convert_fx(prepared), qparams)
+
+
+def psnr(a, b):
+    """PSNR in dB between two batches of images in [0, 1]"""
+    mse = F.mse_loss(a, b).item()
+    return float('inf') if mse == 0 else 10.0 * torch.log10(torch.tensor(1.0 / mse)).item()
+
+
+def ssim(a, b, window_size=11, sigma=1.5):
+    """Mean SSIM (Gaussian window) between two [N,C,H,W] batches in [0, 1]"""
+    coords = torch.arange(window_size, dtype=a.dtype) - window_size // 2
+    gauss = torch.exp(-coords ** 2 / (2 * sigma ** 2))
+    gauss /= gauss.sum()
+    channels = a.shape[1]
+    window = (gauss[:, None] * gauss[None, :]).expand(channels, 1, window_size, window_size).contiguous()
+
+    def filt(x):
+        return F.conv2d(x, window, groups=channels)
+
+    mu_a, mu_b = filt(a), filt(b)
+    var_a = filt(a * a) - mu_a ** 2
+    var_b = filt(b * b) - mu_b ** 2
+    cov = filt(a * b) - mu_a * mu_b
+    c1, c2 = 0.01 ** 2, 0.03 ** 2
+    ssim_map = ((2 * mu_a * mu_b + c1) * (2 * cov + c2)) / ((mu_a ** 2 + mu_b ** 2 + c1) * (var_a + var_b + c2))
+    return ssim_map.mean().item()
+
+
+def _latency_ms(model, inputs, runs):
+    with torch.no_grad():
+        model(inputs)
+        start = time.perf_counter()
+        for _ in range(runs):
+            model(inputs)
+    return (time.perf_counter() - start) * 1000.0 / runs
+
+
+def quantization_report(fp32_model, int8_model, inputs, batch_size=1, runs=5):
+    """PSNR/SSIM of the INT8 outputs against FP32 on ``inputs``, plus per-batch latency of both"""
+    with torch.no_grad():
+        expected = (fp32_model(inputs) * 0.5 + 0.5).clamp(0, 1)
+        actual = (int8_model(inputs) * 0.5 + 0.5).clamp(0, 1)
+    batch = inputs[:batch_size]
+    fp32_ms = _latency_ms(fp32_model, batch, runs)
+    int8_ms = _latency_ms(int8_model, batch, runs)
+    return {
+        'samples': int(inputs.shape[0]),
+        'psnr_db': psnr(actual, expected),
+        'ssim': ssim(actual, expected),
+        'batch_size': batch_size,
+        'fp32_ms': fp32_ms,
+        'int8_ms': int8_ms,
+        'speedup': fp32_ms / int8_ms,
+    }
@@ -0,0 +1,287 @@
+# backend/model/raster.py
+import re
+
+import numpy as np
+
+TIFF_SIGNATURES = (b'II*\x00', b'MM\x00*', b'II+\x00', b'MM\x00+')
+
+# TIFF field type -> numpy type code (ASCII and UNDEFINED as bytes, rationals as numerator/denominator pairs)
+FIELD_TYPES = {
+    1: 'u1', 2: 'u1', 3: 'u2', 4: 'u4', 5: 'u4', 6: 'i1', 7: 'u1', 8: 'i2', 9: 'i4', 10: 'i4',
+    11: 'f4', 12: 'f8', 13: 'u4', 16: 'u8', 17: 'i8', 18: 'u8',
+}
+
+# (SampleFormat, BitsPerSample) -> numpy type code
+SAMPLE_TYPES = {
+    (1, 8): 'u1', (1, 16): 'u2', (1, 32): 'u4',
+    (2, 8): 'i1', (2, 16): 'i2', (2, 32): 'i4',
+    (3, 32): 'f4', (3, 64): 'f8',
+}
+
+IMAGE_WIDTH = 256
+IMAGE_LENGTH = 257
+BITS_PER_SAMPLE = 258
+COMPRESSION = 259
+STRIP_OFFSETS = 273
+SAMPLES_PER_PIXEL = 277
+ROWS_PER_STRIP = 278
+PLANAR_CONFIG = 284
+TILE_WIDTH = 322
+TILE_LENGTH = 323
+TILE_OFFSETS = 324
+SAMPLE_FORMAT = 339
+GDAL_METADATA = 42112
+
+# Band unit in GDAL's metadata XML: GDAL writes it as role="unittype", other tools as a UNITS item
+UNIT_ITEM = re.compile(r'<Item\b(?=[^>]*(?:role="unittype"|name="units?"))[^>]*>([^<]*)</Item>', re.IGNORECASE)
+
+
+def is_tiff(header):
+    return bytes(header[:4]) in TIFF_SIGNATURES
+
+
+class TiffWindowReader:
+    """
+    Lazy window reader for uncompressed TIFF / GeoTIFF / BigTIFF rasters.
+
+    The file is memory-mapped and only the strips or tiles that intersect a
+    requested window are touched. Supports 8/16/32-bit integer and 32/64-bit
+    float samples in strip or tile layout; the first band is returned.
+    Compressed files raise ValueError so callers can fall back to PIL.
+    ``samples`` is the number of bands (SamplesPerPixel).
+
+    Slicing (``reader[y0:y1, x0:x1]``, steps allowed) returns native-dtype
+    arrays, so a reader can be passed anywhere a 2D ndarray is expected.
+    ``units`` is the band unit from GDAL metadata (e.g. 'dB'), or None.
+    """
+
+    def __init__(self, source):
+        if isinstance(source, (bytes, bytearray, memoryview)):
+            self._buf = np.frombuffer(source, dtype=np.uint8)
+        else:
+            self._buf = np.memmap(source, dtype=np.uint8, mode='r')
+        if not is_tiff(self._buf[:4]):
+            raise ValueError('Not a TIFF file')
+
+        self._bo = '<' if bytes(self._buf[:2]) == b'II' else '>'
+        self._big = int(self._scalar('u2', 2)) == 43
+        ifd_offset = int(self._scalar('u8', 8) if self._big else self._scalar('u4', 4))
+        tags = self._read_ifd(ifd_offset)
+
+        if int(tags.get(COMPRESSION, [1])[0]) != 1:
+            raise ValueError('Compressed TIFFs cannot be read by window')
+
+        width = int(tags[IMAGE_WIDTH][0])
+        height = int(tags[IMAGE_LENGTH][0])
+        self.shape = (height, width)
+        bits = int(tags.get(BITS_PER_SAMPLE, [1])[0])
+        sample_format = int(tags.get(SAMPLE_FORMAT, [1])[0])
+        if (sample_format, bits) not in SAMPLE_TYPES:
+            raise ValueError(f'Unsupported sample type ({sample_format}, {bits} bits)')
+        self.dtype = np.dtype(self._bo + SAMPLE_TYPES[(sample_format, bits)])
+
+        self.samples = int(tags.get(SAMPLES_PER_PIXEL, [1])[0])
+        # With separate planes the first band's strips/tiles come first and hold one sample each
+        self._samples = 1 if int(tags.get(PLANAR_CONFIG, [1])[0]) == 2 else self.samples
+        self.units = self._units(tags)
+
+        if TILE_OFFSETS in tags:
+            self._tile = (int(tags[TILE_LENGTH][0]), int(tags[TILE_WIDTH][0]))
+            self._offsets = tags[TILE_OFFSETS].astype(np.int64)
+            self._rows_per_strip = None
+        else:
+            self._tile = None
+            self._offsets = tags[STRIP_OFFSETS].astype(np.int64)
+            self._rows_per_strip = min(int(tags.get(ROWS_PER_STRIP, [height])[0]), height)
+
+        self._view = self._contiguous_view()
+
+    def _scalar(self, code, offset):
+        return np.frombuffer(self._buf, dtype=self._bo + code, count=1, offset=offset)[0]
+
+    def _read_ifd(self, offset):
+        count_code, entry_size, value_size = ('u8', 20, 8) if self._big else ('u2', 12, 4)
+        count_size = 8 if self._big else 2
+        n_entries = int(self._scalar(count_code, offset))
+        tags = {}
+        for i in range(n_entries):
+            entry = offset + count_size + i * entry_size
+            tag = int(self._scalar('u2', entry))
+            field_type = int(self._scalar('u2', entry + 2))
+            if field_type not in FIELD_TYPES:
+                continue
+            count = int(self._scalar('u8' if self._big else 'u4', entry + 4))
+            dtype = np.dtype(self._bo + FIELD_TYPES[field_type])
+            if field_type in (5, 10):
+                # Rationals are stored as numerator/denominator pairs
+                count *= 2
+            value_offset = entry + 4 + value_size
+            if dtype.itemsize * count > value_size:
+                value_offset = int(self._scalar('u8' if self._big else 'u4', value_offset))
+            tags[tag] = np.frombuffer(self._buf, dtype=dtype, count=count, offset=value_offset)
+        return tags
+
+    @staticmethod
+    def _units(tags):
+        if GDAL_METADATA not in tags:
+            return None
+        match = UNIT_ITEM.search(bytes(tags[GDAL_METADATA]).rstrip(b'\x00').decode('latin-1'))
+        if match is None:
+            return None
+        return match.group(1).strip() or None
+
+    def _contiguous_view(self):
+        """Zero-copy [H,W,S] view when the strips are stored back to back, else None"""
+        if self._tile is not None:
+            return None
+        height, width = self.shape
+        strip_bytes = self._rows_per_strip * width * self._samples * self.dtype.itemsize
+        n_strips = -(-height // self._rows_per_strip)
+        expected = self._offsets[0] + strip_bytes * np.arange(n_strips, dtype=np.int64)
+        if not np.array_equal(self._offsets[:n_strips], expected):
+            return None
+        return np.ndarray((height, width, self._samples), dtype=self.dtype, buffer=self._buf, offset=int(self._offsets[0]))
+
+    def _chunk(self, index, rows, cols):
+        return np.ndarray((rows, cols, self._samples), dtype=self.dtype, buffer=self._buf, offset=int(self._offsets[index]))
+
+    def read_window(self, y0, y1, x0, x1):
+        """Native-dtype [y1-y0, x1-x0] array of the first band"""
+        if self._view is not None:
+            return self._view[y0:y1, x0:x1, 0]
+
+        width = self.shape[1]
+        out = np.empty((y1 - y0, x1 - x0), dtype=self.dtype)
+        if self._tile is None:
+            rps = self._rows_per_strip
+            for strip in range(y0 // rps, (y1 - 1) // rps + 1):
+                top = strip * rps
+                rows = min(rps, self.shape[0] - top)
+                data = self._chunk(strip, rows, width)
+                a, b = max(y0, top), min(y1, top + rows)
+                out[a - y0:b - y0] = data[a - top:b - top, x0:x1, 0]
+            return out
+
+        tile_h, tile_w = self._tile
+        across = -(-width // tile_w)
+        for ty in range(y0 // tile_h, (y1 - 1) // tile_h + 1):
+            for tx in range(x0 // tile_w, (x1 - 1) // tile_w + 1):
+                data = self._chunk(ty * across + tx, tile_h, tile_w)
+                top, left = ty * tile_h, tx * tile_w
+                a, b = max(y0, top), min(y1, top + tile_h)
+                c, d = max(x0, left), min(x1, left + tile_w)
+                out[a - y0:b - y0, c - x0:d - x0] = data[a - top:b - top, c - left:d - left, 0]
+        return out
+
+    def __getitem__(self, key):
+        rows, cols = key
+        y0, y1, sy = rows.indices(self.shape[0])
+        x0, x1, sx = cols.indices(self.shape[1])
+        if y1 <= y0 or x1 <= x0:
+            return np.empty((0, 0), dtype=self.dtype)
+        window = self.read_window(y0, y1, x0, x1)
+        return window[::sy, ::sx] if sy != 1 or sx != 1 else window
+
+    def overview(self, min_size):
+        """Decimated copy whose shorter side is at least ``min_size``, read one row at a time"""
+        step = max(1, min(self.shape) // min_size)
+        if self._view is not None:
+            return np.ascontiguousarray(self._view[::step, ::step, 0])
+        rows = [self.read_window(y, y + 1, 0, self.shape[1])[0, ::step] for y in range(0, self.shape[0], step)]
+        return np.stack(rows)
+
+
+class ScaledRaster:
+    """
+    uint8 view over a TiffWindowReader for the model input.
+
+    16-bit and float backscatter is contrast-stretched between the 2nd and
+    98th percentile of a decimated sample. Linear power (sigma0) is converted
+    to dB first: ``db=None`` decides from the band unit in the GeoTIFF
+    metadata, and for float rasters without one from the data, since linear
+    power is never negative. Scaling is applied per window, vectorized.
+    """
+
+    def __init__(self, reader, db=None, percentiles=(2, 98), sample_size=512):
+        self.reader = reader
+        self.shape = reader.shape
+        sample = None
+        if db is None:
+            units = (getattr(reader, 'units', None) or '').lower()
+            if units:
+                db = not units.startswith(('db', 'decibel'))
+            elif reader.dtype.kind == 'f':
+                sample = reader.overview(sample_size)
+                db = not (sample < 0).any()
+            else:
+                db = False
+        self.db = db
+        self.passthrough = reader.dtype == np.uint8 and not self.db
+        if not self.passthrough:
+            sample = self._transform(reader.overview(sample_size) if sample is None else sample)
+            sample = sample[np.isfinite(sample)]
+            low, high = np.percentile(sample, percentiles) if sample.size else (0.0, 1.0)
+            self.low = float(low)
+            self.scale = 255.0 / max(float(high) - float(low), 1e-6)
+
+    def _transform(self, window):
+        window = window.astype(np.float32)
+        if self.db:
+            np.maximum(window, 1e-10, out=window)
+            np.log10(window, out=window)
+            window *= 10.0
+        return window
+
+    def to_uint8(self, window):
+        if self.passthrough:
+            return window
+        window = self._transform(window)
+        window -= self.low
+        window *= self.scale
+        np.nan_to_num(window, copy=False, nan=0.0)
+        np.clip(window, 0, 255, out=window)
+        return window.astype(np.uint8)
+
+    def __getitem__(self, key):
+        return self.to_uint8(self.reader[key])
+
+    def overview(self, min_size):
+        return self.to_uint8(self.reader.overview(min_size))
+
+
+def open_raster(image_file, db=None):
+    """
+    Return a ScaledRaster for TIFF inputs that can be read by window, else None.
+
+    Accepts a path, a Django upload (temporary uploads are memory-mapped from
+    disk) or any file-like object; file-likes are rewound on fallback.
+    ``db`` forces or skips the linear-to-dB conversion (see ScaledRaster).
+    8-bit multi-band files (RGB/RGBA) are left to PIL, whose luminance
+    conversion uses every channel rather than just the first.
+    """
+    if isinstance(image_file, str):
+        source = image_file
+        with open(source, 'rb') as f:
+            header = f.read(4)
+    elif hasattr(image_file, 'temporary_file_path'):
+        source = image_file.temporary_file_path()
+        with open(source, 'rb') as f:
+            header = f.read(4)
+    else:
+        image_file.seek(0)
+        header = image_file.read(4)
+        image_file.seek(0)
+        source = None
+
+    if not is_tiff(header):
+        return None
+    try:
+        if source is None:
+            source = image_file.read()
+            image_file.seek(0)
+        reader = TiffWindowReader(source)
+        if reader.samples > 1 and reader.dtype == np.uint8:
+            return None
+        return ScaledRaster(reader, db=db)
+    except (ValueError, KeyError, IndexError, TypeError):
+        return None
@@ -0,0 +1,191 @@
+# backend/model/runtime.py
+import json
+import logging
+import multiprocessing
+import os
+import platform
+import tempfile
+import time
+from datetime import datetime, timezone
+
+import numpy as np
+import torch
+
+logger = logging.getLogger(__name__)
+
+FORMAT = 'sarnet-runtime-v1'
+
+
+def cpu_count():
+    """CPUs this process may run on (respects taskset / cgroup cpusets)"""
+    try:
+        return len(os.sched_getaffinity(0))
+    except AttributeError:
+        return os.cpu_count() or 1
+
+
+def load_runtime_config(path):
+    """Tuned settings written by the autotune_inference command, or None if there are none"""
+    if not path or not os.path.exists(path):
+        return None
+    with open(path) as f:
+        config = json.load(f)
+    if config.get('format') != FORMAT:
+        raise ValueError(f'{path} is not a runtime config (format {config.get("format")!r})')
+    return config
+
+
+def save_runtime_config(config, path):
+    directory = os.path.dirname(os.path.abspath(path))
+    os.makedirs(directory, exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(dir=directory, suffix='.json')
+    with os.fdopen(fd, 'w') as f:
+        json.dump(config, f, indent=2)
+    os.replace(tmp_path, path)
+
+
+def apply_runtime_config(config):
+    """
+    Set torch's intra-op and inter-op thread pools for this process.
+
+    The inter-op pool can only be sized before the first parallel region
+    runs, so a late call keeps the current size and logs a warning.
+    """
+    torch.set_num_threads(config['intra_op_threads'])
+    inter_op_threads = config.get('inter_op_threads')
+    if inter_op_threads and inter_op_threads != torch.get_num_interop_threads():
+        try:
+            torch.set_num_interop_threads(inter_op_threads)
+        except RuntimeError:
+            logger.warning('Inter-op thread pool already started; keeping %d threads',
+                           torch.get_num_interop_threads())
+
+
+def _trial_worker(colorizer_options, intra_op_threads, inter_op_threads, batch_size, warmup,
+                  duration, barrier, results):
+    # Runs in a fresh (spawned) interpreter so both thread pools can still be sized
+    torch.set_num_threads(intra_op_threads)
+    torch.set_num_interop_threads(inter_op_threads)
+    from .inference import SARColorizer
+
+    colorizer = SARColorizer(**colorizer_options)
+    inputs = torch.randn(batch_size, 1, 256, 256, device=colorizer.device)
+    for _ in range(warmup):
+        colorizer.forward(inputs)
+    barrier.wait()
+
+    latencies = []
+    began = time.perf_counter()
+    while time.perf_counter() - began < duration:
+        start = time.perf_counter()
+        colorizer.forward(inputs)
+        latencies.append(time.perf_counter() - start)
+    results.put((latencies, time.perf_counter() - began))
+
+
+def run_trial(colorizer_options, intra_op_threads, inter_op_threads=1, batch_size=1, processes=1,
+              warmup=3, duration=3.0, timeout=600.0):
+    """
+    Throughput and latency of ``processes`` concurrent colorizers, each
+    running back-to-back forward passes of ``batch_size`` 256x256 inputs.
+    """
+    context = multiprocessing.get_context('spawn')
+    barrier = context.Barrier(processes)
+    results = context.Queue()
+    workers = [
+        context.Process(
+            target=_trial_worker,
+            args=(colorizer_options, intra_op_threads, inter_op_threads, batch_size, warmup, duration,
+                  barrier, results),
+            daemon=True,
+        )
+        for _ in range(processes)
+    ]
+    for worker in workers:
+        worker.start()
+    try:
+        measured = [results.get(timeout=timeout) for _ in workers]
+    finally:
+        for worker in workers:
+            worker.join(timeout=5)
+            if worker.is_alive():
+                worker.terminate()
+
+    latencies_ms = np.array([latency for latencies, _ in measured for latency in latencies]) * 1000.0
+    return {
+        'processes': processes,
+        'intra_op_threads': intra_op_threads,
+        'inter_op_threads': inter_op_threads,
+        'batch_size': batch_size,
+        'images_per_s': round(sum(len(latencies) * batch_size / elapsed for latencies, elapsed in measured), 2),
+        'p50_ms': round(float(np.percentile(latencies_ms, 50)), 2),
+        'p99_ms': round(float(np.percentile(latencies_ms, 99)), 2),
+    }
+
+
+def layout_candidates(cpus, processes=None, inter_op_threads=(1, 2)):
+    """(processes, intra, inter) splits of ``cpus`` cores that do not oversubscribe them"""
+    if processes is None:
+        processes = [p for p in (1, 2, 4, 8, 16, 32, 64) if p <= cpus]
+    candidates = []
+    for p in processes:
+        share = max(1, cpus // p)
+        for intra in sorted({share, max(1, share // 2)}, reverse=True):
+            for inter in inter_op_threads:
+                candidates.append((p, intra, inter))
+    return candidates
+
+
+def _best(trials, max_p99_ms=None):
+    eligible = [t for t in trials if max_p99_ms is None or t['p99_ms'] <= max_p99_ms]
+    if not eligible:
+        # Nothing meets the latency budget: take the lowest-latency setting instead
+        return min(trials, key=lambda t: t['p99_ms'])
+    return max(eligible, key=lambda t: (t['images_per_s'], -t['p99_ms']))
+
+
+def autotune(colorizer_options, cpus=None, processes=None, batch_sizes=(1, 2, 4, 8), inter_op_threads=(1, 2),
+             max_p99_ms=None, warmup=3, duration=3.0, progress=None):
+    """
+    Sweep thread pools, process count and batch size on this machine.
+
+    The process/thread layout is chosen first at batch size 1 (the latency
+    critical case), then batch sizes are swept with that layout. The best
+    trial is the highest throughput whose p99 batch latency stays within
+    ``max_p99_ms``. Returns a config for ``save_runtime_config``.
+    """
+    cpus = cpus or cpu_count()
+    trials = []
+
+    def trial(p, intra, inter, batch_size):
+        result = run_trial(colorizer_options, intra, inter, batch_size=batch_size, processes=p,
+                           warmup=warmup, duration=duration)
+        trials.append(result)
+        if progress:
+            progress(result)
+        return result
+
+    layouts = [trial(p, intra, inter, 1) for p, intra, inter in layout_candidates(cpus, processes, inter_op_threads)]
+    layout = _best(layouts, max_p99_ms)
+    batched = [layout] + [
+        trial(layout['processes'], layout['intra_op_threads'], layout['inter_op_threads'], batch_size)
+        for batch_size in batch_sizes if batch_size != 1
+    ]
+    best = _best(batched, max_p99_ms)
+
+    return {
+        'format': FORMAT,
+        'intra_op_threads': best['intra_op_threads'],
+        'inter_op_threads': best['inter_op_threads'],
+        'max_batch_size': best['batch_size'],
+        'workers': best['processes'],
+        'images_per_s': best['images_per_s'],
+        'p99_ms': best['p99_ms'],
+        'cpus': cpus,
+        'machine': platform.machine(),
+        'processor': platform.processor(),
+        'torch_version': torch.__version__,
+        'max_p99_ms': max_p99_ms,
+        'tuned_at': datetime.now(timezone.utc).isoformat(),
+        'trials': trials,
+    }
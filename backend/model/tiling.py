@@ -0,0 +1,91 @@
+# backend/model/tiling.py
+import numpy as np
+import torch
+
+
+def feather_window(tile_size, overlap):
+    """2D blending weights: linear ramps over the overlap at every edge, 1 in the middle"""
+    ramp = np.ones(tile_size, dtype=np.float32)
+    if overlap > 0:
+        edge = (np.arange(overlap, dtype=np.float32) + 1.0) / (overlap + 1.0)
+        ramp[:overlap] = edge
+        ramp[-overlap:] = edge[::-1]
+    return np.outer(ramp, ramp)
+
+
+def tile_positions(length, tile_size, stride):
+    """Start offsets so that tiles cover [0, length), the last one flush with the end"""
+    if length <= tile_size:
+        return [0]
+    positions = list(range(0, length - tile_size + 1, stride))
+    if positions[-1] + tile_size < length:
+        positions.append(length - tile_size)
+    return positions
+
+
+def read_tile(source, y, x, tile_size):
+    """Read a tile from a 2D array-like, mirror-padding it to tile_size at the scene borders"""
+    tile = np.asarray(source[y:y + tile_size, x:x + tile_size])
+    pad_h = tile_size - tile.shape[0]
+    pad_w = tile_size - tile.shape[1]
+    if pad_h or pad_w:
+        tile = np.pad(tile, ((0, pad_h), (0, pad_w)), mode='symmetric')
+    return tile
+
+
+def colorize_tiled(colorizer, source, tile_size=256, overlap=32, batch_size=8, out=None, forward=None):
+    """
+    Colorize a grayscale scene of any size at native resolution.
+
+    ``source`` is any 2D uint8 array-like that supports slicing (ndarray,
+    np.memmap, windowed reader). The scene is cut into overlapping
+    ``tile_size`` windows that go through the generator ``batch_size`` at a
+    time and are blended back with feathered weights. Accumulation happens
+    one band of tile rows at a time, so working memory is bounded by the
+    tile batch and the scene width, not the scene height. Pass a
+    preallocated uint8 [H,W,3] ``out`` (e.g. np.memmap) to stream the
+    result to disk. ``forward`` replaces ``colorizer.forward`` (e.g. a
+    MicroBatcher's).
+    """
+    forward = colorizer.forward if forward is None else forward
+    height, width = source.shape[:2]
+    if not 0 <= overlap < tile_size:
+        raise ValueError('overlap must be in [0, tile_size)')
+    stride = tile_size - overlap
+    if out is None:
+        out = np.empty((height, width, 3), dtype=np.uint8)
+
+    window = feather_window(tile_size, overlap)
+    rows = tile_positions(height, tile_size, stride)
+    cols = tile_positions(width, tile_size, stride)
+
+    # Band accumulators cover rows [band_top, band_top + tile_size)
+    acc = np.zeros((tile_size, width, 3), dtype=np.float32)
+    weight = np.zeros((tile_size, width), dtype=np.float32)
+
+    for i, y in enumerate(rows):
+        for start in range(0, len(cols), batch_size):
+            xs = cols[start:start + batch_size]
+            tiles = np.stack([read_tile(source, y, x, tile_size) for x in xs])
+            batch = torch.from_numpy(tiles).to(colorizer.device, dtype=torch.float32)
+            batch = batch.unsqueeze(1).div_(127.5).sub_(1.0)
+            output = forward(batch)
+            output = output.float().cpu().numpy().transpose(0, 2, 3, 1)
+            for x, tile_out in zip(xs, output):
+                w = min(tile_size, width - x)
+                h = min(tile_size, height - y)
+                acc[:h, x:x + w] += tile_out[:h, :w] * window[:h, :w, None]
+                weight[:h, x:x + w] += window[:h, :w]
+
+        # Rows above the next band will not receive any more contributions
+        next_y = rows[i + 1] if i + 1 < len(rows) else height
+        done = min(next_y - y, height - y)
+        blended = acc[:done] / weight[:done, :, None]
+        out[y:y + done] = np.clip((blended * 0.5 + 0.5) * 255.0 + 0.5, 0, 255).astype(np.uint8)
+
+        acc[:tile_size - done] = acc[done:].copy()
+        acc[tile_size - done:] = 0
+        weight[:tile_size - done] = weight[done:].copy()
+        weight[tile_size - done:] = 0
+
+    return out
@@ -0,0 +1,272 @@
+# backend/model/workers.py
+import atexit
+import json
+import logging
+import multiprocessing
+import os
+import signal
+import socket
+import threading
+from collections import OrderedDict
+from multiprocessing import resource_tracker, shared_memory
+
+import numpy as np
+import torch
+
+from .inference import SARColorizer
+
+logger = logging.getLogger(__name__)
+
+
+def _attach(name):
+    """Attach to a client's segment without letting this process's resource tracker unlink it"""
+    try:
+        return shared_memory.SharedMemory(name=name, track=False)
+    except TypeError:  # Python < 3.13
+        shm = shared_memory.SharedMemory(name=name)
+        resource_tracker.unregister(shm._name, 'shared_memory')
+        return shm
+
+
+def _send(sock_file, message):
+    sock_file.write(json.dumps(message).encode() + b'\n')
+    sock_file.flush()
+
+
+def _receive(sock_file):
+    line = sock_file.readline()
+    if not line:
+        raise ConnectionError('Inference worker closed the connection')
+    return json.loads(line)
+
+
+class _Segments:
+    """
+    Small LRU of attached shared-memory segments so hot clients are not re-mapped per request.
+
+    Entries are keyed by the client's slot (process, thread and role), so a
+    segment the client grew or dropped is unmapped as soon as its
+    replacement arrives instead of lingering until evicted.
+    """
+
+    def __init__(self, capacity=64):
+        self.capacity = capacity
+        self._segments = OrderedDict()
+
+    def get(self, name, slot):
+        shm = self._segments.get(slot)
+        if shm is not None and shm.name != name:
+            del self._segments[slot]
+            shm.close()
+            shm = None
+        if shm is None:
+            shm = self._segments[slot] = _attach(name)
+            while len(self._segments) > self.capacity:
+                _, old = self._segments.popitem(last=False)
+                old.close()
+        self._segments.move_to_end(slot)
+        return shm
+
+
+def _handle(conn, colorizer, segments, num_workers):
+    with conn, conn.makefile('rwb') as sock_file:
+        request = _receive(sock_file)
+        try:
+            if request['op'] == 'info':
+                _send(sock_file, {
+                    'ok': True, 'checkpoint_id': colorizer.checkpoint_id, 'model_id': colorizer.model_id,
+                    'pid': os.getpid(), 'workers': num_workers,
+                })
+                return
+            shape = tuple(request['shape'])
+            in_shm = segments.get(request['input'], (request['slot'], 'input'))
+            inputs = np.ndarray(shape, dtype=np.float32, buffer=in_shm.buf)
+            output = colorizer.forward(torch.from_numpy(inputs).to(colorizer.device))
+            output = output.detach().float().cpu().contiguous().numpy()
+            out_shm = segments.get(request['output'], (request['slot'], 'output'))
+            if output.nbytes > out_shm.size:
+                raise ValueError('Output segment is too small')
+            np.ndarray(output.shape, dtype=np.float32, buffer=out_shm.buf)[...] = output
+            _send(sock_file, {'ok': True, 'shape': list(output.shape)})
+        except Exception as e:
+            _send(sock_file, {'ok': False, 'error': f'{type(e).__name__}: {e}'})
+
+
+def _worker_main(listener, colorizer_factory, num_workers):
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    signal.signal(signal.SIGTERM, signal.SIG_DFL)
+    colorizer = colorizer_factory()
+    segments = _Segments()
+    while True:
+        conn, _ = listener.accept()
+        try:
+            _handle(conn, colorizer, segments, num_workers)
+        except (ConnectionError, OSError, ValueError):
+            continue
+
+
+def serve(socket_path, colorizer_factory, num_workers=2):
+    """
+    Run a pre-forked pool of inference workers on a Unix socket.
+
+    Every worker builds its own colorizer (with a memory-mapped serving
+    artifact the weight pages are shared between them) and accepts one
+    request per connection, so the kernel balances requests across idle
+    workers. A worker that dies (OOM kill, segfault in a kernel) is
+    replaced; its in-flight request fails on the client side. Blocks until
+    SIGINT/SIGTERM.
+    """
+    if os.path.exists(socket_path):
+        os.unlink(socket_path)
+    listener = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    listener.bind(socket_path)
+    listener.listen(128)
+
+    context = multiprocessing.get_context('fork')
+
+    def spawn(i):
+        worker = context.Process(target=_worker_main, args=(listener, colorizer_factory, num_workers),
+                                 name=f'sar-inference-{i}', daemon=True)
+        worker.start()
+        return worker
+
+    workers = [spawn(i) for i in range(num_workers)]
+    stop = threading.Event()
+    signal.signal(signal.SIGTERM, lambda *_: stop.set())
+    try:
+        while not stop.is_set():
+            for i, worker in enumerate(workers):
+                if not worker.is_alive():
+                    logger.warning('Inference worker %s (pid %s) exited with code %s; starting a replacement',
+                                   worker.name, worker.pid, worker.exitcode)
+                    workers[i] = spawn(i)
+            stop.wait(1.0)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        for worker in workers:
+            worker.terminate()
+        for worker in workers:
+            worker.join()
+        listener.close()
+        if os.path.exists(socket_path):
+            os.unlink(socket_path)
+
+
+class WorkerPoolBackend:
+    """
+    Inference backend that forwards to a worker pool started with ``serve``.
+
+    Each calling thread owns an input and an output shared-memory segment
+    that are reused (and grown) across requests; only a short JSON header
+    goes over the socket. A request that fails or times out may still be
+    running in a worker that writes into the segments later, so they are
+    dropped and the next request gets fresh ones.
+    """
+
+    name = 'workers'
+
+    def __init__(self, socket_path, timeout=120.0, c_out=3):
+        self.socket_path = socket_path
+        self.timeout = timeout
+        self.c_out = c_out
+        self.device = torch.device('cpu')
+        self._local = threading.local()
+        self._all_segments = []
+        self._segments_lock = threading.Lock()
+        atexit.register(self.close)
+
+    def _request(self, message):
+        with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as conn:
+            conn.settimeout(self.timeout)
+            conn.connect(self.socket_path)
+            with conn.makefile('rwb') as sock_file:
+                _send(sock_file, message)
+                reply = _receive(sock_file)
+        if not reply.get('ok'):
+            raise RuntimeError(f"Inference worker failed: {reply.get('error')}")
+        return reply
+
+    def info(self):
+        return self._request({'op': 'info'})
+
+    def _segment(self, attr, nbytes):
+        shm = getattr(self._local, attr, None)
+        if shm is None or shm.size < nbytes:
+            if shm is not None:
+                self._release(shm)
+            shm = shared_memory.SharedMemory(create=True, size=nbytes)
+            with self._segments_lock:
+                self._all_segments.append(shm)
+            setattr(self._local, attr, shm)
+        return shm
+
+    def _discard_segments(self):
+        for attr in ('input', 'output'):
+            shm = getattr(self._local, attr, None)
+            if shm is not None:
+                setattr(self._local, attr, None)
+                self._release(shm)
+
+    def _release(self, shm):
+        with self._segments_lock:
+            if shm in self._all_segments:
+                self._all_segments.remove(shm)
+        shm.close()
+        shm.unlink()
+
+    def __call__(self, input_tensor):
+        inputs = input_tensor.detach().to('cpu', torch.float32).contiguous().numpy()
+        out_shape = (inputs.shape[0], self.c_out) + inputs.shape[2:]
+        in_shm = self._segment('input', inputs.nbytes)
+        out_shm = self._segment('output', int(np.prod(out_shape)) * 4)
+        np.ndarray(inputs.shape, dtype=np.float32, buffer=in_shm.buf)[...] = inputs
+
+        try:
+            reply = self._request({
+                'op': 'forward',
+                'input': in_shm.name,
+                'output': out_shm.name,
+                'slot': f'{os.getpid()}-{threading.get_ident()}',
+                'shape': list(inputs.shape),
+            })
+        except Exception:
+            self._discard_segments()
+            raise
+        output = np.ndarray(tuple(reply['shape']), dtype=np.float32, buffer=out_shm.buf)
+        # Copy out: the segment is reused by this thread's next request
+        return torch.from_numpy(output.copy())
+
+    def close(self):
+        with self._segments_lock:
+            segments, self._all_segments = self._all_segments, []
+        for shm in segments:
+            try:
+                shm.close()
+                shm.unlink()
+            except (FileNotFoundError, BufferError):
+                pass
+
+
+class RemoteColorizer(SARColorizer):
+    """
+    SARColorizer whose forward pass runs in the worker pool.
+
+    Decoding, preprocessing and encoding stay in the web process; no model
+    is loaded here.
+    """
+
+    def __init__(self, socket_path, timeout=120.0, raster_db=None):
+        self.device = torch.device('cpu')
+        self.raster_db = raster_db
+        self.channels_last = False
+        self.quantization_report = None
+        self.runtime_config = None
+        self.model = None
+        self.backend = WorkerPoolBackend(socket_path, timeout=timeout)
+        info = self.backend.info()
+        self.checkpoint_id = info['checkpoint_id']
+        # The pool's build and backend; TIFF scaling (raster_db) happens here, in the web process
+        self.model_id = info['model_id']
+        # Forward passes the pool can run at once
+        self.workers = info.get('workers', 1)
@@ -51,6 +51,8 @@ LOCAL_APPS = [
 INSTALLED_APPS = DJANGO_APPS + THIRD_PARTY_APPS + LOCAL_APPS
 
 MIDDLEWARE = [
+    # First, so per-endpoint latency covers the whole middleware stack (served at /api/metrics/)
+    'core.middleware.RequestMetricsMiddleware',
     'corsheaders.middleware.CorsMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
@@ -284,6 +286,101 @@ CORS_ALLOW_HEADERS = [
     'x-requested-with',
 ]
 
+# Inference
+# Threads that run blocking inference for the async predict view (bounds in-flight colorizations per process)
+INFERENCE_ASYNC_THREADS = config('INFERENCE_ASYNC_THREADS', default=8, cast=int)
+# Either a training checkpoint or a serving artifact from `manage.py export_serving_model`
+INFERENCE_CHECKPOINT_PATH = config('INFERENCE_CHECKPOINT_PATH', default='model/checkpoint_epoch_200.pth')
+INFERENCE_VERIFY_CHECKSUM = config('INFERENCE_VERIFY_CHECKSUM', default=False, cast=bool)
+# '' (as loaded: serving artifacts are exported Conv/BN-fused), 'fused' (fold a training checkpoint at load),
+# 'torchscript' (fused + frozen; the eager backend only) or 'int8' (the generator `manage.py quantize_model
+# --output` saved to INFERENCE_INT8_PATH for this checkpoint; CPU and the eager backend only)
+INFERENCE_OPTIMIZE = config('INFERENCE_OPTIMIZE', default='')
+INFERENCE_INT8_PATH = config('INFERENCE_INT8_PATH', default='')
+# Runtime that executes the generator: 'eager', 'torchscript' or 'onnxruntime' (needs the onnxruntime package).
+# INFERENCE_BACKEND_PATH optionally points at a file from build_inference_model / export_onnx
+INFERENCE_BACKEND = config('INFERENCE_BACKEND', default='eager')
+INFERENCE_BACKEND_PATH = config('INFERENCE_BACKEND_PATH', default='')
+# Out-of-process inference: when set, web workers send inputs to the pool started with
+# `manage.py run_inference_workers` over this Unix socket (tensors go through shared memory)
+INFERENCE_WORKER_SOCKET = config('INFERENCE_WORKER_SOCKET', default='')
+INFERENCE_WORKERS = config('INFERENCE_WORKERS', default=2, cast=int)
+INFERENCE_WORKER_TIMEOUT = config('INFERENCE_WORKER_TIMEOUT', default=120.0, cast=float)
+# Threads per process, batch size and worker count tuned by `manage.py autotune_inference`. When the file
+# exists its worker count takes precedence over INFERENCE_WORKERS and its batch size is capped by
+# INFERENCE_MAX_BATCH_SIZE; set to '' to ignore it
+INFERENCE_RUNTIME_CONFIG = config('INFERENCE_RUNTIME_CONFIG', default=str(BASE_DIR / 'model' / 'runtime.json'))
+# Requests arriving within the window are batched into one forward pass (1 disables batching, whatever
+# INFERENCE_RUNTIME_CONFIG says)
+INFERENCE_MAX_BATCH_SIZE = config('INFERENCE_MAX_BATCH_SIZE', default=8, cast=int)
+INFERENCE_BATCH_WINDOW_MS = config('INFERENCE_BATCH_WINDOW_MS', default=5.0, cast=float)
+# Tiled full-resolution mode (predict with mode=tiled)
+INFERENCE_TILE_SIZE = config('INFERENCE_TILE_SIZE', default=256, cast=int)
+INFERENCE_TILE_OVERLAP = config('INFERENCE_TILE_OVERLAP', default=32, cast=int)
+INFERENCE_TILE_BATCH_SIZE = config('INFERENCE_TILE_BATCH_SIZE', default=8, cast=int)
+# Single-pass native-resolution mode (predict with mode=full): scenes are reflect-padded to multiples of 256;
+# above this many padded pixels (activation memory is ~650 MB per megapixel) they go through tiles instead
+INFERENCE_FULL_MAX_PIXELS = config('INFERENCE_FULL_MAX_PIXELS', default=1024 * 1024, cast=int)
+# Convert TIFF backscatter from linear power to dB before scaling: 'true', 'false', or '' to decide per file
+# from the GeoTIFF band unit (float rasters without one are converted unless they hold negative values)
+INFERENCE_RASTER_DB = config('INFERENCE_RASTER_DB', default='')
+# Batch endpoint (/api/predict/batch/): images colorized concurrently per request (lets them share
+# micro-batches), files per request and largest ZIP entry accepted
+INFERENCE_BATCH_CONCURRENCY = config('INFERENCE_BATCH_CONCURRENCY', default=16, cast=int)
+INFERENCE_BATCH_MAX_FILES = config('INFERENCE_BATCH_MAX_FILES', default=500, cast=int)
+INFERENCE_BATCH_MAX_ENTRY_BYTES = config('INFERENCE_BATCH_MAX_ENTRY_BYTES', default=256 * 1024 * 1024, cast=int)
+# Django rejects multipart bodies with more files than this (default 100)
+DATA_UPLOAD_MAX_NUMBER_FILES = INFERENCE_BATCH_MAX_FILES
+# Output encoders for predict (Accept: image/png, image/webp, image/jpeg or ?format=); effort trades CPU for size
+INFERENCE_ENCODER_OPTIONS = {
+    'png': {'effort': config('INFERENCE_PNG_COMPRESS_LEVEL', default=6, cast=int)},
+    'webp': {
+        'quality': config('INFERENCE_WEBP_QUALITY', default=90, cast=int),
+        'effort': config('INFERENCE_WEBP_METHOD', default=4, cast=int),
+    },
+    'jpeg': {
+        'quality': config('INFERENCE_JPEG_QUALITY', default=90, cast=int),
+        'effort': config('INFERENCE_JPEG_OPTIMIZE', default=1, cast=int),
+    },
+}
+# Bearer token Prometheus sends to /api/metrics/ (empty disables the endpoint)
+METRICS_TOKEN = config('METRICS_TOKEN', default='')
+
+# Result cache keyed on input bytes + checkpoint (empty INFERENCE_CACHE_DIR disables the disk tier)
+INFERENCE_CACHE_ENABLED = config('INFERENCE_CACHE_ENABLED', default=True, cast=bool)
+INFERENCE_CACHE_MEMORY_BYTES = config('INFERENCE_CACHE_MEMORY_BYTES', default=64 * 1024 ** 2, cast=int)
+INFERENCE_CACHE_DIR = config('INFERENCE_CACHE_DIR', default=str(BASE_DIR / 'cache' / 'colorized'))
+INFERENCE_CACHE_DISK_BYTES = config('INFERENCE_CACHE_DISK_BYTES', default=1024 ** 3, cast=int)
+
+# Job workers (`manage.py run_job_worker`): jobs run at once per process and idle poll interval
+JOB_WORKER_CONCURRENCY = config('JOB_WORKER_CONCURRENCY', default=2, cast=int)
+JOB_WORKER_POLL_INTERVAL = config('JOB_WORKER_POLL_INTERVAL', default=1.0, cast=float)
+# Failed attempts are retried after JOB_WORKER_RETRY_DELAY seconds, doubling each time
+JOB_WORKER_MAX_ATTEMPTS = config('JOB_WORKER_MAX_ATTEMPTS', default=3, cast=int)
+JOB_WORKER_RETRY_DELAY = config('JOB_WORKER_RETRY_DELAY', default=30.0, cast=float)
+# Running jobs without a worker heartbeat for this many seconds are requeued (their worker died)
+JOB_WORKER_STALE_AFTER = config('JOB_WORKER_STALE_AFTER', default=300.0, cast=float)
+# Claim order (core/scheduling.py): seconds of waiting worth one priority level (0 disables aging), fair
+# share between users, and running jobs allowed per type across all workers ('tiled-colorize:2,...')
+JOB_AGING_SECONDS = config('JOB_AGING_SECONDS', default=300.0, cast=float)
+JOB_FAIR_SHARE = config('JOB_FAIR_SHARE', default=True, cast=bool)
+JOB_TYPE_CONCURRENCY = config(
+    'JOB_TYPE_CONCURRENCY', default='',
+    cast=lambda value: {job_type: int(cap) for job_type, cap in (item.split(':') for item in value.split(',') if item)},
+)
+
+# Progress events (/api/events/stream/): 'postgres' (LISTEN/NOTIFY, reaches every process), 'local'
+# (in-process, single server process only) or 'auto' (postgres when the database is PostgreSQL)
+EVENTS_BACKEND = config('EVENTS_BACKEND', default='auto')
+EVENTS_CHANNEL = config('EVENTS_CHANNEL', default='sarnet_events')
+# Idle streams get a keepalive comment this often; clients reconnect after EVENTS_RETRY_MS
+EVENTS_KEEPALIVE_SECONDS = config('EVENTS_KEEPALIVE_SECONDS', default=15.0, cast=float)
+EVENTS_RETRY_MS = config('EVENTS_RETRY_MS', default=3000, cast=int)
+# Undelivered events buffered per stream before a slow client is told to resync
+EVENTS_QUEUE_SIZE = config('EVENTS_QUEUE_SIZE', default=1000, cast=int)
+# Lifetime of the ?ticket= from /api/events/stream/ticket/ that browsers open streams with (checked on connect)
+EVENTS_TICKET_SECONDS = config('EVENTS_TICKET_SECONDS', default=60, cast=int)
+
 # Email
 EMAIL_BACKEND = config('EMAIL_BACKEND', default='django.core.mail.backends.console.EmailBackend')
 EMAIL_HOST = config('EMAIL_HOST', default='smtp.gmail.com')